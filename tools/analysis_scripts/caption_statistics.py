@@ -0,0 +1,501 @@
+"""
+This module collects statistics of caption datasets in one streaming pass
+    over every source file:
+
+    - counts of n-grams (1 to --max_n words), the top --top_k of every n are
+        saved. With --capacity n-grams of 2 and more words are counted by
+        Space-Saving (see heavy_hitters.py), so memory does not grow with the
+        number of different n-grams; words are always counted exactly;
+    - distributions of caption lengths in words & in characters (histograms
+        are counted by numpy.bincount over batches of lengths);
+    - overlap of vocabularies of every pair of datasets: shared words, Jaccard
+        index and the share of words of one dataset whose word is in the
+        vocabulary of the other (coverage).
+
+Sources are given as NAME=path, .json files are MSCOCO files, .tsv files are
+    Google files (see count_word_frequency.py), both are read as streams.
+    Captions are lowercased & tokenized as count_word_frequency.py does.
+
+    python caption_statistics.py -s GOOGLE=Train_GCC-training.tsv \
+                MSCOCO=captions_train2017.json -o caption_statistics.json
+
+Results are written to one compact json file:
+
+{
+    "tokenizer": < string >,
+    "max_n": < int >,
+    "top_k": < int >,
+    "capacity": < int > OR None,
+    "datasets": {
+        "NAME": {
+            "source": < string >,
+            "captions": < int >,
+            "skipped": < int > captions that could not be tokenized,
+            "words": < int >,
+            "vocabulary": < int >,
+            "lengths": {
+                "words": {
+                    "mean": < float >, "median": < int >, "p95": < int >,
+                    "max": < int >,
+                    "length": [ < int >, ... ], "count": [ < int >, ... ]
+                },
+                "characters": { ... }
+            },
+            "ngrams": {
+                "1": {
+                    "distinct": < int > OR None if counted approximately,
+                    "top": { "n-gram": < int >, ... }
+                }, ...
+            }
+        }, ...
+    },
+    "overlap": [
+        {
+            "datasets": [ "NAME_1", "NAME_2" ],
+            "shared": < int >, "only_first": < int >, "only_second": < int >,
+            "jaccard": < float >,
+            "first_coverage": < float >, "second_coverage": < float >
+        }, ...
+    ]
+}
+
+Histograms keep only lengths that occur ("length" & "count" lists).
+
+"""
+import os
+import sys
+import json
+import argparse
+
+from itertools import chain, combinations, islice
+from collections import Counter
+
+import numpy
+
+from caption_tokenizers import TOKENIZERS, get_tokenizer
+from count_word_frequency import read_json, read_tsv, sort_counts
+from heavy_hitters import SpaceSaving
+
+# number of captions that are tokenized & counted at once
+_STAT_BATCH = 10000
+
+def _a_parse():
+    """
+    This function is a simple argument parser. Checks if paths in arguments are
+        right.
+
+    Return:
+    < dict > -- {
+                'sources': < list > of ( < string > name, < string > path ),
+                'output_file': < string >,
+                'tokenizer': < string >,
+                'max_n': < int >,
+                'top_k': < int >,
+                'capacity': < int > OR None
+                }
+
+    """
+    a_parser = argparse.ArgumentParser()
+    a_parser.add_argument(
+                '-s',
+                '--sources',
+                metavar='NAME=/path/to/source',
+                nargs='+',
+                required=True,
+                help='datasets: names & paths to MSCOCO .json or Google ' + \
+                    '.tsv files')
+
+    a_parser.add_argument(
+                '-o',
+                '--output_file',
+                metavar='/path/to/output.json',
+                default='caption_statistics.json',
+                help='path to output json-file')
+
+    a_parser.add_argument(
+                '--tokenizer',
+                choices=list(TOKENIZERS),
+                default='nltk',
+                help='how captions are split into words ("regex" is ' + \
+                    'approximate: rare punctuation may differ from "nltk")')
+
+    a_parser.add_argument(
+                '--max_n',
+                metavar='int',
+                default=4,
+                type=int,
+                help='max number of words in n-grams')
+
+    a_parser.add_argument(
+                '--top_k',
+                metavar='int',
+                default=1000,
+                type=int,
+                help='number of the most frequent n-grams saved for every n')
+
+    a_parser.add_argument(
+                '--capacity',
+                metavar='int',
+                default=None,
+                type=int,
+                help='count n-grams of 2 and more words approximately ' + \
+                    'keeping this number of them')
+
+    args = vars(a_parser.parse_args())
+
+    sources = []
+    for source in args.get('sources'):
+        name, separator, source_path = source.partition('=')
+        if separator == '' or name == '' or source_path == '':
+            print('[ERROR]: Source "{}" is not NAME=path.'.format(source))
+            sys.exit(1)
+
+        if name in [source_name for source_name, _ in sources]:
+            print('[ERROR]: Dataset name "{}" is repeated.'.format(name))
+            sys.exit(1)
+
+        source_path = os.path.abspath(source_path)
+        if os.path.isfile(source_path) != True:
+            print('[ERROR]: {} is not a file.'.format(source_path))
+            sys.exit(1)
+
+        if os.path.splitext(source_path)[1] not in ['.json', '.tsv']:
+            print("[ERROR]: {} hasn't .tsv or .json extension.".format(
+                                                                source_path))
+            sys.exit(1)
+
+        sources.append((name, source_path))
+
+    args.update({'sources': sources})
+
+    if os.path.splitext(args.get('output_file'))[1] != '.json':
+        print('[ERROR]: Output file has wrong extension.')
+        sys.exit(1)
+    args.update({'output_file': os.path.abspath(args.get('output_file'))})
+
+    for key in ['max_n', 'top_k', 'capacity']:
+        if args.get(key) is not None and args.get(key) < 1:
+            print('[ERROR]: --{} must be positive.'.format(key))
+            sys.exit(1)
+
+    return args
+
+def _add_bincount(histogram, values):
+    """
+    This function adds counts of values (non-negative ints) to the histogram.
+
+    Keyword arguments:
+    histogram -- < numpy.ndarray > counts of values
+    values -- < numpy.ndarray > of ints
+
+    Return:
+    < numpy.ndarray > -- histogram, longer if values have new maximum
+
+    """
+    batch_counts = numpy.bincount(values, minlength=len(histogram))
+    batch_counts[:len(histogram)] += histogram
+
+    return batch_counts
+
+def describe_histogram(histogram):
+    """
+    This function describes a histogram of lengths.
+
+    Keyword arguments:
+    histogram -- < numpy.ndarray > counts of lengths (index is length)
+
+    Return:
+    < dict > -- {
+                "mean": < float >, "median": < int >, "p95": < int >,
+                "max": < int >, "length": < list > lengths that occur,
+                "count": < list > their counts
+                }
+
+    """
+    lengths = numpy.flatnonzero(histogram)
+    total = int(histogram.sum())
+
+    if total == 0:
+        return {'mean': None, 'median': None, 'p95': None, 'max': None,
+                                                    'length': [], 'count': []}
+
+    cumulative = numpy.cumsum(histogram)
+    median, p95 = numpy.searchsorted(cumulative, [0.5 * total, 0.95 * total])
+    mean = float(numpy.arange(len(histogram)) @ histogram) / total
+
+    return {
+        'mean': round(mean, 3),
+        'median': int(median),
+        'p95': int(p95),
+        'max': int(lengths[-1]),
+        'length': lengths.tolist(),
+        'count': histogram[lengths].tolist()
+    }
+
+class DatasetStatistics:
+    """
+    This class counts n-grams & lengths of captions of one dataset batch by
+        batch.
+
+    """
+    def __init__(self, max_n=4, capacity=None):
+        """
+        Keyword arguments:
+        max_n -- < int > max number of words in n-grams
+        capacity -- < int > OR None number of n-grams (of 2 and more words)
+            kept by approximate counting, exact counting if None
+
+        """
+        self.max_n = max_n
+        self.capacity = capacity
+
+        self.captions = 0
+        self.skipped = 0
+        # n-grams of 2 and more words are counted as tuples of words
+        self.ngram_counts = [Counter()]
+        for _ in range(2, max_n + 1):
+            if capacity is None:
+                self.ngram_counts.append(Counter())
+            else:
+                self.ngram_counts.append(SpaceSaving(capacity))
+
+        self.word_lengths = numpy.zeros(0, dtype=numpy.int64)
+        self.char_lengths = numpy.zeros(0, dtype=numpy.int64)
+
+    def update(self, captions, tokens_list):
+        """
+        This method counts a batch of captions.
+
+        Keyword arguments:
+        captions -- < list > of < string > lowercased captions
+        tokens_list -- < list > of < list > of < string > words of captions
+
+        """
+        self.captions += len(captions)
+
+        self.word_lengths = _add_bincount(self.word_lengths, numpy.fromiter(
+                    map(len, tokens_list), dtype=numpy.int64,
+                                                    count=len(tokens_list)))
+        self.char_lengths = _add_bincount(self.char_lengths, numpy.fromiter(
+                    map(len, captions), dtype=numpy.int64, count=len(captions)))
+
+        self.ngram_counts[0].update(chain.from_iterable(tokens_list))
+        for n in range(2, self.max_n + 1):
+            self.ngram_counts[n - 1].update(chain.from_iterable(
+                                    zip(*[tokens[i:] for i in range(n)])
+                                                for tokens in tokens_list))
+
+    @property
+    def word_counts(self):
+        """
+        < Counter > -- exact counts of words.
+
+        """
+        return self.ngram_counts[0]
+
+    def get_report(self, top_k=1000):
+        """
+        This method returns statistics of the dataset.
+
+        Keyword arguments:
+        top_k -- < int > number of the most frequent n-grams for every n
+
+        Return:
+        < dict > -- dataset fields of the report (see module description)
+
+        """
+        ngrams = {}
+        for n, counts in enumerate(self.ngram_counts, 1):
+            top = sort_counts(counts, top_k)
+            if n > 1:
+                top = {' '.join(ngram): count for ngram, count in top.items()}
+
+            ngrams[str(n)] = {
+                'distinct': len(counts) if isinstance(counts, Counter)
+                                                                    else None,
+                'top': top
+            }
+
+        return {
+            'captions': self.captions,
+            'skipped': self.skipped,
+            'words': int(self.word_lengths @ numpy.arange(
+                                                    len(self.word_lengths))),
+            'vocabulary': len(self.word_counts),
+            'lengths': {
+                'words': describe_histogram(self.word_lengths),
+                'characters': describe_histogram(self.char_lengths)
+            },
+            'ngrams': ngrams
+        }
+
+def _tokenize_batch(batch, tokenize, statistics):
+    """
+    This function lowercases & tokenizes captions of the batch. If it fails
+        then captions are tokenized one by one and bad captions are skipped.
+
+    Return:
+    < tuple > -- ( < list > captions, < list > tokens of captions )
+
+    """
+    try:
+        captions = list(map(str.lower, batch))
+        return captions, list(map(tokenize, captions))
+    except Exception:
+        pass
+
+    captions = []
+    tokens_list = []
+    for caption in batch:
+        try:
+            tokens = tokenize(caption.lower())
+        except Exception as error:
+            print('[ATTENTION]: Caption {!r} is skipped: {}'.format(caption,
+                                                                    error))
+            statistics.skipped += 1
+            continue
+        captions.append(caption.lower())
+        tokens_list.append(tokens)
+
+    return captions, tokens_list
+
+def collect_statistics(annotation_list, tokenize, max_n=4, capacity=None,
+                                                                verbose=True):
+    """
+    This function counts n-grams & lengths of captions in one pass.
+
+    Keyword arguments:
+    annotation_list -- < iterable > of < string > annotations (a list or a
+        stream of read_json / read_tsv)
+    tokenize -- < function > caption -> list of words
+    max_n -- < int > max number of words in n-grams
+    capacity -- < int > OR None number of n-grams kept by approximate counting
+    verbose -- < bool > print the number of processed captions
+
+    Return:
+    < DatasetStatistics > -- counted statistics
+
+    """
+    statistics = DatasetStatistics(max_n, capacity)
+    annotation_iter = iter(annotation_list)
+
+    while True:
+        batch = list(islice(annotation_iter, _STAT_BATCH))
+        if len(batch) == 0:
+            break
+
+        statistics.update(*_tokenize_batch(batch, tokenize, statistics))
+        if verbose:
+            print('Processed: {}'.format(statistics.captions))
+
+    return statistics
+
+def compare_vocabularies(first_counts, second_counts):
+    """
+    This function compares vocabularies of two datasets.
+
+    Keyword arguments:
+    first_counts -- < dict > { < string > word: < int > count }
+    second_counts -- < dict > { < string > word: < int > count }
+
+    Return:
+    < dict > -- {
+                "shared": < int >, "only_first": < int >,
+                "only_second": < int >, "jaccard": < float >,
+                "first_coverage": < float > share of words of the first
+                    dataset that are in the vocabulary of the second one,
+                "second_coverage": < float >
+                }
+
+    """
+    shared = first_counts.keys() & second_counts.keys()
+    union_len = len(first_counts) + len(second_counts) - len(shared)
+
+    def coverage(counts):
+        total = sum(counts.values())
+        if total == 0:
+            return 0.0
+        return round(sum(counts[word] for word in shared) / total, 6)
+
+    return {
+        'shared': len(shared),
+        'only_first': len(first_counts) - len(shared),
+        'only_second': len(second_counts) - len(shared),
+        'jaccard': round(len(shared) / union_len, 6) if union_len > 0 else 0.0,
+        'first_coverage': coverage(first_counts),
+        'second_coverage': coverage(second_counts)
+    }
+
+def get_statistics_report(sources, tokenizer='nltk', max_n=4, top_k=1000,
+                                                                capacity=None):
+    """
+    This function collects statistics of every dataset & compares their
+        vocabularies.
+
+    Keyword arguments:
+    sources -- < list > of ( < string > name, < string > path to .json or .tsv )
+    tokenizer -- < string > name of tokenizer ('nltk', 'regex' or 'split')
+    max_n -- < int > max number of words in n-grams
+    top_k -- < int > number of the most frequent n-grams for every n
+    capacity -- < int > OR None number of n-grams kept by approximate counting
+
+    Return:
+    < dict > -- report (see module description)
+
+    """
+    tokenize = get_tokenizer(tokenizer)
+    report = {'tokenizer': tokenizer, 'max_n': max_n, 'top_k': top_k,
+                        'capacity': capacity, 'datasets': {}, 'overlap': []}
+    word_counts = {}
+
+    for name, source_path in sources:
+        print('\n{}: {}'.format(name, source_path))
+        if os.path.splitext(source_path)[1] == '.json':
+            annotation_list = read_json(source_path)
+        else:
+            annotation_list = read_tsv(source_path)
+
+        statistics = collect_statistics(annotation_list, tokenize, max_n,
+                                                                    capacity)
+
+        report['datasets'][name] = {'source': source_path}
+        report['datasets'][name].update(statistics.get_report(top_k))
+        # only words are needed to compare datasets
+        word_counts[name] = statistics.word_counts
+        statistics = None
+
+    for first_name, second_name in combinations(word_counts, 2):
+        overlap = {'datasets': [first_name, second_name]}
+        overlap.update(compare_vocabularies(word_counts[first_name],
+                                                    word_counts[second_name]))
+        report['overlap'].append(overlap)
+
+    return report
+
+if __name__ == '__main__':
+
+    args = _a_parse()
+
+    report = get_statistics_report(args.get('sources'), args.get('tokenizer'),
+                            args.get('max_n'), args.get('top_k'),
+                            args.get('capacity'))
+
+    with open(args.get('output_file'), 'w') as json_file:
+        json.dump(report, json_file, ensure_ascii=False,
+                                                    separators=(',', ':'))
+
+    for name, dataset in report.get('datasets').items():
+        print('\n{}: captions: {}, words: {}, vocabulary: {}, '.format(name,
+                        dataset.get('captions'), dataset.get('words'),
+                        dataset.get('vocabulary')) + \
+                'mean length: {}.'.format(
+                        dataset['lengths']['words'].get('mean')))
+
+    for overlap in report.get('overlap'):
+        print('{} & {}: shared words: {}, jaccard: {}, '.format(
+                        *overlap.get('datasets'), overlap.get('shared'),
+                        overlap.get('jaccard')) + \
+                'coverage: {} / {}.'.format(overlap.get('first_coverage'),
+                        overlap.get('second_coverage')))
+
+    print('\nStatistics have been saved to {}'.format(args.get('output_file')))
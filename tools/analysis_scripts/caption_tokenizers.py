@@ -0,0 +1,169 @@
+"""
+This module provides tokenizers of captions for count_word_frequency.py:
+
+    nltk -- nltk.tokenize.word_tokenize (Punkt sentence splitting and Treebank
+        regexes), the reference one, requires nltk & punkt;
+    regex -- one precompiled regular expression that follows Treebank
+        tokenizer of nltk (word_tokenize with preserve_line=True):
+        punctuation, brackets & quotes are split off, "n't", "'s", "'ll" ...
+        are separate tokens, the final period is split off, commas & colons
+        before digits and other periods stay inside words. The tokens are
+        approximate: real captions and the parity suite have matched
+        Treebank ones in all cases, but about 0.2% of fuzzed strings of
+        unusual punctuation still differ (chained clitics like "it'sn't",
+        repeated commas & colons). Sentences are not split, so a caption of
+        several sentences may also differ from nltk at inner periods. Use
+        nltk where exact counts matter;
+    split -- str.split(), punctuation stays attached to words.
+
+All tokenizers take < string > and return < list > of < string >. See
+    benchmark_scripts/bench_tokenizers.py for parity with nltk & speed.
+
+"""
+import re
+
+# characters that are always separate tokens
+_SPLIT_CHARS = r';@#$%&?!*\[\](){}<>«“‘„»”’‒-―'
+
+# what may follow the final period
+_FINAL_TAIL = r'[\]\)}>"\'»”’\s]*$'
+
+# where contraction suffixes end: whitespace or anything that is split off
+_TOKEN_END = r'(?=\s|$|[' + _SPLIT_CHARS + r'"`]|\'\'|[,:](?!\d)|\.{2,}|--|' + \
+                                    r'\'\s|\.' + _FINAL_TAIL + r')'
+
+# "n't", "'ll", "'re" & "'ve" are split off after "'s", "'m", "'d" or "'" are
+# split off from them
+_CLITIC_END = _TOKEN_END[:-1] + r'|\'(?:s|m|d)?(?:\s|$))'
+
+# single quote that opens a quotation ("'tis" is not a contraction any more)
+_OPEN_SINGLE_QUOTE = r"(?<!\w)'(?=\w)(?!(?:re|ve|ll|m|t|s|d|n)\b)"
+
+# words that are split in two ("cannot" -> "can" "not") wherever they start,
+# both parts are separate tokens. "n't" is split off before, so it ends them
+_SPLIT_END = r"(?:\b|(?=n't" + _CLITIC_END + r"))"
+_SPLIT_WORD = r"""(?<!\w)(?:can(?=not""" + _SPLIT_END + r""")|d(?='ye""" + \
+        _SPLIT_END + r""")|gim(?=me""" + _SPLIT_END + r""")|gon(?=na""" + \
+        _SPLIT_END + r""")|got(?=ta""" + _SPLIT_END + r""")|lem(?=me""" + \
+        _SPLIT_END + r""")|more(?='n""" + _SPLIT_END + r""")|wan(?=na(?:""" + \
+        _TOKEN_END + r"""|n't""" + _CLITIC_END + r""")))"""
+
+_TOKEN_RE = re.compile(r"""
+    \.{2,}                                      # ellipsis
+  | --
+  | [""" + _SPLIT_CHARS + r"""]
+  | `+ | ''
+  | [,:](?!\d)
+  | \.(?=""" + _FINAL_TAIL + r""")                          # the final period
+  | n't""" + _CLITIC_END + r"""
+  | '(?:s|m|d)?""" + _TOKEN_END + r"""
+  | '(?:ll|re|ve)""" + _CLITIC_END + r"""
+  | """ + _OPEN_SINGLE_QUOTE + r"""
+  | """ + _SPLIT_WORD + r"""
+  | (?:not(?<=\bcannot)|'ye(?<=\bd'ye)|me(?<=\bgimme)|na(?<=\bgonna)
+        |ta(?<=\bgotta)|me(?<=\blemme)|'n(?<=\bmore'n))""" + _SPLIT_END + r"""
+  | na(?<=\bwanna)
+  | (?:                                         # word
+        (?!n't""" + _CLITIC_END + r""")
+        (?!""" + _SPLIT_WORD + r""")
+        (?:[^\s""" + _SPLIT_CHARS + r""""`,:.'-]
+          | [,:](?=\d)
+          | \.(?!\.)(?!""" + _FINAL_TAIL + r""")
+          | -(?!-)
+          | (?!""" + _OPEN_SINGLE_QUOTE + r""")
+            '(?!(?:s|m|d)?""" + _TOKEN_END + r""")
+            (?!(?:ll|re|ve)""" + _CLITIC_END + r""")(?!')
+        )
+    )+
+""", re.VERBOSE | re.IGNORECASE)
+
+# double quotes are turned into `` (opening) and '' (closing) as in Treebank
+_OPEN_QUOTE_RE = re.compile(r'^"(?:"|\'\')?|(?<=[ (\[{<`«“‘„])(?:"|\'\')')
+_CLOSE_QUOTE_RE = re.compile(r'(\'?)"')
+
+def _replace_open_quotes(match):
+    """
+    This function turns opening double quotes into ``. A quote that follows
+        the opening one at the start of the caption opens too.
+
+    """
+    quotes = match.group(0)
+    return ' `` ' * (quotes.count('"') + quotes.count("''"))
+
+def _replace_close_quote(match):
+    """
+    This function turns closing double quote into ''. It is not separated
+        from a preceding period, so the period is still the final one.
+
+    """
+    if match.group(1):
+        return "' '' "
+    return "'' "
+
+def tokenize_nltk(caption):
+    """
+    This function splits caption into tokens by nltk.tokenize.word_tokenize.
+
+    Keyword arguments:
+    caption -- < string > caption
+
+    Return:
+    < list > of < string > -- tokens
+
+    """
+    import nltk
+    return nltk.tokenize.word_tokenize(caption)
+
+def tokenize_regex(caption):
+    """
+    This function splits caption into tokens like Treebank tokenizer of nltk
+        by one precompiled regular expression.
+
+    Keyword arguments:
+    caption -- < string > caption
+
+    Return:
+    < list > of < string > -- tokens
+
+    """
+    if '"' in caption or "''" in caption:
+        caption = _OPEN_QUOTE_RE.sub(_replace_open_quotes, caption)
+        caption = _CLOSE_QUOTE_RE.sub(_replace_close_quote, caption)
+
+    return _TOKEN_RE.findall(caption)
+
+def tokenize_split(caption):
+    """
+    This function splits caption into tokens by whitespace.
+
+    Keyword arguments:
+    caption -- < string > caption
+
+    Return:
+    < list > of < string > -- tokens
+
+    """
+    return caption.split()
+
+TOKENIZERS = {
+    'nltk': tokenize_nltk,
+    'regex': tokenize_regex,
+    'split': tokenize_split
+}
+
+def get_tokenizer(name):
+    """
+    This function returns tokenizer by name.
+
+    Keyword arguments:
+    name -- < string > one of TOKENIZERS keys ('nltk', 'regex', 'split')
+
+    Return:
+    < function > -- caption -> list of tokens
+
+    """
+    if name not in TOKENIZERS:
+        raise ValueError('unknown tokenizer "{}", expected one of: {}'.format(
+                                            name, ', '.join(TOKENIZERS)))
+
+    return TOKENIZERS[name]
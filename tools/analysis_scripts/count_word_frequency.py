@@ -17,13 +17,56 @@ Google source .tsv files must have following format:
 The script will save results to .json or .tsv file specified in --output_file
     path by user.
 
+Captions are split into words by the tokenizer chosen with --tokenizer (see
+    caption_tokenizers.py): "nltk" (default, exact Treebank tokens), "regex"
+    (approximately the same tokens without nltk, several times faster: rare
+    punctuation may be split differently) or "split" (by whitespace, the
+    fastest).
+
+Words are counted in place in one pass over the captions. With
+    --counting bincount every word gets an integer id and counts are kept in a
+    numpy array that is updated by numpy.bincount over batches of ids.
+
+With --jobs N captions are split into chunks that are tokenized & counted by
+    N processes, every process returns partial counts { word: count } that are
+    merged. Saved results have the same form, so counts of different shards or
+    datasets can be merged later without tokenizing again (--merge_files):
+
+    python count_word_frequency.py -m GOOGLE_ONLY_statistic.json \
+                            MSCOCO_ONLY_statistic.json -o all_statistic.json
+
+With --top_k K only K most frequent words are saved, they are selected by
+    heapq.nlargest instead of sorting the whole vocabulary. With --approximate
+    words are counted by Space-Saving (heavy_hitters.py) that keeps at most
+    --capacity words (10 * K by default), so memory does not grow with the long
+    tail of rare words; counts of kept words may be a little too high:
+
+    python count_word_frequency.py -t Train_GCC-training.tsv -o top.json \
+                                --tokenizer regex --top_k 50000 --approximate
+
+Source files are read as streams: .tsv line by line, .json by json_stream.py
+    that parses "annotations" one by one. Captions go to counting in batches
+    (in parallel mode at most 2 * N chunks are in flight), so memory depends on
+    the number of different words, not on the size of the source file.
+
 """
 import os
 import sys
 import json
+import array
+import heapq
 import argparse
+import multiprocessing
+
+from functools import partial
+from operator import itemgetter
+from itertools import chain, islice
+
+from collections import Counter, deque
 
-import nltk
+from caption_tokenizers import TOKENIZERS, get_tokenizer
+from json_stream import iter_json_array
+from heavy_hitters import SpaceSaving
 
 def _a_parser():
     """
@@ -34,7 +77,15 @@ def _a_parser():
     < dict > -- {
                 'json_file': path to json_file OR None,
                 'tsv_file': path to tsv_file OR None,
-                'output_file': path to output_file
+                'merge_files': < list > of paths to count files OR None,
+                'output_file': path to output_file,
+                'tokenizer': < string > name of tokenizer,
+                'counting': < string > 'counter' or 'bincount',
+                'jobs': < int > number of processes,
+                'top_k': < int > number of words to save OR None,
+                'approximate': < bool >,
+                'capacity': < int > number of words kept by approximate
+                    counting OR None
                 }
 
     """
@@ -61,6 +112,57 @@ def _a_parser():
                 help='path to output tsv if if not specified will be in ' + \
                     'script directory')
 
+    a_parser.add_argument(
+                '--tokenizer',
+                choices=list(TOKENIZERS),
+                default='nltk',
+                help='how captions are split into words ("regex" is ' + \
+                    'approximate: rare punctuation may differ from "nltk")')
+
+    a_parser.add_argument(
+                '--counting',
+                choices=['counter', 'bincount'],
+                default='counter',
+                help='count words by dict of counters or by numpy.bincount ' + \
+                    'of word ids')
+
+    a_parser.add_argument(
+                '--jobs',
+                metavar='int',
+                default=1,
+                type=int,
+                help='number of processes that tokenize & count captions')
+
+    a_parser.add_argument(
+                '--top_k',
+                metavar='int',
+                default=None,
+                type=int,
+                help='save only this number of the most frequent words')
+
+    a_parser.add_argument(
+                '--approximate',
+                action='store_true',
+                help='count words by Space-Saving in fixed memory ' + \
+                    '(see heavy_hitters.py), requires --top_k or --capacity')
+
+    a_parser.add_argument(
+                '--capacity',
+                metavar='int',
+                default=None,
+                type=int,
+                help='number of words kept by approximate counting, ' + \
+                    '10 * top_k by default')
+
+    a_parser.add_argument(
+                '-m',
+                '--merge_files',
+                metavar='/path/to/counts.json',
+                nargs='+',
+                required=False,
+                help='saved counts (.json or .tsv results of this script) ' + \
+                    'that are added to the result')
+
     args = vars(a_parser.parse_args())
 
     json_file_path = args.get('json_file')
@@ -68,9 +170,11 @@ def _a_parser():
     output_file_path = args.get('output_file')
 
     # source file checking
+    source_file_list = []
     if json_file_path is None and tsv_file_path is None:
-        print('[ERROR]: No source file specified.')
-        sys.exit()
+        if args.get('merge_files') is None:
+            print('[ERROR]: No source file specified.')
+            sys.exit()
     else:
         if json_file_path is not None:
             source_file_path = os.path.abspath(json_file_path)
@@ -78,15 +182,55 @@ def _a_parser():
         else:
             source_file_path = os.path.abspath(tsv_file_path)
             args.update({'json_file': None, 'tsv_file': source_file_path})
+        source_file_list.append(source_file_path)
+
+    if args.get('merge_files') is not None:
+        merge_files = [os.path.abspath(merge_file)
+                                    for merge_file in args.get('merge_files')]
+        for merge_file in merge_files:
+            if os.path.splitext(merge_file)[1] not in ['.json', '.tsv']:
+                print("[ERROR]: {} hasn't .tsv or .json extension.".format(
+                                                                merge_file))
+                sys.exit()
+        args.update({'merge_files': merge_files})
+        source_file_list.extend(merge_files)
+
+    for source_file_path in source_file_list:
+        if os.path.exists(source_file_path) != True:
+            print('[ERROR]: Source file path has not found.')
+            sys.exit()
 
-    if os.path.exists(source_file_path) != True:
-        print('[ERROR]: Source file path has not found.')
+        if os.path.isfile(source_file_path) != True:
+            print('[ERROR]: Source file is a directory.')
+            sys.exit()
+
+    if args.get('jobs') < 1:
+        print('[ERROR]: Number of jobs must be positive.')
         sys.exit()
 
-    if os.path.isfile(source_file_path) != True:
-        print('[ERROR]: Source file is a directory.')
+    # approximate counting checking
+    if args.get('top_k') is not None and args.get('top_k') < 1:
+        print('[ERROR]: Number of top words must be positive.')
         sys.exit()
 
+    if args.get('approximate'):
+        if args.get('capacity') is None:
+            if args.get('top_k') is None:
+                print('[ERROR]: --approximate requires --top_k or --capacity.')
+                sys.exit()
+            args.update({'capacity': 10 * args.get('top_k')})
+
+        if args.get('capacity') < 1:
+            print('[ERROR]: Capacity must be positive.')
+            sys.exit()
+
+        if args.get('counting') == 'bincount' and args.get('jobs') == 1:
+            print('[ERROR]: --counting bincount keeps the whole vocabulary, ' + \
+                                'with --approximate it is used only by --jobs.')
+            sys.exit()
+    else:
+        args.update({'capacity': None})
+
     # output file checking
     if output_file_path is None:
         print('\n[ATTENTION]: No output file specified. It will be saved as ' + \
@@ -112,82 +256,319 @@ def _a_parser():
 
     return args
 
-def get_words_frequency(annotation_list):
+# number of captions that are tokenized & counted at once
+_COUNT_BATCH = 10000
+
+# number of word ids that are counted by numpy.bincount at once
+_BINCOUNT_BATCH = 1 << 20
+
+def _iter_chunks(annotation_list, chunk_size):
     """
-    This function goes through every annotation, counts words in a separate
-        dictionary. Returns reverse sorted dictionary of frequency.
+    This generator splits annotations into lists of chunk_size ones.
+
+    """
+    annotation_iter = iter(annotation_list)
+    while True:
+        chunk = list(islice(annotation_iter, chunk_size))
+        if len(chunk) == 0:
+            return
+        yield chunk
+
+def _iter_batch_words(annotation_list, tokenize, verbose=True):
+    """
+    This generator splits annotations into batches & yields words of every
+        batch. Captions of a batch are tokenized by map() without a Python loop;
+        if it fails then the batch is tokenized caption by caption and bad
+        captions are skipped.
 
     Keyword arguments:
-    annotation_list -- < list > of < string > list with annotations that will be
-        checked.
+    annotation_list -- < iterable > of < string > annotations (a list or a
+        stream of read_json / read_tsv)
+    tokenize -- < function > caption -> list of words
+    verbose -- < bool > print the number of processed captions
+
+    Yield:
+    < list > of < string > -- words of the batch
+
+    """
+    count = 0
+
+    for batch in _iter_chunks(annotation_list, _COUNT_BATCH):
+        if verbose:
+            print('Processed: {}'.format(count))
+        count += len(batch)
+
+        try:
+            yield list(chain.from_iterable(
+                                        map(tokenize, map(str.lower, batch))))
+            continue
+        except Exception:
+            pass
+
+        batch_words = []
+        for caption in batch:
+            try:
+                batch_words.extend(tokenize(caption.lower()))
+            except Exception as error:
+                print('[ERROR]:', error)
+
+        yield batch_words
+
+def count_words(annotation_list, tokenize, verbose=True, word_counts=None):
+    """
+    This function counts words of every annotation in one Counter that is
+        updated in place.
+
+    Keyword arguments:
+    annotation_list -- < iterable > of < string > annotations
+    tokenize -- < function > caption -> list of words
+    verbose -- < bool > print the number of processed captions
+    word_counts -- < Counter > OR < SpaceSaving > where words are counted, a
+        new Counter if None
 
     Return:
-    < dict > -- {
-                    "word_1": < int >,
-                    "word_2": < int >,
-                    ...
-                    "word_n": < int >
-                }
+    < Counter > -- { < string > word: < int > count }, words go in order of
+        their first occurrence (word_counts if it is given)
+
+    """
+    if word_counts is None:
+        word_counts = Counter()
+
+    for batch_words in _iter_batch_words(annotation_list, tokenize, verbose):
+        word_counts.update(batch_words)
+
+    return word_counts
+
+def count_word_ids(annotation_list, tokenize, verbose=True):
+    """
+    This function gives every word an integer id & counts ids by
+        numpy.bincount over batches of ids.
+
+    Keyword arguments:
+    annotation_list -- < iterable > of < string > annotations
+    tokenize -- < function > caption -> list of words
+    verbose -- < bool > print the number of processed captions
+
+    Return:
+    < tuple > -- ( < dict > { < string > word: < int > id }, ids go in order of
+        first occurrence, < numpy.ndarray > counts of ids )
+
+    """
+    import numpy
+
+    vocabulary = {}
+    id_counts = numpy.zeros(0, dtype=numpy.int64)
+    word_ids = array.array('q')
+
+    def add_batch(id_counts, word_ids):
+        batch_counts = numpy.bincount(
+                    numpy.frombuffer(word_ids, dtype=numpy.int64),
+                                                minlength=len(vocabulary))
+        batch_counts[:len(id_counts)] += id_counts
+        return batch_counts
+
+    for batch_words in _iter_batch_words(annotation_list, tokenize, verbose):
+        word_ids.extend([vocabulary.setdefault(word, len(vocabulary))
+                                                    for word in batch_words])
+
+        if len(word_ids) >= _BINCOUNT_BATCH:
+            id_counts = add_batch(id_counts, word_ids)
+            word_ids = array.array('q')
+
+    return vocabulary, add_batch(id_counts, word_ids)
+
+# number of captions that are sent to a process at once
+_JOB_CHUNK = 50000
+
+def count_chunk(annotation_list, tokenizer='nltk', counting='counter'):
+    """
+    This function counts words of annotations. It is run by processes of
+        count_words_parallel.
+
+    Keyword arguments:
+    annotation_list -- < list > of < string > annotations
+    tokenizer -- < string > name of tokenizer ('nltk', 'regex' or 'split')
+    counting -- < string > 'counter' or 'bincount'
 
+    Return:
+    < dict > -- partial counts { < string > word: < int > count }, words go in
+        order of their first occurrence
+
+    """
+    tokenize = get_tokenizer(tokenizer)
+
+    if counting == 'bincount':
+        vocabulary, id_counts = count_word_ids(annotation_list, tokenize,
+                                                                verbose=False)
+        return dict(zip(vocabulary, id_counts.tolist()))
+
+    return dict(count_words(annotation_list, tokenize, verbose=False))
+
+def count_words_parallel(annotation_list, tokenizer='nltk', counting='counter',
+                                                    jobs=2, word_counts=None):
     """
-    main_freq_list = nltk.FreqDist('')
+    This function splits annotations into chunks that are counted by a pool
+        of processes & merges partial counts in order of chunks, so the result
+        is the same as of one process.
+
+    Keyword arguments:
+    annotation_list -- < iterable > of < string > annotations
+    tokenizer -- < string > name of tokenizer ('nltk', 'regex' or 'split')
+    counting -- < string > 'counter' or 'bincount'
+    jobs -- < int > number of processes
+    word_counts -- < Counter > OR < SpaceSaving > where partial counts are
+        merged, a new Counter if None
+
+    Return:
+    < Counter > -- { < string > word: < int > count } (word_counts if it is
+        given)
 
+    """
+    if word_counts is None:
+        word_counts = Counter()
     count = 0
-    c_len = len(annotation_list)
-    for caption in annotation_list:
-        try:
-            caption = caption.lower()
-            caption = nltk.tokenize.word_tokenize(caption)
 
-            current_freq_list = nltk.FreqDist(caption)
-            main_freq_list += current_freq_list
+    count_function = partial(count_chunk, tokenizer=tokenizer,
+                                                            counting=counting)
 
+    # chunks are submitted while at most 2 * jobs of them are not merged, so
+    # a stream is not read ahead of counting (pool.imap reads it all at once)
+    with multiprocessing.Pool(jobs) as pool:
+        pending = deque()
 
-        except Exception as error:
-            print('[ERROR]:', error)
+        for chunk in _iter_chunks(annotation_list, _JOB_CHUNK):
+            if len(pending) >= 2 * jobs:
+                chunk_len, result = pending.popleft()
+                word_counts.update(result.get())
+                count += chunk_len
+                print('Processed: {}'.format(count))
 
-        if count % 10000 == 0:
-            print('Processed: {}/{}'.format(count, c_len))
+            pending.append((len(chunk),
+                                    pool.apply_async(count_function, (chunk,))))
 
-        count += 1
+        while len(pending) > 0:
+            chunk_len, result = pending.popleft()
+            word_counts.update(result.get())
+            count += chunk_len
+            print('Processed: {}'.format(count))
 
-    main_freq_list = dict(main_freq_list)
-    main_freq_list = {k: v for k, v in sorted(
-                                            main_freq_list.items(),
-                                            key=lambda item: item[1],
-                                            reverse=True)}
-    return main_freq_list
+    return word_counts
 
-def read_tsv(tsv_path):
+def merge_counts(counts_list):
     """
-    This method reads .tsv file with cells separated by tabs (/t) with following
-        format:
-                [ annotation | URL ]
-        It returns list of annotations.
+    This function adds up counts of words.
 
     Keyword arguments:
-    tsv_file_path -- < string > path to tsv file.
+    counts_list -- < list > of < dict > { < string > word: < int > count }
 
     Return:
-    < list > of < string > -- list with annotations.
+    < Counter > -- { < string > word: < int > count }, words go in order of
+        their first occurrence
 
     """
-    with open(tsv_path, 'r') as tsv_file:
-        tsv_data = tsv_file.read().split('\n')
+    word_counts = Counter()
+    for counts in counts_list:
+        word_counts.update(counts)
 
-    annotation_list = []
-    for element in tsv_data:
-        try:
-            annotation_list.append(element.split('\t')[0])
-        except Exception as error:
-            print('[ATTENTION]: An error "{}" with an element: "{}"'.format(
-                                                                error, element))
+    return word_counts
 
-    return annotation_list
+def sort_counts(word_counts, top_k=None):
+    """
+    This function sorts counts by frequency in descending order. Sorting is
+        stable, so words with equal counts keep their order. If top_k is
+        given then only top_k most frequent words are selected by
+        heapq.nlargest without sorting the whole vocabulary.
+
+    Keyword arguments:
+    word_counts -- < dict > OR < SpaceSaving > { < string > word: < int > count }
+    top_k -- < int > OR None number of words to return, all if None
+
+    Return:
+    < dict > -- sorted { < string > word: < int > count }
+
+    """
+    if top_k is None:
+        return {k: v for k, v in sorted(word_counts.items(),
+                                                key=itemgetter(1),
+                                                reverse=True)}
+
+    return {k: v for k, v in heapq.nlargest(top_k, word_counts.items(),
+                                                        key=itemgetter(1))}
+
+def get_words_frequency(annotation_list, tokenizer='nltk', counting='counter',
+                                        jobs=1, top_k=None, capacity=None):
+    """
+    This function goes through every annotation, counts words in a separate
+        dictionary. Returns reverse sorted dictionary of frequency. If capacity
+        is given then words are counted approximately by SpaceSaving that
+        keeps at most capacity words (see heavy_hitters.py).
+
+    Keyword arguments:
+    annotation_list -- < iterable > of < string > annotations that will be
+        checked (a list or a stream of read_json / read_tsv).
+    tokenizer -- < string > name of tokenizer ('nltk', 'regex' or 'split')
+    counting -- < string > 'counter' (Counter updated in place) or 'bincount'
+        (word ids counted by numpy.bincount)
+    jobs -- < int > number of processes
+    top_k -- < int > OR None number of most frequent words to return, all if
+        None
+    capacity -- < int > OR None number of words kept by approximate counting,
+        exact counting if None
+
+    Return:
+    < dict > -- {
+                    "word_1": < int >,
+                    "word_2": < int >,
+                    ...
+                    "word_n": < int >
+                }
+
+    """
+    if capacity is not None:
+        word_counts = SpaceSaving(capacity)
+        if jobs > 1:
+            count_words_parallel(annotation_list, tokenizer, counting, jobs,
+                                                                word_counts)
+        else:
+            count_words(annotation_list, get_tokenizer(tokenizer),
+                                                    word_counts=word_counts)
+        print('\n[ATTENTION]: counts are approximate, {} words kept.'.format(
+                                                            len(word_counts)))
+        print('A count may be higher than the true one by at most {}.'.format(
+                                                    word_counts.max_error()))
+    elif jobs > 1:
+        word_counts = count_words_parallel(annotation_list, tokenizer,
+                                                            counting, jobs)
+    elif counting == 'bincount':
+        vocabulary, id_counts = count_word_ids(annotation_list,
+                                                    get_tokenizer(tokenizer))
+        word_counts = dict(zip(vocabulary, id_counts.tolist()))
+    else:
+        word_counts = count_words(annotation_list, get_tokenizer(tokenizer))
+
+    return sort_counts(word_counts, top_k)
+
+def read_tsv(tsv_path):
+    """
+    This generator reads .tsv file with cells separated by tabs (/t) with
+        following format:
+                [ annotation | URL ]
+        It yields annotations line by line.
+
+    Keyword arguments:
+    tsv_path -- < string > path to tsv file.
+
+    Yield:
+    < string > -- annotation.
+
+    """
+    with open(tsv_path, 'r') as tsv_file:
+        for line in tsv_file:
+            yield line.rstrip('\n').split('\t')[0]
 
 def read_json(json_path):
     """
-    This method reads MSCOCO .json files that must have following fields:
+    This generator reads MSCOCO .json files that must have following fields:
             {
                 "annotations":[
                     {
@@ -196,29 +577,47 @@ def read_json(json_path):
                 ]
             }
 
-        It returns list of annotations.
+        It yields annotations one by one without loading the whole file.
 
     Keyword arguments:
-    json_file_path -- < string > path to json file.
+    json_path -- < string > path to json file.
 
-    Return:
-    < list > of < string > -- list with annotations.
+    Yield:
+    < string > -- annotation.
 
     """
-
-    with open(json_path, 'r') as json_file:
-        json_data = json.load(json_file)
-
-    annotation_list = []
-
-    for annotation in json_data.get('annotations'):
+    for annotation in iter_json_array(json_path, 'annotations'):
         try:
-            annotation_list.append(annotation.get('caption'))
+            yield annotation.get('caption')
         except Exception as error:
             print('[ATTENTION]: An error "{}" with an element: "{}"'.format(
-                                                            error, element))
+                                                            error, annotation))
+
+def read_counts(counts_path):
+    """
+    This method reads counts of words saved by write_json or write_tsv.
+
+    Keyword arguments:
+    counts_path -- < string > path to .json or .tsv file.
+
+    Return:
+    < dict > -- { < string > word: < int > count }
+
+    """
+    if os.path.splitext(counts_path)[1] == '.json':
+        with open(counts_path, 'r') as json_file:
+            return json.load(json_file)
 
-    return annotation_list
+    word_counts = {}
+    with open(counts_path, 'r') as tsv_file:
+        for line in tsv_file:
+            line = line.rstrip('\n')
+            if line == '':
+                continue
+            word, count = line.rsplit('\t', 1)
+            word_counts[word] = word_counts.get(word, 0) + int(count)
+
+    return word_counts
 
 def write_json(dict_data, json_path):
     """
@@ -255,10 +654,26 @@ if __name__ == '__main__':
 
     if args.get('json_file') is not None:
         data = read_json(args.get('json_file'))
-    else:
+    elif args.get('tsv_file') is not None:
         data = read_tsv(args.get('tsv_file'))
+    else:
+        data = []
+
+    # words that are not in top of the source may get there after merging
+    if args.get('merge_files') is None:
+        top_k = args.get('top_k')
+    else:
+        top_k = None
+
+    word_frequency = get_words_frequency(data, args.get('tokenizer'),
+                                    args.get('counting'), args.get('jobs'),
+                                    top_k, args.get('capacity'))
 
-    word_frequency = get_words_frequency(data)
+    if args.get('merge_files') is not None:
+        word_frequency = sort_counts(merge_counts([word_frequency] + \
+                                        [read_counts(merge_file)
+                                    for merge_file in args.get('merge_files')]),
+                                    args.get('top_k'))
 
     output_file = args.get('output_file')
     if os.path.splitext(output_file)[1] == '.json':
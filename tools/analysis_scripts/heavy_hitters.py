@@ -0,0 +1,163 @@
+"""
+This module counts the most frequent words of a stream in fixed memory by
+    Space-Saving algorithm (Metwally, Agrawal, El Abbadi): at most capacity
+    words are kept, a new word replaces the least counted one and takes its
+    count as the error.
+
+Guarantees for N counted words: every word that occurs more than
+    N / capacity times is kept, the count of a kept word is at most its error
+    higher than the true one and the error is at most N / capacity. So for
+    the top K words capacity should be several times K, so that the count of
+    the K-th word is well above N / capacity.
+
+Usage:
+
+    word_counts = SpaceSaving(200000)
+    word_counts.update(['a', 'dog', 'a'])
+    word_counts.update({'cat': 3})
+    top_words = heapq.nlargest(50000, word_counts.items(), key=itemgetter(1))
+
+"""
+from collections import Counter
+from collections.abc import Mapping
+
+import heapq
+
+# bits of the slot number in heap entries
+_SLOT_BITS = 32
+_SLOT_MASK = (1 << _SLOT_BITS) - 1
+
+class SpaceSaving:
+    """
+    This class keeps approximate counts of at most capacity most frequent
+        words. update() takes words like Counter.update: an iterable of words
+        or a mapping { word: count }.
+
+    """
+    def __init__(self, capacity):
+        """
+        Keyword arguments:
+        capacity -- < int > max number of words that are kept (memory budget)
+
+        """
+        if capacity < 1 or capacity > _SLOT_MASK:
+            raise ValueError('capacity must be in [1, {}]'.format(_SLOT_MASK))
+
+        self.capacity = capacity
+        self.total = 0
+
+        # every kept word has a slot: its count & error are kept in lists
+        self._slots = {}
+        self._words = []
+        self._counts = []
+        self._errors = []
+        # one count << _SLOT_BITS | slot entry for every slot (ints are
+        # compared faster than tuples of words). Counts of entries are not
+        # updated when words are counted, so they may be lower than the real
+        # ones, they are fixed when the entry gets to the top of the heap
+        self._heap = []
+
+    def _fix_min(self):
+        """
+        This method moves entries with outdated counts down the heap until the
+            top one is the least counted word.
+
+        Return:
+        < tuple > -- ( < int > count, < int > slot ) of the least counted word
+
+        """
+        heap = self._heap
+        counts = self._counts
+
+        while True:
+            slot = heap[0] & _SLOT_MASK
+            count = counts[slot]
+            if heap[0] >> _SLOT_BITS == count:
+                return count, slot
+            heapq.heapreplace(heap, count << _SLOT_BITS | slot)
+
+    def update(self, words):
+        """
+        This method counts words.
+
+        Keyword arguments:
+        words -- < iterable > of < string > words OR < dict >
+            { < string > word: < int > count }
+
+        """
+        if not isinstance(words, Mapping):
+            words = Counter(words)
+
+        slots = self._slots
+        counts = self._counts
+
+        self.total += sum(words.values())
+
+        for word, count in words.items():
+            slot = slots.get(word)
+
+            if slot is not None:
+                counts[slot] += count
+
+            elif len(counts) < self.capacity:
+                slot = len(counts)
+                slots[word] = slot
+                self._words.append(word)
+                counts.append(count)
+                self._errors.append(0)
+                heapq.heappush(self._heap, count << _SLOT_BITS | slot)
+
+            else:
+                min_count, slot = self._fix_min()
+                del slots[self._words[slot]]
+
+                slots[word] = slot
+                self._words[slot] = word
+                counts[slot] = min_count + count
+                self._errors[slot] = min_count
+                heapq.heapreplace(self._heap,
+                                    (min_count + count) << _SLOT_BITS | slot)
+
+    def items(self):
+        """
+        This method returns ( word, count ) pairs of kept words.
+
+        """
+        return zip(self._words, self._counts)
+
+    def error(self, word):
+        """
+        This method returns how much the count of the kept word may be higher
+            than the true one.
+
+        """
+        slot = self._slots.get(word)
+        if slot is None:
+            return 0
+
+        return self._errors[slot]
+
+    def max_error(self):
+        """
+        This method returns the highest possible error of counts of words
+            that are kept now or have been dropped (0 until the summary is
+            full).
+
+        """
+        if len(self._counts) < self.capacity:
+            return 0
+
+        return self._fix_min()[0]
+
+    def __contains__(self, word):
+        return word in self._slots
+
+    def __getitem__(self, word):
+        slot = self._slots.get(word)
+        if slot is None:
+            return 0
+
+        return self._counts[slot]
+
+    def __len__(self):
+        return len(self._counts)
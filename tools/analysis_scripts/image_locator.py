@@ -0,0 +1,318 @@
+"""
+This module finds image files by name in a list of image directories without
+    checking every directory on every lookup.
+
+Directories are crawled by a pool of threads with os.scandir (subdirectories
+    are crawled too, file names are kept relative to the image directory).
+    Listings are saved to a cache file together with modification times of
+    the directories, so the next refresh lists again only directories whose
+    modification time has changed (a file has been added, removed or renamed
+    in them) and only stats the others.
+
+Cache file view:
+
+{
+    "version": < int >,
+    "roots": {
+        "/path/to/img_dir": {
+            "relative/dir": [ < int > mtime_ns, [ < file names > ],
+                                                [ < subdirectory names > ] ],
+            ...
+        }, ...
+    }
+}
+
+Usage in code:
+
+    locator = ImageLocator(['/coco/train2017', '/gcc/pics'], 'images.json')
+    locator.refresh()
+    locator.locate('000000203564.jpg')  # [ '/coco/train2017/000000...jpg' ]
+    locator.resolve(file_names)  # { file name: [ < paths > ], ... }
+
+"""
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+import os
+import sys
+import json
+import argparse
+
+# layout version of the cache file, caches of other versions are not used
+_CACHE_VERSION = 1
+
+def _a_parse():
+    """
+    This function is a simple argument parser. Checks if paths in arguments are
+        right & checks if directories exist.
+
+    Return:
+    < dict > -- {
+                'image_dir_list': < list > of < string >,
+                'cache_path': < string > OR None,
+                'workers': < int >,
+                'mscoco_file': < string > OR None
+                }
+
+    """
+    a_parser = argparse.ArgumentParser()
+    a_parser.add_argument(
+                '-d',
+                '--image_dir_list',
+                metavar='/path/to/img_dir_1 /path/to/img_dir_2',
+                nargs='+',
+                required=True,
+                help='list of paths to image directories')
+
+    a_parser.add_argument(
+                '-c',
+                '--cache_path',
+                metavar='/path/to/cache.json',
+                required=False,
+                help='path to cache file of directory listings')
+
+    a_parser.add_argument(
+                '-w',
+                '--workers',
+                metavar='int',
+                default=8,
+                type=int,
+                help='number of threads that list directories')
+
+    a_parser.add_argument(
+                '--mscoco_file',
+                metavar='/path/to/mscoco.json',
+                required=False,
+                help='check that all images of mscoco json file are found')
+
+    args = vars(a_parser.parse_args())
+
+    for image_dir in args.get('image_dir_list'):
+        if os.path.isdir(image_dir) != True:
+            print('\n[ERROR]: < {} > is not a directory.'.format(image_dir))
+            sys.exit(1)
+
+    if args.get('workers') < 1:
+        print('\n[ERROR]: number of workers must be positive.')
+        sys.exit(1)
+
+    if args.get('mscoco_file') is not None and \
+                            os.path.isfile(args.get('mscoco_file')) != True:
+        print('\n[ERROR]: mscoco_file is not a file.')
+        sys.exit(1)
+
+    return args
+
+def _refresh_directory(root_dir, rel_dir, known_entry):
+    """
+    This function lists the directory if it has changed since known_entry has
+        been made.
+
+    Keyword arguments:
+    root_dir -- < string > image directory
+    rel_dir -- < string > directory relative to root_dir ('' for root_dir)
+    known_entry -- < list > OR None [ mtime_ns, files, subdirectories ] of the
+        previous listing
+
+    Return:
+    < tuple > -- ( < list > OR None entry or None if directory has vanished,
+                    < int > 1 if directory has been listed else 0 )
+
+    """
+    dir_path = os.path.join(root_dir, rel_dir)
+
+    # modification time is taken before listing, so changes made during
+    # listing are seen by the next refresh
+    try:
+        mtime_ns = os.stat(dir_path).st_mtime_ns
+    except OSError:
+        return None, 0
+
+    if known_entry is not None and known_entry[0] == mtime_ns:
+        return known_entry, 0
+
+    files = []
+    subdirs = []
+
+    try:
+        with os.scandir(dir_path) as dir_entries:
+            for dir_entry in dir_entries:
+                try:
+                    if dir_entry.is_dir(follow_symlinks=False):
+                        subdirs.append(dir_entry.name)
+                    elif dir_entry.is_file():
+                        files.append(dir_entry.name)
+                except OSError:
+                    continue
+    except OSError:
+        return None, 0
+
+    return [mtime_ns, files, subdirs], 1
+
+def crawl_directory(root_dir, known_dirs=None, workers=8):
+    """
+    This function lists the directory tree by a pool of threads. Directories
+        that have not changed since known_dirs listing are not listed again.
+
+    Keyword arguments:
+    root_dir -- < string > image directory
+    known_dirs -- < dict > OR None previous result of the function
+    workers -- < int > number of threads
+
+    Return:
+    < tuple > -- ( < dict > { < string > relative directory: [ mtime_ns,
+        files, subdirectories ], ... }, < int > number of listed directories )
+
+    """
+    if known_dirs is None:
+        known_dirs = {}
+
+    crawled_dirs = {}
+    listed_count = 0
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = {executor.submit(
+                    _refresh_directory, root_dir, '', known_dirs.get('')): ''}
+
+        while pending:
+            done_set, _ = wait(pending, return_when=FIRST_COMPLETED)
+
+            for future in done_set:
+                rel_dir = pending.pop(future)
+                dir_info, listed = future.result()
+                if dir_info is None:
+                    continue
+
+                crawled_dirs[rel_dir] = dir_info
+                listed_count += listed
+
+                for subdir in dir_info[2]:
+                    sub_rel_dir = os.path.join(rel_dir, subdir)
+                    pending[executor.submit(_refresh_directory, root_dir,
+                        sub_rel_dir, known_dirs.get(sub_rel_dir))] = sub_rel_dir
+
+    return crawled_dirs, listed_count
+
+class ImageLocator:
+    """
+    This class finds image files by name (path relative to image directory)
+        in the list of image directories.
+
+    """
+    def __init__(self, image_dir_list, cache_path=None, workers=8):
+        """
+        Keyword arguments:
+        image_dir_list -- < list > of < string > image directories. Paths are
+            returned in the order of directories
+        cache_path -- < string > OR None path to cache file of listings
+        workers -- < int > number of threads that list directories
+
+        """
+        self.image_dir_list = [os.path.abspath(image_dir)
+                                            for image_dir in image_dir_list]
+        self.cache_path = cache_path
+        self.workers = workers
+
+        self._roots = {}
+        self._paths = {}
+
+        if cache_path is not None and os.path.isfile(cache_path):
+            with open(cache_path, 'r') as cache_file:
+                cache_data = json.load(cache_file)
+            if cache_data.get('version') == _CACHE_VERSION:
+                self._roots = cache_data.get('roots')
+
+    def refresh(self):
+        """
+        This method lists changed directories, rebuilds name -> path mapping
+            and saves the cache.
+
+        Return:
+        < int > -- number of directories that have been listed
+
+        """
+        listed_count = 0
+        roots = {}
+
+        for image_dir in self.image_dir_list:
+            roots[image_dir], dir_listed = crawl_directory(
+                        image_dir, self._roots.get(image_dir), self.workers)
+            listed_count += dir_listed
+
+        self._roots = roots
+        self._paths = {}
+
+        for image_dir in self.image_dir_list:
+            for rel_dir, dir_info in self._roots[image_dir].items():
+                for filename in dir_info[1]:
+                    rel_path = os.path.join(rel_dir, filename)
+                    self._paths.setdefault(rel_path, []).append(
+                                            os.path.join(image_dir, rel_path))
+
+        if self.cache_path is not None:
+            self.save_cache()
+
+        return listed_count
+
+    def save_cache(self):
+        """
+        This method saves listings to the cache file.
+
+        """
+        tmp_path = self.cache_path + '.tmp'
+        with open(tmp_path, 'w') as cache_file:
+            json.dump({'version': _CACHE_VERSION, 'roots': self._roots},
+                                            cache_file, ensure_ascii=False)
+        os.replace(tmp_path, self.cache_path)
+
+    def __len__(self):
+        return len(self._paths)
+
+    def locate(self, filename):
+        """
+        This method returns paths of the file in image directories.
+
+        Keyword arguments:
+        filename -- < string > file name (or path relative to image directory)
+
+        Return:
+        < list > of < string > -- paths in the order of image directories
+
+        """
+        return list(self._paths.get(os.path.normpath(filename), []))
+
+    def resolve(self, filenames):
+        """
+        This method finds paths of many files.
+
+        Keyword arguments:
+        filenames -- < iterable > of < string > file names
+
+        Return:
+        < dict > -- { < string > file name: < list > of < string > paths }
+
+        """
+        return {filename: self.locate(filename) for filename in filenames}
+
+if __name__ == '__main__':
+
+    args = _a_parse()
+
+    locator = ImageLocator(args.get('image_dir_list'), args.get('cache_path'),
+                                                            args.get('workers'))
+    listed_count = locator.refresh()
+    print('Listed directories: {}. Files found: {}.'.format(
+                                                    listed_count, len(locator)))
+
+    if args.get('mscoco_file') is not None:
+        with open(args.get('mscoco_file'), 'r') as json_file:
+            mscoco_data = json.load(json_file)
+
+        file_names = [image_info.get('file_name')
+                                for image_info in mscoco_data.get('images')]
+        missing_names = [file_name for file_name, paths in
+                        locator.resolve(file_names).items() if len(paths) == 0]
+
+        print('Images: {}, not found: {}.'.format(
+                                        len(file_names), len(missing_names)))
+        for file_name in missing_names[:20]:
+            print('\t' + file_name)
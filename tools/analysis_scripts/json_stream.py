@@ -0,0 +1,161 @@
+"""
+This module reads elements of a list of a big json file one by one, so the
+    whole file does not have to be loaded into memory. It is made for MSCOCO
+    files:
+
+    for annotation in iter_json_array('captions_train2017.json',
+                                                                'annotations'):
+        print(annotation.get('caption'))
+
+The file is read by blocks into a buffer, values are parsed by
+    json.JSONDecoder.raw_decode (the C parser of json module) and the buffer
+    is refilled when a value is cut by its end. Elements of other lists of the
+    top-level object ("images" goes before "annotations") are parsed & dropped
+    one by one too, other values are parsed whole.
+
+"""
+import re
+import json
+
+from json.decoder import WHITESPACE
+
+# number of characters that are read from the file at once
+_READ_SIZE = 1 << 16
+
+# the rest of the buffer after a value that may be a cut number: "2." of
+# "2.5" is parsed as 2
+_CUT_TAIL = re.compile(r'[0-9.eE+\-]*\Z')
+
+class _JSONBuffer:
+    """
+    This class keeps the not yet parsed part of the file.
+
+    """
+    def __init__(self, json_file, read_size=_READ_SIZE):
+        self._file = json_file
+        self._read_size = read_size
+        self._decoder = json.JSONDecoder()
+        self.text = ''
+        self.pos = 0
+        self.eof = False
+
+    def refill(self):
+        """
+        This method drops the parsed part of the buffer & reads the next block
+            (at least as long as the buffer, so long values are parsed in
+            linear time).
+
+        Return:
+        < bool > -- False if the file has ended
+
+        """
+        if self.eof:
+            return False
+
+        block = self._file.read(max(self._read_size, len(self.text) - self.pos))
+        self.text = self.text[self.pos:] + block
+        self.pos = 0
+        if block == '':
+            self.eof = True
+
+        return block != ''
+
+    def peek(self):
+        """
+        This method skips whitespace & returns the next character ('' at the
+            end of the file).
+
+        """
+        while True:
+            self.pos = WHITESPACE.match(self.text, self.pos).end()
+            if self.pos < len(self.text):
+                return self.text[self.pos]
+            if not self.refill():
+                return ''
+
+    def expect(self, characters):
+        """
+        This method takes the next character that must be one of characters.
+
+        """
+        character = self.peek()
+        if character == '' or character not in characters:
+            raise ValueError('expected one of "{}" at {!r}'.format(
+                        characters, self.text[self.pos:self.pos + 20]))
+        self.pos += 1
+
+        return character
+
+    def decode(self):
+        """
+        This method parses the next value. A value that is followed only by
+            characters of a number up to the end of the buffer may be cut, so
+            it is parsed again after refill.
+
+        """
+        self.peek()
+
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self.text, self.pos)
+                if self.eof or not _CUT_TAIL.match(self.text, end):
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+
+            self.refill()
+
+def _iter_array(buffer):
+    """
+    This generator yields elements of the list that starts at the buffer
+        position.
+
+    """
+    buffer.expect('[')
+    if buffer.peek() == ']':
+        buffer.pos += 1
+        return
+
+    while True:
+        yield buffer.decode()
+        if buffer.expect(',]') == ']':
+            return
+
+def iter_json_array(json_path, key, read_size=_READ_SIZE):
+    """
+    This generator yields elements of the list with the key of the top-level
+        object of the json file. Reading stops at the end of the list.
+
+    Keyword arguments:
+    json_path -- < string > path to json file
+    key -- < string > key of the list ('annotations' or 'images')
+    read_size -- < int > number of characters read at once
+
+    Yield:
+    element of the list (< dict > for MSCOCO lists)
+
+    """
+    with open(json_path, 'r') as json_file:
+        buffer = _JSONBuffer(json_file, read_size)
+        buffer.expect('{')
+        if buffer.peek() == '}':
+            return
+
+        while True:
+            current_key = buffer.decode()
+            buffer.expect(':')
+
+            if current_key == key:
+                yield from _iter_array(buffer)
+                return
+
+            if buffer.peek() == '[':
+                for _ in _iter_array(buffer):
+                    pass
+            else:
+                buffer.decode()
+
+            if buffer.expect(',}') == '}':
+                return
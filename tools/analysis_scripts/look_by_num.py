@@ -4,16 +4,34 @@ This module provides the ability to verify the correct mapping of annotations
 It was created in case if during the process of manipulating files, the
     position of the annotations in the "Signature" field has changed and does
     not match the indicated picture.
+With --use_index json files are not loaded: annotations & images are found in
+    SQLite indices (see mscoco_index.py) that are built on the first run.
+With --image_cache image directories are listed once into a file name -> path
+    index (see image_locator.py), so pictures are not searched in every
+    directory; the next runs list again only directories that have changed.
+With --browse captions are browsed one after another (next / previous /
+    random); pictures of the next captions are read & downscaled ahead by a
+    background thread and kept in a bounded LRU cache (see prefetch_cache.py).
+    With --render_dir pictures of --render_count captions are written to the
+    directory with captions.json instead of being shown, so many samples can
+    be reviewed without a display.
 
 """
 import os
 import sys
 import json
+import random
 import argparse
 
+from functools import partial
+
 import cv2
 import numpy
 
+from mscoco_index import MSCOCOIndex, open_index
+from image_locator import ImageLocator
+from prefetch_cache import PrefetchCache
+
 def _a_parse():
     """
     This function is a simple argument parser. Checks if paths in arguments are
@@ -23,7 +41,17 @@ def _a_parse():
     < dict > -- {
                     'mscoco_file': < string >,
                     'image_dir_list': < list > of < string >,
-                    'ru_mscoco_file': < string >
+                    'ru_mscoco_file': < string >,
+                    'use_index': < bool >,
+                    'image_cache': < string > OR None,
+                    'browse': < bool >,
+                    'render_dir': < string > OR None,
+                    'render_count': < int >,
+                    'random_sample': < bool >,
+                    'start_id': < int > OR None,
+                    'prefetch': < int >,
+                    'cache_size': < int >,
+                    'max_side': < int >
                 }
 
     """
@@ -47,6 +75,70 @@ def _a_parse():
                 required=False,
                 help='path to source ru_mscoco json file')
 
+    a_parser.add_argument(
+                '--use_index',
+                action='store_true',
+                help='find captions in SQLite indices of json files ' + \
+                    'instead of loading them (indices are built once)')
+
+    a_parser.add_argument(
+                '--image_cache',
+                metavar='/path/to/image_cache.json',
+                required=False,
+                help='find images in index of image directories that is ' + \
+                    'saved to this file & refreshed on every run')
+
+    a_parser.add_argument(
+                '--browse',
+                action='store_true',
+                help='browse captions one after another with prefetching')
+
+    a_parser.add_argument(
+                '--render_dir',
+                metavar='/path/to/render_dir',
+                required=False,
+                help='write pictures of captions to this directory ' + \
+                    'instead of showing them')
+
+    a_parser.add_argument(
+                '--render_count',
+                metavar='int',
+                default=100,
+                type=int,
+                help='number of captions that are rendered')
+
+    a_parser.add_argument(
+                '--random_sample',
+                action='store_true',
+                help='render random captions instead of consecutive ones')
+
+    a_parser.add_argument(
+                '--start_id',
+                metavar='int',
+                type=int,
+                help='id of the first caption to browse or render')
+
+    a_parser.add_argument(
+                '--prefetch',
+                metavar='int',
+                default=8,
+                type=int,
+                help='number of captions whose pictures are read ahead')
+
+    a_parser.add_argument(
+                '--cache_size',
+                metavar='int',
+                default=64,
+                type=int,
+                help='max number of pictures kept in memory')
+
+    a_parser.add_argument(
+                '--max_side',
+                metavar='int',
+                default=800,
+                type=int,
+                help='pictures are downscaled to this max side (0 - never)')
+
     args = vars(a_parser.parse_args())
     mscoco_file = os.path.abspath(args.get('mscoco_file'))
     image_dir_list = args.get('image_dir_list')
@@ -70,6 +162,18 @@ def _a_parse():
         print('\n[ERROR]: mscoco_file is not a file.')
         sys.exit(1)
 
+    if args.get('render_dir') is not None:
+        if os.path.exists(args.get('render_dir')) and \
+                                os.path.isdir(args.get('render_dir')) != True:
+            print('\n[ERROR]: render_dir is not a directory.')
+            sys.exit(1)
+
+    if args.get('render_count') < 1 or args.get('prefetch') < 0 or \
+                        args.get('cache_size') < 1 or args.get('max_side') < 0:
+        print('\n[ERROR]: render_count & cache_size must be positive, ' + \
+                                        'prefetch & max_side non-negative.')
+        sys.exit(1)
+
     for image_dir in image_dir_list:
         if os.path.exists(image_dir) != True:
             print('\n[ERROR]: < {} > does not exists.'.format(image_dir))
@@ -79,9 +183,9 @@ def _a_parse():
             print('\n[ERROR]: < {} > is not a directory.'.format(image_dir))
             sys.exit(1)
 
-    args = {'mscoco_file': mscoco_file,
-            'image_dir_list': image_dir_list,
-            'ru_mscoco_file': ru_mscoco_file}
+    args.update({'mscoco_file': mscoco_file,
+                'image_dir_list': image_dir_list,
+                'ru_mscoco_file': ru_mscoco_file})
 
     return args
 
@@ -111,7 +215,7 @@ def read_json(json_path):
 
     return json_data
 
-def find_picture(image_dir_list, filename):
+def find_picture(image_dir_list, filename, locator=None):
     """
     This method searches filename in every image directory from list. If it
         finds 1 or more it reads them and returns list of dicts with name and
@@ -120,6 +224,8 @@ def find_picture(image_dir_list, filename):
     Keyword arguments:
     image_dir_list -- < list > of < dict >
     filename -- < string > filename of image to find.
+    locator -- < ImageLocator > OR None index of image directories (see
+        image_locator.py). If specified then paths are taken from it
 
     Return:
     < list > of < dict > -- images that has been found.
@@ -133,6 +239,11 @@ def find_picture(image_dir_list, filename):
     """
     result_list = []
 
+    if locator is not None:
+        for path in locator.locate(filename):
+            result_list.append({'path':path, 'image': cv2.imread(path)})
+        return result_list
+
     for image_dir in image_dir_list:
         path = os.path.join(image_dir, filename)
         if os.path.exists(path):
@@ -147,7 +258,8 @@ def find_caption_element(mscoco_data, caption_id):
         pair of keys extracted from "images" & "annotations".
 
     Keyword argumnets:
-    mscoco_data -- < dict > with following fields:
+    mscoco_data -- < MSCOCOIndex > index of json file (see mscoco_index.py) or
+        < dict > with following fields:
         {
             "images": [
                     {
@@ -194,6 +306,9 @@ def find_caption_element(mscoco_data, caption_id):
         }
 
     """
+    if hasattr(mscoco_data, 'find_caption_element'):
+        return mscoco_data.find_caption_element(caption_id)
+
     for annotation in mscoco_data.get('annotations'):
         if annotation.get('id') == caption_id:
             break
@@ -210,14 +325,342 @@ def find_caption_element(mscoco_data, caption_id):
 
     return {'annotation':annotation, 'image':image_info}
 
-def input_cycle(mscoco_data, image_dir_list, ru_mscoco_data=None):
+def show_pictures(image_info_list):
+    """
+    This method prints paths of the images & shows them.
+
+    Keyword arguments:
+    image_info_list -- < list > of < dict > result of find_picture
+
+    """
+    if len(image_info_list) > 0:
+        for image_info in image_info_list:
+            print('Path:', image_info.get('path'))
+
+            cv2.destroyAllWindows()
+            if image_info.get('image') is not None:
+                cv2.imshow(image_info.get('path'), image_info.get('image'))
+                cv2.waitKey(100)
+        print()
+    else:
+        print('\n[ATTENTION]: Image has not found.\n')
+
+def downscale_image(image, max_side):
+    """
+    This method downscales the image so that its longest side is not longer
+        than max_side. Smaller images are returned as they are.
+
+    Keyword arguments:
+    image -- < numpy.ndarray > OR None image
+    max_side -- < int > max length of a side in pixels (0 - no downscaling)
+
+    Return:
+    < numpy.ndarray > OR None -- image
+
+    """
+    if image is None or max_side == 0:
+        return image
+
+    height, width = image.shape[:2]
+    scale = max_side / max(height, width)
+    if scale >= 1:
+        return image
+
+    return cv2.resize(image, (max(1, round(width * scale)),
+                max(1, round(height * scale))), interpolation=cv2.INTER_AREA)
+
+def get_caption_source(mscoco_data):
+    """
+    This method prepares mscoco_data for browsing: returns ids of captions in
+        browsing order & function that finds caption element by id in constant
+        (dict) or logarithmic (index) time.
+
+    Keyword arguments:
+    mscoco_data -- < MSCOCOIndex > or < dict > (see find_caption_element)
+
+    Return:
+    < tuple > -- ( < list > of < int > caption ids in the order of the file
+        (ascending for index), < function > id -> caption element or None )
+
+    """
+    if hasattr(mscoco_data, 'get_annotation_ids'):
+        return mscoco_data.get_annotation_ids(), \
+                                            mscoco_data.find_caption_element
+
+    # the first element with an id wins, as in find_caption_element
+    annotations_by_id = {}
+    for annotation in mscoco_data.get('annotations'):
+        annotations_by_id.setdefault(annotation.get('id'), annotation)
+
+    images_by_id = {}
+    for image_info in mscoco_data.get('images'):
+        images_by_id.setdefault(image_info.get('id'), image_info)
+
+    def find_caption(caption_id):
+        annotation = annotations_by_id.get(caption_id)
+        if annotation is None:
+            return None
+        return {'annotation': annotation,
+                'image': images_by_id.get(annotation.get('image_id'))}
+
+    return list(annotations_by_id), find_caption
+
+def _load_pictures(filename, image_dir_list, locator, max_side):
+    """
+    This method reads & downscales images of the file name. It is called by
+        background threads of PrefetchCache.
+
+    """
+    image_info_list = find_picture(image_dir_list, filename, locator)
+    for image_info in image_info_list:
+        image_info['image'] = downscale_image(image_info.get('image'), max_side)
+
+    return image_info_list
+
+def _get_filename(find_caption, caption_id):
+    """
+    This method returns file name of the image of the caption or None.
+
+    """
+    caption_element = find_caption(caption_id)
+    if caption_element is None or caption_element.get('image') is None:
+        return None
+
+    return caption_element['image'].get('file_name')
+
+def _prefetch_positions(cache, caption_ids, find_caption, positions):
+    """
+    This method schedules reading of images of captions at positions.
+
+    """
+    filenames = []
+    for position in positions:
+        if 0 <= position < len(caption_ids):
+            filename = _get_filename(find_caption, caption_ids[position])
+            if filename is not None and filename not in filenames:
+                filenames.append(filename)
+
+    cache.prefetch(filenames)
+
+def _get_ru_caption(find_ru_caption, caption_id):
+    """
+    This method returns RU caption with the id or None.
+
+    """
+    if find_ru_caption is None:
+        return None
+
+    ru_element = find_ru_caption(caption_id)
+    if ru_element is None:
+        return None
+
+    return ru_element['annotation'].get('caption')
+
+def browse_cycle(mscoco_data, image_dir_list, ru_mscoco_data=None,
+                locator=None, start_id=None, prefetch_count=8, cache_size=64,
+                                                                max_side=800):
+    """
+    This method loops over user commands & shows captions one after another.
+        While a caption is shown, images of the next captions (and of the
+        previous one & of the next random ones) are read & downscaled by a
+        background thread.
+
+    Commands: "n" or empty -- next caption, "p" -- previous caption, "r" --
+        random caption, < int > -- caption with this id, "exit" -- quit.
+
+    Keyword arguments:
+    mscoco_data -- < MSCOCOIndex > or < dict > (see input_cycle)
+    image_dir_list -- < list > of < string > paths to image directories
+    ru_mscoco_data -- < MSCOCOIndex > or < dict > OR None
+    locator -- < ImageLocator > OR None index of image directories
+    start_id -- < int > OR None id of the first caption
+    prefetch_count -- < int > number of next captions whose images are read
+        ahead
+    cache_size -- < int > max number of images kept in memory
+    max_side -- < int > images are downscaled to this max side (0 - never)
+
+    """
+    caption_ids, find_caption = get_caption_source(mscoco_data)
+    if len(caption_ids) == 0:
+        print('\n[ATTENTION]: there are no captions.\n')
+        return
+
+    if ru_mscoco_data is not None:
+        _, find_ru_caption = get_caption_source(ru_mscoco_data)
+    else:
+        find_ru_caption = None
+
+    positions_by_id = {caption_id: position
+                            for position, caption_id in enumerate(caption_ids)}
+    position = positions_by_id.get(start_id, 0)
+    random_positions = [random.randrange(len(caption_ids))
+                                            for _ in range(prefetch_count)]
+
+    load_function = partial(_load_pictures, image_dir_list=image_dir_list,
+                                        locator=locator, max_side=max_side)
+
+    print('\nCommands: "n" or Enter - next, "p" - previous, "r" - random, ' + \
+                                'caption id - go to it, "exit" - quit.\n')
+
+    with PrefetchCache(load_function, cache_size) as cache:
+        while True:
+            caption_id = caption_ids[position]
+            caption_element = find_caption(caption_id)
+            print('[{}/{}] Caption id: {}'.format(
+                                position + 1, len(caption_ids), caption_id))
+            print('Caption:', caption_element['annotation']['caption'])
+
+            if find_ru_caption is not None:
+                print('RU-Caption:', _get_ru_caption(find_ru_caption,
+                                                                caption_id))
+
+            filename = _get_filename(find_caption, caption_id)
+            if filename is None:
+                print('\n[ATTENTION]: Image has not found.\n')
+            else:
+                try:
+                    show_pictures(cache.get(filename))
+                except Exception as error:
+                    print('\n[img-info-ERROR]: {}.\n'.format(error))
+
+            upcoming_positions = [position + step
+                                    for step in range(1, prefetch_count + 1)]
+            _prefetch_positions(cache, caption_ids, find_caption,
+                    upcoming_positions + [position - 1] + random_positions)
+
+            user_input = input('Command: > ').strip()
+
+            if user_input == 'exit':
+                break
+
+            if user_input in ['', 'n']:
+                position = min(position + 1, len(caption_ids) - 1)
+            elif user_input == 'p':
+                position = max(position - 1, 0)
+            elif user_input == 'r':
+                if len(random_positions) > 0:
+                    position = random_positions.pop(0)
+                    random_positions.append(
+                                        random.randrange(len(caption_ids)))
+                else:
+                    position = random.randrange(len(caption_ids))
+            else:
+                try:
+                    position = positions_by_id[abs(int(user_input))]
+                except (ValueError, KeyError):
+                    print('\nCaption with specified id has not found.\n')
+
+def render_samples(mscoco_data, image_dir_list, render_dir, render_count,
+                ru_mscoco_data=None, locator=None, start_id=None,
+                random_sample=False, prefetch_count=8, cache_size=64,
+                                                                max_side=800):
+    """
+    This method writes images of captions to render_dir instead of showing
+        them & writes captions.json with the captions:
+
+        [
+            {
+                "id": < int > caption id,
+                "caption": < string >,
+                "ru_caption": < string > OR None,
+                "file_name": < string > OR None,
+                "paths": [ < string > source images ],
+                "renders": [ < string > written images ]
+            }, ...
+        ]
+
+        Images of the next captions are read & downscaled ahead by a
+        background thread.
+
+    Keyword arguments:
+    mscoco_data -- < MSCOCOIndex > or < dict > (see input_cycle)
+    image_dir_list -- < list > of < string > paths to image directories
+    render_dir -- < string > path to output directory
+    render_count -- < int > number of captions
+    ru_mscoco_data -- < MSCOCOIndex > or < dict > OR None
+    locator -- < ImageLocator > OR None index of image directories
+    start_id -- < int > OR None id of the first caption (consecutive mode)
+    random_sample -- < bool > take random captions instead of consecutive
+    prefetch_count -- < int > number of next captions read ahead
+    cache_size -- < int > max number of images kept in memory
+    max_side -- < int > images are downscaled to this max side (0 - never)
+
+    Return:
+    < list > of < dict > -- captions.json elements
+
+    """
+    caption_ids, find_caption = get_caption_source(mscoco_data)
+
+    if ru_mscoco_data is not None:
+        _, find_ru_caption = get_caption_source(ru_mscoco_data)
+    else:
+        find_ru_caption = None
+
+    if random_sample:
+        positions = random.sample(range(len(caption_ids)),
+                                        min(render_count, len(caption_ids)))
+    else:
+        positions_by_id = {caption_id: position
+                            for position, caption_id in enumerate(caption_ids)}
+        first_position = positions_by_id.get(start_id, 0)
+        positions = list(range(first_position,
+                        min(first_position + render_count, len(caption_ids))))
+
+    os.makedirs(render_dir, exist_ok=True)
+
+    load_function = partial(_load_pictures, image_dir_list=image_dir_list,
+                                        locator=locator, max_side=max_side)
+    rendered_list = []
+
+    with PrefetchCache(load_function, cache_size) as cache:
+        for index, position in enumerate(positions):
+            _prefetch_positions(cache, caption_ids, find_caption,
+                            positions[index + 1:index + 1 + prefetch_count])
+
+            caption_id = caption_ids[position]
+            filename = _get_filename(find_caption, caption_id)
+
+            if filename is not None:
+                image_info_list = cache.get(filename)
+            else:
+                image_info_list = []
+
+            renders = []
+            for image_number, image_info in enumerate(image_info_list):
+                if image_info.get('image') is None:
+                    continue
+
+                render_path = os.path.join(render_dir, '{}_{}{}'.format(
+                                caption_id, image_number,
+                                os.path.splitext(filename)[1] or '.jpg'))
+                if cv2.imwrite(render_path, image_info.get('image')):
+                    renders.append(render_path)
+
+            rendered_list.append({
+                'id': caption_id,
+                'caption': find_caption(caption_id)['annotation'].get(
+                                                                    'caption'),
+                'ru_caption': _get_ru_caption(find_ru_caption, caption_id),
+                'file_name': filename,
+                'paths': [image_info.get('path')
+                                        for image_info in image_info_list],
+                'renders': renders
+            })
+
+    with open(os.path.join(render_dir, 'captions.json'), 'w') as json_file:
+        json.dump(rendered_list, json_file, ensure_ascii=False, indent=3)
+
+    return rendered_list
+
+def input_cycle(mscoco_data, image_dir_list, ru_mscoco_data=None,
+                                                                locator=None):
     """
     This method loops over user input. Accesses the specified cell, reads
         annotation with the image & shows them. If ru_mscoco_data specified
         then its annotation displays too.
 
     Keyword arguments:
-    mscoco_data -- < dict > with following fields:
+    mscoco_data -- < MSCOCOIndex > or < dict > with following fields:
         {
             "images": [
                     {
@@ -236,6 +679,7 @@ def input_cycle(mscoco_data, image_dir_list, ru_mscoco_data=None):
         }
     image_dir_list: < list > of < string > paths to image directories.
     ru_mscoco_file -- < dict > with fields described above (mscoco_data)
+    locator -- < ImageLocator > OR None index of image directories
 
     """
     user_input = '-2'
@@ -266,25 +710,14 @@ def input_cycle(mscoco_data, image_dir_list, ru_mscoco_data=None):
 
                 try:
                     image_info_list = find_picture(image_dir_list,
-                                        caption_element['image']['file_name'])
+                                caption_element['image']['file_name'], locator)
 
                 except Exception as error_2:
                     image_info_list = None
                     print('\n[img-info-ERROR]: {}.\n'.format(error_2))
 
                 if image_info_list is not None:
-                    if len(image_info_list) > 0:
-                        for image_info in image_info_list:
-                            print('Path:', image_info.get('path'))
-
-                            cv2.destroyAllWindows()
-                            if image_info.get('image') is not None:
-                                cv2.imshow(image_info.get('path'),
-                                            image_info.get('image'))
-                                cv2.waitKey(100)
-                        print()
-                    else:
-                        print('\n[ATTENTION]: Image has not found.\n')
+                    show_pictures(image_info_list)
 
         except Exception as error:
             print('\n[ERROR]: {}.\n'.format(error))
@@ -293,12 +726,52 @@ def input_cycle(mscoco_data, image_dir_list, ru_mscoco_data=None):
 if __name__ == '__main__':
 
     args = _a_parse()
-    mscoco_data = read_json(args.get('mscoco_file'))
 
-    if args.get('ru_mscoco_file') is not None:
-        ru_mscoco_data = read_json(args.get('ru_mscoco_file'))
+    if args.get('use_index'):
+        read_data = open_index
     else:
-        ru_mscoco_data = None
-
-    input_cycle(mscoco_data, args.get('image_dir_list'), ru_mscoco_data)
-    cv2.destroyAllWindows()
+        read_data = read_json
+
+    mscoco_data = read_data(args.get('mscoco_file'))
+    ru_mscoco_data = None
+
+    try:
+        if args.get('ru_mscoco_file') is not None:
+            ru_mscoco_data = read_data(args.get('ru_mscoco_file'))
+
+        if args.get('image_cache') is not None:
+            locator = ImageLocator(args.get('image_dir_list'),
+                                                    args.get('image_cache'))
+            print('Listed directories: {}. Files found: {}.'.format(
+                                            locator.refresh(), len(locator)))
+        else:
+            locator = None
+
+        if args.get('render_dir') is not None:
+            rendered_list = render_samples(mscoco_data,
+                    args.get('image_dir_list'), args.get('render_dir'),
+                    args.get('render_count'), ru_mscoco_data, locator,
+                    args.get('start_id'), args.get('random_sample'),
+                    args.get('prefetch'), args.get('cache_size'),
+                    args.get('max_side'))
+            print('Rendered captions: {}, without images: {}.'.format(
+                    len(rendered_list), len([element for element in
+                    rendered_list if len(element.get('renders')) == 0])))
+
+        elif args.get('browse'):
+            browse_cycle(mscoco_data, args.get('image_dir_list'),
+                    ru_mscoco_data, locator, args.get('start_id'),
+                    args.get('prefetch'), args.get('cache_size'),
+                    args.get('max_side'))
+            cv2.destroyAllWindows()
+
+        else:
+            input_cycle(mscoco_data, args.get('image_dir_list'),
+                                                    ru_mscoco_data, locator)
+            cv2.destroyAllWindows()
+
+    finally:
+        # indices keep SQLite connections open
+        for data in [mscoco_data, ru_mscoco_data]:
+            if isinstance(data, MSCOCOIndex):
+                data.close()
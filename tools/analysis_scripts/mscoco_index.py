@@ -0,0 +1,378 @@
+"""
+This module builds persistent SQLite index of MSCOCO json file, so that
+    annotations & images can be found by id or file name without reading the
+    json file:
+
+    annotations ( id PRIMARY KEY, image_id, data )
+    images ( id PRIMARY KEY, file_name, data )
+    meta ( key PRIMARY KEY, value )
+
+"data" is the element of the json file as JSON text. Lookups by annotation id
+    and image id use primary keys, lookups by image id of annotations and by
+    file name of images use secondary indices, so every lookup takes
+    O(log n) time. Elements without an id can not be found by id and are not
+    indexed.
+
+The index is built once (json file is parsed only then) and is rebuilt if size
+    or modification time of the json file have changed. If an id occurs more
+    than once then the first element is kept, as a linear search would find.
+
+Usage as a script:
+
+    python mscoco_index.py -s mscoco.json
+    python mscoco_index.py -s mscoco.json --annotation_id 37
+    python mscoco_index.py -s mscoco.json --file_name 000000203564.jpg
+
+"""
+import os
+import sys
+import json
+import sqlite3
+import argparse
+import urllib.parse
+
+# version of the index layout, indices of other versions are rebuilt
+_INDEX_VERSION = '2'
+
+# number of rows inserted at once while building
+_INSERT_BATCH = 10000
+
+def _a_parse():
+    """
+    This function is a simple argument parser. Checks if paths in arguments are
+        right & checks if directories exist.
+
+    Return:
+    < dict > -- {
+                'source_json': < string >,
+                'index_path': < string > OR None,
+                'rebuild': < bool >,
+                'annotation_id': < int > OR None,
+                'image_id': < int > OR None,
+                'file_name': < string > OR None
+                }
+
+    """
+    a_parser = argparse.ArgumentParser()
+    a_parser.add_argument(
+                '-s',
+                '--source_json',
+                metavar='/path/to/mscoco.json',
+                required=True,
+                help='path to source mscoco json file')
+
+    a_parser.add_argument(
+                '-o',
+                '--index_path',
+                metavar='/path/to/index.sqlite',
+                required=False,
+                help='path to index (default: <json file name>' + \
+                    '_index.sqlite next to the json file)')
+
+    a_parser.add_argument(
+                '--rebuild',
+                action='store_true',
+                help='build the index even if it is up to date')
+
+    a_parser.add_argument(
+                '--annotation_id',
+                metavar='int',
+                type=int,
+                help='print annotation with its image')
+
+    a_parser.add_argument(
+                '--image_id',
+                metavar='int',
+                type=int,
+                help='print image with its annotations')
+
+    a_parser.add_argument(
+                '--file_name',
+                metavar='filename.jpg',
+                help='print images with this file name')
+
+    args = vars(a_parser.parse_args())
+    source_json = os.path.abspath(args.get('source_json'))
+
+    if os.path.isfile(source_json) != True:
+        print('\n[ERROR]: source json file has not found.')
+        sys.exit(1)
+
+    if args.get('index_path') is not None:
+        args.update({'index_path': os.path.abspath(args.get('index_path'))})
+
+    args.update({'source_json': source_json})
+
+    return args
+
+def get_index_path(json_path):
+    """
+    This function returns default path of the index of json file.
+
+    Keyword arguments:
+    json_path -- < string > path to mscoco json file
+
+    Return:
+    < string > -- '/path/to/<json file name>_index.sqlite'
+
+    """
+    return os.path.splitext(json_path)[0] + '_index.sqlite'
+
+def _get_source_meta(json_path):
+    """
+    This function returns values that show if the json file has changed.
+
+    """
+    json_stat = os.stat(json_path)
+    return {
+        'version': _INDEX_VERSION,
+        'source_path': os.path.abspath(json_path),
+        'source_size': str(json_stat.st_size),
+        'source_mtime_ns': str(json_stat.st_mtime_ns)
+    }
+
+def is_index_fresh(json_path, index_path):
+    """
+    This function checks that the index exists and has been built from the
+        current version of the json file.
+
+    Keyword arguments:
+    json_path -- < string > path to mscoco json file
+    index_path -- < string > path to index
+
+    Return:
+    < bool > -- True if the index can be used
+
+    """
+    if os.path.isfile(index_path) != True:
+        return False
+
+    try:
+        connection = sqlite3.connect(index_path)
+        try:
+            index_meta = dict(connection.execute('SELECT key, value FROM meta'))
+        finally:
+            connection.close()
+    except sqlite3.Error:
+        return False
+
+    return index_meta == _get_source_meta(json_path)
+
+def _iter_rows(elements, key_name):
+    """
+    This generator yields rows of annotations or images table. Elements
+        without an id are skipped, NULL would make SQLite assign a rowid that
+        is not in the json file.
+
+    """
+    for element in elements:
+        if element.get('id') is None:
+            continue
+        yield element.get('id'), element.get(key_name), \
+                                    json.dumps(element, ensure_ascii=False)
+
+def _insert_rows(connection, table, rows):
+    """
+    This function inserts rows by batches. Rows with ids that are already in
+        the table are skipped, so the first element with an id wins.
+
+    """
+    query = 'INSERT OR IGNORE INTO {} VALUES (?, ?, ?)'.format(table)
+    batch = []
+
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= _INSERT_BATCH:
+            connection.executemany(query, batch)
+            batch = []
+
+    connection.executemany(query, batch)
+
+def build_index(json_path, index_path):
+    """
+    This function builds the index of json file. The index is written to a
+        temporary file which replaces index_path when it is complete.
+
+    Keyword arguments:
+    json_path -- < string > path to mscoco json file
+    index_path -- < string > path to index
+
+    """
+    with open(json_path, 'r') as json_file:
+        mscoco_data = json.load(json_file)
+
+    tmp_path = index_path + '.tmp'
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+
+    connection = sqlite3.connect(tmp_path)
+    try:
+        connection.execute('PRAGMA journal_mode = OFF')
+        connection.execute('PRAGMA synchronous = OFF')
+
+        connection.execute('CREATE TABLE annotations (' \
+                    'id INTEGER PRIMARY KEY, image_id INTEGER, data TEXT)')
+        connection.execute('CREATE TABLE images (' \
+                    'id INTEGER PRIMARY KEY, file_name TEXT, data TEXT)')
+        connection.execute(
+                        'CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT)')
+
+        _insert_rows(connection, 'annotations',
+                    _iter_rows(mscoco_data.get('annotations'), 'image_id'))
+        _insert_rows(connection, 'images',
+                    _iter_rows(mscoco_data.get('images'), 'file_name'))
+
+        connection.execute(
+            'CREATE INDEX annotations_image_id ON annotations (image_id)')
+        connection.execute(
+            'CREATE INDEX images_file_name ON images (file_name)')
+
+        connection.executemany('INSERT INTO meta VALUES (?, ?)',
+                                        _get_source_meta(json_path).items())
+        connection.commit()
+    finally:
+        connection.close()
+
+    os.replace(tmp_path, index_path)
+
+class MSCOCOIndex:
+    """
+    This class finds annotations & images in the index.
+
+    """
+    def __init__(self, index_path):
+        """
+        Keyword arguments:
+        index_path -- < string > path to index
+
+        """
+        self.index_path = index_path
+        self._connection = sqlite3.connect(
+                    'file:{}?mode=ro'.format(urllib.parse.quote(index_path)),
+                                        uri=True, check_same_thread=False)
+
+    def _fetch_one(self, query, value):
+        row = self._connection.execute(query, (value,)).fetchone()
+        if row is None:
+            return None
+        return json.loads(row[0])
+
+    def _fetch_all(self, query, value):
+        return [json.loads(row[0])
+                        for row in self._connection.execute(query, (value,))]
+
+    def get_annotation(self, annotation_id):
+        """
+        This method returns annotation by id or None.
+
+        """
+        return self._fetch_one(
+                'SELECT data FROM annotations WHERE id = ?', annotation_id)
+
+    def get_annotation_ids(self):
+        """
+        This method returns list of all annotation ids in ascending order.
+
+        """
+        return [row[0] for row in
+                    self._connection.execute(
+                                    'SELECT id FROM annotations ORDER BY id')]
+
+    def get_image(self, image_id):
+        """
+        This method returns image by id or None.
+
+        """
+        return self._fetch_one('SELECT data FROM images WHERE id = ?', image_id)
+
+    def get_image_annotations(self, image_id):
+        """
+        This method returns list of annotations of the image.
+
+        """
+        return self._fetch_all('SELECT data FROM annotations ' \
+                                'WHERE image_id = ? ORDER BY id', image_id)
+
+    def find_images_by_file_name(self, file_name):
+        """
+        This method returns list of images with the file name.
+
+        """
+        return self._fetch_all('SELECT data FROM images ' \
+                                'WHERE file_name = ? ORDER BY id', file_name)
+
+    def find_caption_element(self, caption_id):
+        """
+        This method works like look_by_num.find_caption_element.
+
+        Return:
+        < dict > OR None -- {
+                            "annotation": < dict >,
+                            "image": < dict > OR None
+                            }
+
+        """
+        annotation = self.get_annotation(caption_id)
+        if annotation is None:
+            return None
+
+        return {'annotation': annotation,
+                'image': self.get_image(annotation.get('image_id'))}
+
+    def close(self):
+        """
+        This method closes the index.
+
+        """
+        self._connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+def open_index(json_path, index_path=None, rebuild=False):
+    """
+    This function opens the index of json file. The index is built if it does
+        not exist or is out of date.
+
+    Keyword arguments:
+    json_path -- < string > path to mscoco json file
+    index_path -- < string > OR None path to index. If None then default path
+        is used (see get_index_path)
+    rebuild -- < bool > build the index even if it is up to date
+
+    Return:
+    < MSCOCOIndex > -- opened index
+
+    """
+    if index_path is None:
+        index_path = get_index_path(json_path)
+
+    if rebuild or not is_index_fresh(json_path, index_path):
+        print('Building index of {} ...'.format(json_path))
+        build_index(json_path, index_path)
+
+    return MSCOCOIndex(index_path)
+
+if __name__ == '__main__':
+
+    args = _a_parse()
+
+    with open_index(args.get('source_json'), args.get('index_path'),
+                                            args.get('rebuild')) as index:
+        if args.get('annotation_id') is not None:
+            print(json.dumps(index.find_caption_element(
+                    args.get('annotation_id')), ensure_ascii=False, indent=3))
+
+        if args.get('image_id') is not None:
+            print(json.dumps({
+                'image': index.get_image(args.get('image_id')),
+                'annotations': index.get_image_annotations(
+                                                    args.get('image_id'))
+                }, ensure_ascii=False, indent=3))
+
+        if args.get('file_name') is not None:
+            print(json.dumps(index.find_images_by_file_name(
+                        args.get('file_name')), ensure_ascii=False, indent=3))
@@ -0,0 +1,145 @@
+"""
+This module keeps values that are loaded ahead by background threads, so that
+    slow loading (reading & decoding of pictures) does not block browsing.
+
+PrefetchCache is a bounded LRU cache of futures: prefetch() schedules keys
+    that will be needed soon, get() returns the value (waiting for it if it is
+    being loaded, loading it in the calling thread if it has not been
+    scheduled). Scheduled keys that are dropped by the next prefetch() are
+    cancelled if they have not been started.
+
+Usage:
+
+    with PrefetchCache(load_picture, cache_size=64) as cache:
+        cache.prefetch(['b.jpg', 'c.jpg', 'd.jpg'])
+        picture = cache.get('a.jpg')
+
+"""
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import threading
+
+class PrefetchCache:
+    """
+    This class loads values by keys in background threads and keeps the last
+        used ones.
+
+    """
+    def __init__(self, load_function, cache_size=64, workers=1):
+        """
+        Keyword arguments:
+        load_function -- < function > key -> value. It is called from
+            background threads
+        cache_size -- < int > max number of values (loaded or scheduled) that
+            are kept
+        workers -- < int > number of background threads
+
+        """
+        self.load_function = load_function
+        self.cache_size = cache_size
+
+        self._executor = ThreadPoolExecutor(max_workers=workers)
+        self._futures = OrderedDict()
+        self._scheduled = set()
+        self._lock = threading.Lock()
+
+    def _evict(self):
+        """
+        This method drops the least recently used values while the cache is
+            too big. Must be called with the lock held.
+
+        """
+        while len(self._futures) > self.cache_size:
+            key, future = self._futures.popitem(last=False)
+            future.cancel()
+            self._scheduled.discard(key)
+
+    def prefetch(self, keys):
+        """
+        This method schedules loading of keys in the given order. Keys
+            scheduled by the previous call that are not in keys are cancelled
+            if their loading has not been started.
+
+        Keyword arguments:
+        keys -- < list > keys that will be needed soon (the nearest first)
+
+        """
+        keys = list(keys)[:self.cache_size]
+
+        with self._lock:
+            for key in self._scheduled - set(keys):
+                future = self._futures.get(key)
+                if future is not None and future.cancel():
+                    del self._futures[key]
+            self._scheduled = set()
+
+            for key in keys:
+                if key not in self._futures:
+                    self._futures[key] = self._executor.submit(
+                                                    self.load_function, key)
+                    self._scheduled.add(key)
+            self._evict()
+
+    def get(self, key):
+        """
+        This method returns value of the key. If the key has not been
+            scheduled then it is loaded in the calling thread.
+
+        Keyword arguments:
+        key -- key of the value
+
+        Return:
+        value returned by load_function (its exception is raised again)
+
+        """
+        with self._lock:
+            future = self._futures.get(key)
+            if future is not None and future.cancelled():
+                future = None
+
+            if future is None:
+                future = Future()
+                future.set_running_or_notify_cancel()
+                own_future = True
+            else:
+                own_future = False
+
+            self._futures[key] = future
+            self._futures.move_to_end(key)
+            self._scheduled.discard(key)
+            self._evict()
+
+        if own_future:
+            try:
+                future.set_result(self.load_function(key))
+            except Exception as error:
+                future.set_exception(error)
+
+        return future.result()
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._futures
+
+    def __len__(self):
+        with self._lock:
+            return len(self._futures)
+
+    def close(self):
+        """
+        This method cancels scheduled loading & stops background threads.
+
+        """
+        with self._lock:
+            for future in self._futures.values():
+                future.cancel()
+            self._futures.clear()
+            self._scheduled = set()
+        self._executor.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
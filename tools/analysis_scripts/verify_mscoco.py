@@ -0,0 +1,453 @@
+"""
+This module checks the whole MSCOCO json file at once, as look_by_num.py does
+    for one caption:
+
+    - annotations whose image_id has no image (dangling annotations);
+    - images & annotations with repeated ids;
+    - image files that have not been found in image directories, are empty,
+        are not pictures or are truncated. By default the header is probed
+        (see download_scripts/image_probe.py); files whose size is not in the
+        header, like TIFF or JPEG with DNL marker, are read whole and their
+        end is checked. With --full_check all files are read whole, so
+        truncated pictures are found too. Pixels are not decoded unless
+        --decode is specified: then every file is decoded by OpenCV;
+    - if RU file is specified: annotation counts, ids that are only in one of
+        the files and ids whose image_id differs.
+
+Both json files are streamed (see json_stream.py), only ids, image ids &
+    file names are kept in memory. Files are checked by a pool of processes.
+    Images are found in directories by ImageLocator (see image_locator.py). The script exits with code 1 if
+    anything has been found, so it can be run before training.
+
+Report view:
+
+{
+    "mscoco_file": < string >,
+    "ru_mscoco_file": < string > OR None,
+    "counts": {
+                "images": < int >,
+                "annotations": < int >,
+                "ru_annotations": < int > OR None
+              },
+    "duplicate_image_ids": [ < int >, ... ],
+    "duplicate_annotation_ids": [ < int >, ... ],
+    "dangling_annotations": [ { "id": < int >, "image_id": < int > }, ... ],
+    "missing_images": [ { "id": < int >, "file_name": < string > }, ... ],
+    "bad_images": [
+                    {
+                        "id": < int >,
+                        "file_name": < string >,
+                        "path": < string >,
+                        "error": < string >
+                    }, ...
+                  ],
+    "ru_missing_ids": [ < int >, ... ],
+    "ru_extra_ids": [ < int >, ... ],
+    "ru_image_id_mismatches": [
+                    { "id": < int >, "image_id": < int >,
+                                            "ru_image_id": < int > }, ...
+                  ]
+}
+
+"""
+import os
+import sys
+import json
+import argparse
+import multiprocessing
+
+from functools import partial
+
+sys.path.insert(0, os.path.join(
+            os.path.dirname(os.path.abspath(__file__)), '..', 'download_scripts'))
+
+from image_locator import ImageLocator
+from json_stream import iter_json_array
+from image_probe import BadImageError, get_image_format, probe_image_file, \
+                                                            check_image_data
+
+# number of image files that are sent to a worker at once
+_CHECK_CHUNK = 64
+
+def _a_parse():
+    """
+    This function is a simple argument parser. Checks if paths in arguments are
+        right & checks if directories exist.
+
+    Return:
+    < dict > -- {
+                'mscoco_file': < string >,
+                'image_dir_list': < list > of < string >,
+                'ru_mscoco_file': < string > OR None,
+                'report_json': < string >,
+                'image_cache': < string > OR None,
+                'jobs': < int >,
+                'full_check': < bool >,
+                'decode': < bool >
+                }
+
+    """
+    a_parser = argparse.ArgumentParser()
+    a_parser.add_argument(
+                '-s',
+                '--mscoco_file',
+                metavar='/path/to/mscoco.json',
+                required=True,
+                help='path to source mscoco json file')
+
+    a_parser.add_argument(
+                '-d',
+                '--image_dir_list',
+                metavar='/path/to/img_dir_1 /path/to/img_dir_2',
+                nargs='+',
+                required=True,
+                help='list of paths to image directories')
+
+    a_parser.add_argument(
+                '--ru_mscoco_file',
+                metavar='/path/to/ru_mscoco.json',
+                required=False,
+                help='path to source ru_mscoco json file')
+
+    a_parser.add_argument(
+                '-r',
+                '--report_json',
+                metavar='/path/to/report.json',
+                default='verify_report.json',
+                help='path to report json-file')
+
+    a_parser.add_argument(
+                '--image_cache',
+                metavar='/path/to/image_cache.json',
+                required=False,
+                help='path to cache of image directory listings ' + \
+                    '(see image_locator.py)')
+
+    a_parser.add_argument(
+                '-j',
+                '--jobs',
+                metavar='int',
+                default=os.cpu_count() or 1,
+                type=int,
+                help='number of processes that check image files')
+
+    a_parser.add_argument(
+                '--full_check',
+                action='store_true',
+                help='read whole image files to find truncated pictures')
+
+    a_parser.add_argument(
+                '--decode',
+                action='store_true',
+                help='decode image files by OpenCV (slow, requires cv2)')
+
+    args = vars(a_parser.parse_args())
+
+    for key in ['mscoco_file', 'ru_mscoco_file']:
+        if args.get(key) is None:
+            continue
+
+        args.update({key: os.path.abspath(args.get(key))})
+        if os.path.isfile(args.get(key)) != True:
+            print('\n[ERROR]: {} is not a file.'.format(key))
+            sys.exit(1)
+
+    for image_dir in args.get('image_dir_list'):
+        if os.path.isdir(image_dir) != True:
+            print('\n[ERROR]: < {} > is not a directory.'.format(image_dir))
+            sys.exit(1)
+
+    if os.path.splitext(args.get('report_json'))[1] != '.json':
+        print('\n[ERROR]: report .json file has wrong extension')
+        sys.exit(1)
+
+    if args.get('jobs') < 1:
+        print('\n[ERROR]: number of jobs must be positive.')
+        sys.exit(1)
+
+    return args
+
+def check_image_file(image_path, full_check=False, decode=False):
+    """
+    This function checks that the image file is a complete picture. If the
+        size is not in the header (TIFF, JPEG with DNL marker) then the whole
+        file is checked, such files are not bad by themselves.
+
+    Keyword arguments:
+    image_path -- < string > path to the picture
+    full_check -- < bool > read the whole file to find truncated pictures
+    decode -- < bool > decode the whole file by OpenCV
+
+    Return:
+    < string > OR None -- error or None if the file is fine
+
+    """
+    try:
+        if os.path.getsize(image_path) == 0:
+            return 'empty file'
+
+        if full_check != True and decode != True:
+            with open(image_path, 'rb') as image_file:
+                if get_image_format(image_file.read(12)) is None:
+                    return 'not a picture'
+
+            if probe_image_file(image_path) is not None:
+                return None
+
+        with open(image_path, 'rb') as image_file:
+            data = image_file.read()
+        check_image_data(data)
+
+        if decode:
+            # OpenCV is imported only when it is really needed
+            import cv2
+            import numpy
+
+            if cv2.imdecode(numpy.frombuffer(data, dtype=numpy.uint8),
+                                            cv2.IMREAD_UNCHANGED) is None:
+                return 'can not be decoded'
+
+    except BadImageError as error:
+        return str(error)
+
+    except OSError as error:
+        return 'can not be read: {}'.format(error)
+
+    return None
+
+def read_images(mscoco_file):
+    """
+    This function streams "images" of MSCOCO json file and keeps only ids &
+        file names.
+
+    Keyword arguments:
+    mscoco_file -- < string > path to mscoco json file
+
+    Return:
+    < tuple > -- ( < list > of ( < int > id, < string > file_name ),
+        < list > repeated image ids )
+
+    """
+    images = []
+    image_ids = set()
+    duplicate_ids = set()
+
+    for image_info in iter_json_array(mscoco_file, 'images'):
+        image_id = image_info.get('id')
+        if image_id in image_ids:
+            duplicate_ids.add(image_id)
+        image_ids.add(image_id)
+        images.append((image_id, image_info.get('file_name')))
+
+    return images, sorted(duplicate_ids, key=str)
+
+def check_annotations(mscoco_file, image_ids, ru_mscoco_file=None):
+    """
+    This function streams annotations and checks links between annotations &
+        images and matching of EN & RU annotations.
+
+    Keyword arguments:
+    mscoco_file -- < string > path to mscoco json file
+    image_ids -- < set > ids of images of the json file
+    ru_mscoco_file -- < string > OR None path to ru mscoco json file
+
+    Return:
+    < dict > -- "annotations" & "ru_annotations" counts,
+        "duplicate_annotation_ids", "dangling_annotations" & "ru_*" fields of
+        the report
+
+    """
+    report = {
+        'annotations': 0,
+        'ru_annotations': None,
+        'duplicate_annotation_ids': [],
+        'dangling_annotations': [],
+        'ru_missing_ids': [],
+        'ru_extra_ids': [],
+        'ru_image_id_mismatches': []
+    }
+
+    annotation_ids = set()
+    duplicate_ids = set()
+    # image ids of annotations are kept only to match RU annotations
+    en_image_ids = {}
+
+    for annotation in iter_json_array(mscoco_file, 'annotations'):
+        annotation_id = annotation.get('id')
+        report['annotations'] += 1
+
+        if annotation_id in annotation_ids:
+            duplicate_ids.add(annotation_id)
+        annotation_ids.add(annotation_id)
+
+        if annotation.get('image_id') not in image_ids:
+            report['dangling_annotations'].append({'id': annotation_id,
+                                    'image_id': annotation.get('image_id')})
+
+        if ru_mscoco_file is not None:
+            en_image_ids[annotation_id] = annotation.get('image_id')
+
+    report['duplicate_annotation_ids'] = sorted(duplicate_ids, key=str)
+
+    if ru_mscoco_file is None:
+        return report
+
+    # ids of EN annotations are not needed any more
+    annotation_ids = None
+    report['ru_annotations'] = 0
+    ru_ids = set()
+
+    for annotation in iter_json_array(ru_mscoco_file, 'annotations'):
+        annotation_id = annotation.get('id')
+        report['ru_annotations'] += 1
+        ru_ids.add(annotation_id)
+
+        if annotation_id not in en_image_ids:
+            report['ru_extra_ids'].append(annotation_id)
+
+        elif en_image_ids[annotation_id] != annotation.get('image_id'):
+            report['ru_image_id_mismatches'].append({
+                'id': annotation_id,
+                'image_id': en_image_ids[annotation_id],
+                'ru_image_id': annotation.get('image_id')
+            })
+
+    report['ru_missing_ids'] = [annotation_id for annotation_id in
+                                    en_image_ids if annotation_id not in ru_ids]
+
+    return report
+
+def check_images(images, locator, jobs=1, full_check=False, decode=False):
+    """
+    This function finds image files & checks them by a pool of processes. If
+        file name is found in several directories then the first one is
+        checked.
+
+    Keyword arguments:
+    images -- < list > of ( < int > id, < string > file_name ) (see
+        read_images)
+    locator -- < ImageLocator > refreshed index of image directories
+    jobs -- < int > number of processes
+    full_check -- < bool > read whole files to find truncated pictures
+    decode -- < bool > decode whole files by OpenCV
+
+    Return:
+    < tuple > -- ( < list > missing images, < list > bad images ) fields of
+        the report
+
+    """
+    missing_images = []
+    found_images = []
+
+    for image_id, file_name in images:
+        paths = locator.locate(file_name)
+        if len(paths) == 0:
+            missing_images.append({'id': image_id, 'file_name': file_name})
+        else:
+            found_images.append((image_id, file_name, paths[0]))
+
+    check = partial(check_image_file, full_check=full_check, decode=decode)
+    image_paths = [image_path for _, _, image_path in found_images]
+
+    if jobs > 1:
+        with multiprocessing.Pool(jobs) as pool:
+            errors = list(pool.imap(check, image_paths, chunksize=_CHECK_CHUNK))
+    else:
+        errors = list(map(check, image_paths))
+
+    bad_images = [{
+                'id': image_id,
+                'file_name': file_name,
+                'path': image_path,
+                'error': error
+                } for (image_id, file_name, image_path), error in
+                                                zip(found_images, errors)
+                if error is not None]
+
+    return missing_images, bad_images
+
+def verify_mscoco(mscoco_file, image_dir_list, ru_mscoco_file=None,
+                    image_cache=None, jobs=1, full_check=False, decode=False):
+    """
+    This function checks MSCOCO json file (and RU file) with its images. The
+        json files are streamed, they are not loaded whole.
+
+    Keyword arguments:
+    mscoco_file -- < string > path to mscoco json file
+    image_dir_list -- < list > of < string > paths to image directories
+    ru_mscoco_file -- < string > OR None path to ru mscoco json file
+    image_cache -- < string > OR None path to cache of directory listings
+    jobs -- < int > number of processes that check image files
+    full_check -- < bool > read whole files to find truncated pictures
+    decode -- < bool > decode whole files by OpenCV
+
+    Return:
+    < dict > -- report (see module description)
+
+    """
+    images, duplicate_image_ids = read_images(mscoco_file)
+    annotations_report = check_annotations(mscoco_file,
+                    {image_id for image_id, _ in images}, ru_mscoco_file)
+
+    report = {
+        'mscoco_file': mscoco_file,
+        'ru_mscoco_file': ru_mscoco_file,
+        'counts': {
+            'images': len(images),
+            'annotations': annotations_report.pop('annotations'),
+            'ru_annotations': annotations_report.pop('ru_annotations')
+        },
+        'duplicate_image_ids': duplicate_image_ids
+    }
+    report.update(annotations_report)
+
+    locator = ImageLocator(image_dir_list, image_cache)
+    locator.refresh()
+
+    report['missing_images'], report['bad_images'] = check_images(
+                                images, locator, jobs, full_check, decode)
+
+    return report
+
+def get_problem_counts(report):
+    """
+    This function counts problems of every kind in the report.
+
+    Return:
+    < dict > -- { < string > report field: < int > number of problems }
+
+    """
+    return {key: len(value) for key, value in report.items()
+                                                    if isinstance(value, list)}
+
+if __name__ == '__main__':
+
+    args = _a_parse()
+
+    report = verify_mscoco(args.get('mscoco_file'), args.get('image_dir_list'),
+                            args.get('ru_mscoco_file'), args.get('image_cache'),
+                            args.get('jobs'), args.get('full_check'),
+                            args.get('decode'))
+
+    with open(args.get('report_json'), 'w') as json_file:
+        json.dump(report, json_file, indent=3)
+
+    counts = report.get('counts')
+    ru_count = counts.get('ru_annotations')
+    print('Images: {}, annotations: {}{}.'.format(
+                counts.get('images'), counts.get('annotations'),
+                '' if ru_count is None else ', RU annotations: {}'.format(
+                                                                    ru_count)))
+
+    problem_counts = get_problem_counts(report)
+    for key, problem_count in problem_counts.items():
+        print('\t{}: {}'.format(key, problem_count))
+
+    if ru_count is not None and ru_count != counts.get('annotations'):
+        print('[ATTENTION]: EN & RU annotation counts differ.')
+
+    if sum(problem_counts.values()) > 0 or (ru_count is not None and \
+                                        ru_count != counts.get('annotations')):
+        print('\n[ERROR]: problems have been found, see {}'.format(
+                                                    args.get('report_json')))
+        sys.exit(1)
@@ -0,0 +1,309 @@
+"""
+This module checks that download_scripts/dload_dataset.py gives the same
+    result serially and with concurrent pooled downloads.
+
+It starts a local HTTP server which plays the role of a picture host and
+    makes a tsv-file of --rows cells pointing to it:
+
+    - most cells are pictures (every picture is a small JPEG with its own
+        name inside, so pictures of different cells differ);
+    - every 10th cell is missing (404);
+    - every --flaky_step-th cell answers 503 to the first request and gives
+        the picture after that, so the host is cooled down and the cell is
+        retried (with --max_retries 0 it stays an error).
+
+Answers are delayed by up to --response_delay seconds (a stand-in for the
+    network latency), by different times, so concurrent downloads complete
+    out of order. The same tsv-file is downloaded serially (--workers 1,
+    urlopen) and by --workers threads through the pooled client, then the
+    compacted json results, the last journal record of every cell (without
+    "time_spent") and the saved pictures are compared. Journal records of
+    cells that have not been requested ("throttled") are errors too.
+
+Results are printed as a table:
+    mode | cells | downloaded | errors | retried | seconds | speedup
+
+"speedup" is the ratio of the serial time to the time of the run.
+    --min_speedup makes the script fail if the concurrent run is not that many
+    times faster. The script exits with code 1 if the runs differ.
+
+"""
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from contextlib import redirect_stdout
+
+import io
+import os
+import json
+import sys
+import time
+import argparse
+import tempfile
+import threading
+
+sys.path.insert(0, os.path.join(
+            os.path.dirname(os.path.abspath(__file__)), '..', 'download_scripts'))
+
+from dload_dataset import start_downloading
+from download_journal import get_journal_path, iter_journal
+
+# JPEG header (64x32 picture) that goes before the comment with the name
+_JPEG_HEAD = bytes.fromhex('ffd8ffe000104a46494600010100000100010000')
+_JPEG_TAIL = bytes.fromhex('ffc0000b080020004001011100ffd9')
+
+def _a_parse():
+    """
+    This function is a simple argument parser.
+
+    Return:
+    < dict > -- {
+                'rows': < int >,
+                'workers': < int >,
+                'host_connections': < int >,
+                'flaky_step': < int >,
+                'max_retries': < int >,
+                'response_delay': < float >,
+                'min_speedup': < float > OR None
+                }
+
+    """
+    a_parser = argparse.ArgumentParser()
+    a_parser.add_argument('--rows', metavar='int', default=300, type=int,
+                help='number of cells of the tsv-file')
+    a_parser.add_argument('--workers', metavar='int', default=8, type=int,
+                help='number of simultaneous downloads of concurrent run')
+    a_parser.add_argument('--host_connections', metavar='int', default=4,
+                type=int, help='max connections per host of concurrent run')
+    a_parser.add_argument('--flaky_step', metavar='int', default=50, type=int,
+                help='every such cell answers 503 to the first request ' + \
+                                                                '(0 -- none)')
+    a_parser.add_argument('--max_retries', metavar='int', default=2, type=int,
+                help='max number of attempts for every failed cell')
+    a_parser.add_argument('--response_delay', metavar='float', default=0.02,
+                type=float, help='max seconds spent on a response')
+    a_parser.add_argument('--min_speedup', metavar='float', default=None,
+                type=float, help='fail if the concurrent run is not that ' + \
+                                                    'many times faster')
+
+    return vars(a_parser.parse_args())
+
+def make_picture(name):
+    """
+    This function makes a small JPEG with the name in a comment segment.
+
+    """
+    comment = name.encode('utf-8')
+    return _JPEG_HEAD + b'\xff\xfe' + (len(comment) + 2).to_bytes(2, 'big') + \
+                                                        comment + _JPEG_TAIL
+
+def _start_host(response_delay):
+    """
+    This function starts local stand-in host in a daemon thread. Paths
+        /pic_N.jpg give pictures, /missing_N.jpg give 404, /flaky_N.jpg give
+        503 to the first request and the picture after that.
+
+    Return:
+    < ThreadingHTTPServer > -- server with 'requests' counter attribute &
+        'seen' set of requested paths
+
+    """
+    class PictureHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+        # small answers on keep-alive connections would wait for delayed ACK
+        disable_nagle_algorithm = True
+
+        def do_GET(self):
+            name = self.path.lstrip('/')
+            number = int(name.split('_')[-1].split('.')[0])
+
+            with self.server.lock:
+                self.server.requests += 1
+                first_request = name not in self.server.seen
+                self.server.seen.add(name)
+
+            # different delays make concurrent downloads complete out of order
+            time.sleep(response_delay * (number * 7 % 5) / 4)
+
+            if name.startswith('missing_') or \
+                                (name.startswith('flaky_') and first_request):
+                self.send_response(404 if name.startswith('missing_') else 503)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+
+            picture = make_picture(name)
+            self.send_response(200)
+            self.send_header('Content-Type', 'image/jpeg')
+            self.send_header('Content-Length', str(len(picture)))
+            self.end_headers()
+            self.wfile.write(picture)
+
+        def log_message(self, *args):
+            pass
+
+    class HostServer(ThreadingHTTPServer):
+        daemon_threads = True
+        request_queue_size = 1024
+
+    server = HostServer(('127.0.0.1', 0), PictureHandler)
+    server.requests = 0
+    server.seen = set()
+    server.lock = threading.Lock()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def make_tsv(tsv_path, rows, port, flaky_step):
+    """
+    This function writes tsv-file of cells pointing to the local host.
+
+    """
+    with open(tsv_path, 'w') as tsv_file:
+        for index in range(rows):
+            if index % 10 == 9:
+                name = 'missing_{}.jpg'.format(index)
+            elif flaky_step > 0 and index % flaky_step == 1:
+                name = 'flaky_{}.jpg'.format(index)
+            else:
+                name = 'pic_{}.jpg'.format(index)
+
+            tsv_file.write('caption {}\thttp://127.0.0.1:{}/{}\n'.format(
+                                                            index, port, name))
+
+def run_download(tsv_path, run_dir, workers, host_connections, max_retries):
+    """
+    This function downloads the tsv-file by dload_dataset.start_downloading.
+
+    Return:
+    < dict > -- {
+                'json_data': < dict > compacted result without "time_spent",
+                'records': < dict > { cell number: last journal record
+                    without "time_spent" },
+                'throttled': < int > number of records of cells that have
+                    not been requested,
+                'pictures': < dict > { filename: < bytes > },
+                'seconds': < float >
+                }
+
+    """
+    output_json = os.path.join(run_dir, 'result.json')
+    dset_pic_path = os.path.join(run_dir, 'pictures')
+    os.makedirs(dset_pic_path)
+
+    start_time = time.time()
+    with redirect_stdout(io.StringIO()):
+        start_downloading({
+            'source_tsv': tsv_path,
+            'output_json': output_json,
+            'dset_pic_path': dset_pic_path,
+            'continue_download': False,
+            'timeout_connection': 10.0,
+            'workers': workers,
+            'host_connections': host_connections,
+            'max_retries': max_retries,
+            'retry_delay': 0.05
+            })
+    spent_time = time.time() - start_time
+
+    records = {}
+    throttled = 0
+    for record in iter_journal(get_journal_path(output_json)):
+        if record.get('cell_number') is None:
+            continue
+        if record.get('error_class') == 'throttled':
+            throttled += 1
+        record.pop('time_spent', None)
+        records[record.get('cell_number')] = record
+
+    with open(output_json, 'r') as json_file:
+        json_data = json.load(json_file)
+    json_data.pop('time_spent', None)
+
+    pictures = {}
+    for filename in os.listdir(dset_pic_path):
+        with open(os.path.join(dset_pic_path, filename), 'rb') as pic_file:
+            pictures[filename] = pic_file.read()
+
+    return {'json_data': json_data, 'records': records, 'throttled': throttled,
+                                    'pictures': pictures, 'seconds': spent_time}
+
+def get_differences(first_run, second_run):
+    """
+    This function compares results of two runs.
+
+    Return:
+    < list > of < string > -- differences
+
+    """
+    differences = []
+
+    if first_run.get('json_data') != second_run.get('json_data'):
+        differences.append('json results differ')
+
+    for cell_number in sorted(set(first_run.get('records')) | \
+                                            set(second_run.get('records'))):
+        first_record = first_run.get('records').get(cell_number)
+        second_record = second_run.get('records').get(cell_number)
+        if first_record != second_record:
+            differences.append('cell {}: {} != {}'.format(cell_number,
+                                                first_record, second_record))
+
+    if first_run.get('pictures') != second_run.get('pictures'):
+        differences.append('saved pictures differ')
+
+    return differences
+
+if __name__ == '__main__':
+
+    args = _a_parse()
+    server = _start_host(args.get('response_delay'))
+
+    print('{:<11}|{:>7} |{:>11} |{:>7} |{:>8} |{:>8} |{:>8}'.format(
+            'mode', 'cells', 'downloaded', 'errors', 'retried', 'seconds',
+                                                                'speedup'))
+
+    failed = False
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        tsv_path = os.path.join(temp_dir, 'source.tsv')
+        make_tsv(tsv_path, args.get('rows'), server.server_address[1],
+                                                        args.get('flaky_step'))
+
+        runs = {}
+        for mode, workers, host_connections in [
+                    ('serial', 1, 0),
+                    ('concurrent', args.get('workers'),
+                                            args.get('host_connections'))]:
+            # flaky cells answer 503 again in every run
+            server.seen = set()
+            runs[mode] = run_download(tsv_path, os.path.join(temp_dir, mode),
+                        workers, host_connections, args.get('max_retries'))
+
+            json_data = runs[mode].get('json_data')
+            speedup = runs.get('serial').get('seconds') / \
+                                    max(runs[mode].get('seconds'), 1e-9)
+            print(('{:<11}|{:>7} |{:>11} |{:>7} |{:>8} |{:>8.2f} |' + \
+                    '{:>8.2f}').format(mode, args.get('rows'),
+                    len(json_data.get('downloaded_flist')),
+                    len(json_data.get('error_clist')),
+                    sum(1 for record in runs[mode].get('records').values()
+                                                        if 'retry' in record),
+                    runs[mode].get('seconds'), speedup))
+
+            if runs[mode].get('throttled') > 0:
+                print('[ERROR]: {} cells have been recorded as throttled ' \
+                        'without a request'.format(runs[mode].get('throttled')))
+                failed = True
+
+    differences = get_differences(runs.get('serial'), runs.get('concurrent'))
+    for difference in differences[:10]:
+        print('[ERROR]:', difference)
+
+    if args.get('min_speedup') is not None and \
+                                            speedup < args.get('min_speedup'):
+        print('[ERROR]: concurrent run is only {:.2f} times faster ' \
+                '(--min_speedup {})'.format(speedup, args.get('min_speedup')))
+        failed = True
+
+    if len(differences) > 0 or failed:
+        sys.exit(1)
+
+    print('\nSerial and concurrent results are the same.')
@@ -0,0 +1,150 @@
+"""
+This module compares downloading through urllib.request.urlopen (a new
+    connection for every picture) with the pooled keep-alive client from
+    download_scripts/http_pool.py.
+
+It starts several local HTTP servers on different ports which play the role
+    of picture hosts. Every server counts accepted connections and sleeps
+    --handshake_delay seconds on each new connection to imitate the cost of a
+    TCP + TLS handshake to a remote CDN.
+
+Results are printed as a table:
+    client | requests | connections | seconds | requests/sec
+
+"""
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import os
+import sys
+import time
+import argparse
+import threading
+import urllib.request as ureq
+
+sys.path.insert(0, os.path.join(
+            os.path.dirname(os.path.abspath(__file__)), '..', 'download_scripts'))
+
+from http_pool import HTTPConnectionPool
+
+# smallest valid JPEG header with SOF0 marker (64x32 picture)
+_FAKE_JPEG = bytes.fromhex(
+            'ffd8ffe000104a46494600010100000100010000ffc0000b0800200040010111'
+            '00ffd9')
+
+def _a_parse():
+    """
+    This function is a simple argument parser.
+
+    Return:
+    < dict > -- {
+                'hosts': < int >,
+                'requests': < int >,
+                'workers': < int >,
+                'host_connections': < int >,
+                'handshake_delay': < float >,
+                'response_delay': < float >
+                }
+
+    """
+    a_parser = argparse.ArgumentParser()
+    a_parser.add_argument('--hosts', metavar='int', default=4, type=int,
+                help='number of local stand-in hosts')
+    a_parser.add_argument('--requests', metavar='int', default=2000, type=int,
+                help='number of pictures downloaded by every client')
+    a_parser.add_argument('--workers', metavar='int', default=16, type=int,
+                help='number of simultaneous downloads')
+    a_parser.add_argument('--host_connections', metavar='int', default=4,
+                type=int, help='max connections per host of pooled client')
+    a_parser.add_argument('--handshake_delay', metavar='float', default=0.01,
+                type=float, help='seconds spent on every new connection')
+    a_parser.add_argument('--response_delay', metavar='float', default=0.0,
+                type=float, help='seconds spent on every response')
+
+    return vars(a_parser.parse_args())
+
+def _start_host(handshake_delay, response_delay):
+    """
+    This function starts local stand-in host in a daemon thread.
+
+    Return:
+    < ThreadingHTTPServer > -- server with 'connections' counter attribute
+
+    """
+    class PictureHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+        disable_nagle_algorithm = True
+
+        def setup(self):
+            with self.server.counter_lock:
+                self.server.connections += 1
+            time.sleep(handshake_delay)
+            BaseHTTPRequestHandler.setup(self)
+
+        def do_GET(self):
+            time.sleep(response_delay)
+            self.send_response(200)
+            self.send_header('Content-Type', 'image/jpeg')
+            self.send_header('Content-Length', str(len(_FAKE_JPEG)))
+            self.end_headers()
+            self.wfile.write(_FAKE_JPEG)
+
+        def log_message(self, *args):
+            pass
+
+    class HostServer(ThreadingHTTPServer):
+        daemon_threads = True
+        request_queue_size = 1024
+
+    server = HostServer(('127.0.0.1', 0), PictureHandler)
+    server.connections = 0
+    server.counter_lock = threading.Lock()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def _run_client(fetch, url_list, workers):
+    """
+    This function downloads all urls by thread pool and returns time spent.
+
+    """
+    start_time = time.time()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for data in executor.map(fetch, url_list):
+            assert data == _FAKE_JPEG
+    return time.time() - start_time
+
+if __name__ == '__main__':
+
+    args = _a_parse()
+    servers = [_start_host(args.get('handshake_delay'),
+                    args.get('response_delay')) for _ in range(args.get('hosts'))]
+
+    url_list = ['http://127.0.0.1:{}/pic_{}.jpg'.format(
+                    servers[index % len(servers)].server_address[1], index)
+                                    for index in range(args.get('requests'))]
+
+    def fetch_urlopen(url):
+        return ureq.urlopen(url, timeout=10).read()
+
+    http_pool = HTTPConnectionPool(args.get('host_connections'))
+
+    def fetch_pooled(url):
+        return http_pool.get(url, timeout=10).read()
+
+    print('{:<10}|{:>10} |{:>12} |{:>9} |{:>14}'.format(
+            'client', 'requests', 'connections', 'seconds', 'requests/sec'))
+
+    for name, fetch in [('urlopen', fetch_urlopen), ('pooled', fetch_pooled)]:
+        for server in servers:
+            server.connections = 0
+
+        seconds = _run_client(fetch, url_list, args.get('workers'))
+        connections = sum(server.connections for server in servers)
+
+        print('{:<10}|{:>10} |{:>12} |{:>9.2f} |{:>14.1f}'.format(
+                name, len(url_list), connections, seconds,
+                len(url_list) / seconds))
+
+    http_pool.close()
+    for server in servers:
+        server.shutdown()
@@ -0,0 +1,241 @@
+"""
+This module measures merge_mscoco_dicts from download_scripts/
+    merge_mscoco_jsons.py on synthetic MSCOCO dicts of growing size.
+
+For every size two dicts with --images images and --captions_per_image
+    annotations per image are made (the second one uses the same ids, as two
+    independent datasets do) and merged --repeat times, the best time is
+    taken. The merge result is lazy, so the time includes reading every
+    merged element. Annotation links of the result are checked, and so is
+    that the inputs have not been changed.
+
+Results are printed as a table:
+    images | annotations | seconds | microseconds per element | growth
+
+"growth" is the ratio of time per element to the one of the smallest size.
+    It stays near 1 for linear merge and grows with the size for quadratic
+    one. --max_growth makes the script fail if it is exceeded.
+
+Before measuring, merge_mscoco_files is checked on small files with
+    different key orders ("licenses" before "images" as in COCO 2017 files,
+    between the lists, last): every license, image & annotation must get to
+    the merged file.
+
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.join(
+            os.path.dirname(os.path.abspath(__file__)), '..', 'download_scripts'))
+
+from merge_mscoco_jsons import merge_mscoco_dicts, merge_mscoco_files
+
+# key orders of MSCOCO files that are checked by check_key_orders
+KEY_ORDERS = [
+    ['info', 'licenses', 'images', 'annotations'],
+    ['info', 'images', 'licenses', 'annotations'],
+    ['info', 'images', 'annotations', 'licenses']
+]
+
+def _a_parse():
+    """
+    This function is a simple argument parser.
+
+    Return:
+    < dict > -- {
+                'images': < list > of < int >,
+                'captions_per_image': < int >,
+                'repeat': < int >,
+                'max_growth': < float > OR None
+                }
+
+    """
+    a_parser = argparse.ArgumentParser()
+    a_parser.add_argument('--images', metavar='int', nargs='+',
+                default=[1000, 10000, 100000], type=int,
+                help='numbers of images in every merged dict')
+    a_parser.add_argument('--captions_per_image', metavar='int', default=5,
+                type=int, help='number of annotations of every image')
+    a_parser.add_argument('--repeat', metavar='int', default=3, type=int,
+                help='number of measurements of every size')
+    a_parser.add_argument('--max_growth', metavar='float', default=None,
+                type=float, help='fail if growth of time per element ' + \
+                                                        'exceeds this value')
+
+    return vars(a_parser.parse_args())
+
+def make_mscoco_dict(images_len, captions_per_image):
+    """
+    This function makes synthetic MSCOCO dict.
+
+    Keyword arguments:
+    images_len -- < int > number of images
+    captions_per_image -- < int > number of annotations of every image
+
+    Return:
+    < dict > -- MSCOCO dict
+
+    """
+    images = [{
+                'licence': 7,
+                'file_name': 'pic_{}.jpg'.format(image_id),
+                'coco_url': 'unknown',
+                'height': 480,
+                'width': 640,
+                'date_captured': 'unknown',
+                'flick_url': 'unknown',
+                'id': image_id
+                } for image_id in range(images_len)]
+
+    annotations = [{
+                'image_id': annotation_id // captions_per_image,
+                'id': annotation_id,
+                'caption': 'caption {}'.format(annotation_id)
+                } for annotation_id in range(images_len * captions_per_image)]
+
+    return {
+        'info': {'description': 'synthetic'},
+        'images': images,
+        'licenses': [{'url': 'unknown', 'id': 7, 'name': 'unknown'}],
+        'annotations': annotations
+    }
+
+def check_key_orders(images_len=10, captions_per_image=2):
+    """
+    This function merges two small MSCOCO files with different licenses for
+        every key order of KEY_ORDERS and checks the merged file.
+
+    Return:
+    < list > of < string > -- key orders whose merged file is wrong
+
+    """
+    failed_orders = []
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for key_order in KEY_ORDERS:
+            json_paths = []
+            for index in range(2):
+                mscoco_dict = make_mscoco_dict(images_len, captions_per_image)
+                mscoco_dict['licenses'][0]['id'] = index
+                json_paths.append(os.path.join(temp_dir,
+                                                '{}.json'.format(index)))
+                with open(json_paths[-1], 'w') as json_file:
+                    json.dump({key: mscoco_dict[key] for key in key_order},
+                                                                    json_file)
+
+            result_path = os.path.join(temp_dir, 'merged.json')
+            counts = merge_mscoco_files(json_paths, result_path)
+            with open(result_path, 'r') as json_file:
+                merged_dict = json.load(json_file)
+
+            if len(merged_dict.get('licenses')) != 2 or \
+                    counts.get('licenses') != 2 or \
+                    len(merged_dict.get('images')) != 2 * images_len or \
+                    not check_links(merged_dict, images_len,
+                                                        captions_per_image):
+                failed_orders.append(', '.join(key_order))
+
+    return failed_orders
+
+def check_links(merged_dict, images_len, captions_per_image):
+    """
+    This function checks that annotations of the merged dict point to the
+        images of their own files.
+
+    """
+    images = merged_dict.get('images')
+    file_names = {image_info.get('id'): image_info.get('file_name')
+                                                    for image_info in images}
+
+    if len(file_names) != len(images):
+        return False
+
+    for index, annotation_info in enumerate(merged_dict.get('annotations')):
+        original_image = (index % (images_len * captions_per_image)) // \
+                                                            captions_per_image
+        if file_names.get(annotation_info.get('image_id')) != \
+                                        'pic_{}.jpg'.format(original_image):
+            return False
+
+    return True
+
+def measure_merge(images_len, captions_per_image, repeat):
+    """
+    This function measures the best merge time of two synthetic dicts.
+
+    Return:
+    < tuple > -- ( < float > seconds, < bool > links are right & inputs have
+        not been changed )
+
+    """
+    best_time = None
+    links_ok = True
+
+    dict_1 = make_mscoco_dict(images_len, captions_per_image)
+    dict_2 = make_mscoco_dict(images_len, captions_per_image)
+
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        merged_dict = merge_mscoco_dicts(dict_1, dict_2)
+        for key in ['images', 'annotations']:
+            for _ in merged_dict.get(key):
+                pass
+        spent_time = time.perf_counter() - start_time
+
+        if best_time is None or spent_time < best_time:
+            best_time = spent_time
+        links_ok = links_ok and \
+                    check_links(merged_dict, images_len, captions_per_image)
+
+    links_ok = links_ok and \
+                dict_2 == make_mscoco_dict(images_len, captions_per_image)
+
+    return best_time, links_ok
+
+if __name__ == '__main__':
+
+    args = _a_parse()
+    captions_per_image = args.get('captions_per_image')
+
+    print('{:>10} | {:>12} | {:>9} | {:>10} | {:>6}'.format(
+                    'images', 'annotations', 'seconds', 'us/element', 'growth'))
+
+    base_time = None
+    failed = False
+
+    for key_order in check_key_orders():
+        print('[ERROR]: merged file loses data when keys go as: {}'.format(
+                                                                key_order))
+        failed = True
+
+    for images_len in sorted(args.get('images')):
+        spent_time, links_ok = measure_merge(
+                        images_len, captions_per_image, args.get('repeat'))
+
+        elements_len = 2 * images_len * (1 + captions_per_image)
+        element_time = spent_time / elements_len * 1e6
+        if base_time is None:
+            base_time = element_time
+        growth = element_time / base_time
+
+        print('{:>10} | {:>12} | {:>9.3f} | {:>10.3f} | {:>6.2f}'.format(
+                    2 * images_len, 2 * images_len * captions_per_image,
+                    spent_time, element_time, growth))
+
+        if not links_ok:
+            print('[ERROR]: annotations of merged dict point to wrong ' + \
+                                            'images or inputs have changed')
+            failed = True
+
+        if args.get('max_growth') is not None and \
+                                            growth > args.get('max_growth'):
+            print('[ERROR]: time per element has grown {:.2f} times'.format(
+                                                                    growth))
+            failed = True
+
+    if failed:
+        sys.exit(1)
@@ -0,0 +1,248 @@
+"""
+This module compares tokenizers of analysis_scripts/caption_tokenizers.py:
+    parity of tokens with nltk and speed in captions per second.
+
+Captions are taken from --json_file (MSCOCO) or --tsv_file (Google), or the
+    built-in SAMPLE_CAPTIONS are used: captions with contractions, quotes,
+    numbers, brackets, dashes and final periods that make the parity suite.
+    Every caption is lowercased as count_word_frequency.py does.
+
+The reference is nltk.tokenize.word_tokenize ("nltk", requires punkt) or the
+    same without sentence splitting ("treebank", which "regex" follows). The
+    parity of "regex" is measured, not guaranteed: real captions and the
+    parity suite have matched "treebank" in all cases, while about 0.2% of
+    fuzzed strings of unusual punctuation differ. So --max_mismatch is the
+    check of a dataset.
+
+Results are printed as a table:
+    tokenizer | captions | seconds | captions/sec | speedup | mismatches
+
+"speedup" is the ratio to the speed of the reference. --max_mismatch makes
+    the script fail if the share of captions of "regex" that differ from the
+    reference exceeds this value (in percent).
+
+"""
+import os
+import sys
+import time
+import argparse
+
+from itertools import islice
+
+sys.path.insert(0, os.path.join(
+            os.path.dirname(os.path.abspath(__file__)), '..', 'analysis_scripts'))
+
+from caption_tokenizers import TOKENIZERS
+
+SAMPLE_CAPTIONS = [
+    'A man riding a wave on top of a surfboard.',
+    "A dog's toy isn't on the table , it's under it.",
+    "The cat can't and won't eat; who'd've thought?",
+    'She said "hello" to the "big" dog.',
+    '"Quoted start" and end',
+    'A 1,000 dollar bill, and 3.5 apples: 10:30 am.',
+    'Wait... what?! (really) [yes] {no} <maybe>',
+    'E-mail vs. U.S. army -- a test---ok',
+    "The girls' bikes are 'cool' and 'tis fine",
+    "I cannot believe we're gonna wanna gotta lemme gimme more'n d'ye",
+    'Rock & roll @ 50% off #1 $5 *star*',
+    'Don’t “smart” quotes ‘here’ – dash — long',
+    'Ends with period inside quotes."',
+    "Trailing apostrophe dogs'",
+    "O'clock and rock'n'roll y'all",
+    "It's 5 o'clock. The end.",
+    "Person's dog's bone's",
+    "``Backticks'' style",
+    'Text ending with colon:',
+    'A,b a:b a, b',
+    "'Hello' said he",
+    "We'll we've I'm I'd they're",
+    "Can't.",
+    'Two people -- one old, one young -- on a bench',
+    'www.example.com/path?x=1&y=2',
+    '  Multiple   spaces  here . ',
+    'The end ..',
+    'The view from the window.)',
+    'A bowl of fruit (apples, oranges and bananas).',
+    'Pizza with "extra" cheese, olives & peppers!',
+    'Hand-drawn illustration of a 19th-century house.',
+    "Actor attends the premiere of 'the movie' in Los Angeles.",
+    'Person, 25, poses for a photo.',
+    'A train at 5:45 p.m. on platform 9¾.',
+    'Set of icons: home, mail, phone...',
+    "He said ''yes'' and (''no'')",
+    '""Double quoted start',
+    'Nothing to do but wait, cannot.',
+    'A sign reading -gonna- on the wall',
+    'A flag of the u.s. ”',
+    "It's' a dog'sdon't's toy",
+    "Can't' stop, won't'",
+    "Pots 'n' pans in the o'neill's kitchen"
+]
+
+def _a_parse():
+    """
+    This function is a simple argument parser.
+
+    Return:
+    < dict > -- {
+                'json_file': < string > OR None,
+                'tsv_file': < string > OR None,
+                'captions': < int >,
+                'tokenizers': < list > of < string >,
+                'reference': < string >,
+                'repeat': < int >,
+                'show_mismatches': < int >,
+                'max_mismatch': < float > OR None
+                }
+
+    """
+    a_parser = argparse.ArgumentParser()
+    a_parser.add_argument('-j', '--json_file', metavar='/path/to/json',
+                help='take captions from MSCOCO json-file')
+    a_parser.add_argument('-t', '--tsv_file', metavar='/path/to/tsv',
+                help='take captions from Google tsv-file')
+    a_parser.add_argument('--captions', metavar='int', default=100000,
+                type=int, help='number of captions (samples are repeated, ' + \
+                                                'files are cut)')
+    a_parser.add_argument('--tokenizers', nargs='+', choices=list(TOKENIZERS),
+                default=list(TOKENIZERS), help='tokenizers to measure')
+    a_parser.add_argument('--reference', choices=['nltk', 'treebank'],
+                default='nltk', help='tokens that the others are compared to')
+    a_parser.add_argument('--repeat', metavar='int', default=3, type=int,
+                help='number of measurements of every tokenizer')
+    a_parser.add_argument('--show_mismatches', metavar='int', default=5,
+                type=int, help='number of differing captions to print')
+    a_parser.add_argument('--max_mismatch', metavar='float', default=None,
+                type=float, help='fail if more than this percent of ' + \
+                                        'captions of "regex" tokenizer differ')
+
+    return vars(a_parser.parse_args())
+
+def get_reference_tokenizer(reference):
+    """
+    This function returns the reference tokenizer.
+
+    Keyword arguments:
+    reference -- < string > 'nltk' or 'treebank'
+
+    Return:
+    < function > -- caption -> list of tokens
+
+    """
+    import nltk
+
+    if reference == 'treebank':
+        return lambda caption: nltk.tokenize.word_tokenize(caption,
+                                                        preserve_line=True)
+
+    return nltk.tokenize.word_tokenize
+
+def get_captions(args):
+    """
+    This function returns lowercased captions to tokenize.
+
+    """
+    if args.get('json_file') is not None or args.get('tsv_file') is not None:
+        from count_word_frequency import read_json, read_tsv
+
+        if args.get('json_file') is not None:
+            captions = read_json(args.get('json_file'))
+        else:
+            captions = read_tsv(args.get('tsv_file'))
+        captions = list(islice(captions, args.get('captions')))
+    else:
+        captions = [SAMPLE_CAPTIONS[index % len(SAMPLE_CAPTIONS)]
+                                    for index in range(args.get('captions'))]
+
+    return [caption.lower() for caption in captions if caption is not None]
+
+def measure_tokenizer(tokenize, captions, repeat):
+    """
+    This function measures the best time of tokenizing all captions.
+
+    Return:
+    < tuple > -- ( < float > seconds, < list > of < list > tokens )
+
+    """
+    best_time = None
+
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        tokens_list = [tokenize(caption) for caption in captions]
+        spent_time = time.perf_counter() - start_time
+
+        if best_time is None or spent_time < best_time:
+            best_time = spent_time
+
+    return best_time, tokens_list
+
+if __name__ == '__main__':
+
+    args = _a_parse()
+    captions = get_captions(args)
+
+    try:
+        reference = get_reference_tokenizer(args.get('reference'))
+        reference_time, reference_tokens = measure_tokenizer(
+                                        reference, captions, args.get('repeat'))
+    except (ImportError, LookupError) as error:
+        print('\n[ATTENTION]: reference tokenizer is not available, ' + \
+                                    'parity is not checked: {}'.format(error))
+        reference_time, reference_tokens = None, None
+
+    print('{:>10} | {:>9} | {:>8} | {:>12} | {:>7} | {:>10}'.format(
+        'tokenizer', 'captions', 'seconds', 'captions/sec', 'speedup',
+                                                                'mismatches'))
+
+    if reference_time is not None:
+        print('{:>10} | {:>9} | {:>8.3f} | {:>12.0f} | {:>7} | {:>10}'.format(
+                    args.get('reference'), len(captions), reference_time,
+                    len(captions) / reference_time, '1.00', '-'))
+
+    failed = False
+
+    for name in args.get('tokenizers'):
+        # the reference has been measured already
+        if name == args.get('reference') and reference_time is not None:
+            continue
+
+        try:
+            spent_time, tokens_list = measure_tokenizer(
+                            TOKENIZERS[name], captions, args.get('repeat'))
+        except (ImportError, LookupError) as error:
+            print('[ATTENTION]: tokenizer "{}" is not available: {}'.format(
+                                                                name, error))
+            continue
+
+        if reference_tokens is not None:
+            mismatches = [index for index, tokens in enumerate(tokens_list)
+                                        if tokens != reference_tokens[index]]
+            mismatch_percent = 100 * len(mismatches) / max(len(captions), 1)
+            speedup = reference_time / spent_time
+        else:
+            mismatches = []
+            mismatch_percent = None
+            speedup = None
+
+        print('{:>10} | {:>9} | {:>8.3f} | {:>12.0f} | {:>7} | {:>10}'.format(
+                name, len(captions), spent_time, len(captions) / spent_time,
+                '-' if speedup is None else '{:.2f}'.format(speedup),
+                '-' if mismatch_percent is None else '{:.2f}%'.format(
+                                                            mismatch_percent)))
+
+        if name == 'regex':
+            for index in mismatches[:args.get('show_mismatches')]:
+                print('\t{!r}\n\t\t{}: {}\n\t\tregex: {}'.format(
+                            captions[index], args.get('reference'),
+                            reference_tokens[index], tokens_list[index]))
+
+            if args.get('max_mismatch') is not None and \
+                                        mismatch_percent is not None and \
+                                mismatch_percent > args.get('max_mismatch'):
+                print('[ERROR]: {:.2f}% of captions differ'.format(
+                                                            mismatch_percent))
+                failed = True
+
+    if failed:
+        sys.exit(1)
@@ -0,0 +1,355 @@
+"""
+This module implements content-addressed store of downloaded pictures. Every
+    picture is saved once as a blob named by sha256 digest of its bytes:
+
+        store_dir/ab/cd/abcd...ef
+
+    and dataset_pic_{index}.jpg files are hard links to the blobs (or copies
+    if hard links are not supported), so byte-identical pictures take disk
+    space only once.
+
+dload_dataset.py writes "digest" of every downloaded picture to its journal
+    and to "downloaded_flist". If the dataset has been downloaded without the
+    store, this module can compute digests of the downloaded pictures and move
+    them into the store.
+
+When it is used as a script it writes report of duplicate groups:
+
+{
+    "source_json": < string >,
+    "pictures": < int >,
+    "unique_pictures": < int >,
+    "duplicate_groups": [
+                            {
+                                "digest": < string >,
+                                "cell_numbers": [ < int >, ... ],
+                                "filenames": [ < string >, ... ]
+                            }, ...
+                        ]
+}
+
+and updates "downloaded_flist" of the source json-file with digests.
+
+"""
+import os
+import sys
+import json
+import shutil
+import hashlib
+import argparse
+import tempfile
+
+# size of the block read while hashing files
+_HASH_BLOCK = 1 << 20
+
+def _a_parse():
+    """
+    This function is a simple argument parser. Checks if paths in arguments are
+        right & checks if directories exist.
+
+    Return:
+    < dict > -- {
+                'source_json': < string >,
+                'images_dir': < string >,
+                'store_dir': < string > OR None,
+                'report_json': < string >
+                }
+
+    """
+    a_parser = argparse.ArgumentParser()
+    a_parser.add_argument(
+                '-s',
+                '--source_json',
+                metavar='/path/to/json',
+                required=True,
+                help='result json-file of dload_dataset.py')
+
+    a_parser.add_argument(
+                '-i',
+                '--images_dir',
+                metavar='/path/to/images/directory',
+                required=True,
+                help='directory with downloaded pictures')
+
+    a_parser.add_argument(
+                '--store_dir',
+                metavar='/path/to/store',
+                required=False,
+                help='if specified then pictures are moved into the store ' + \
+                    'and replaced by hard links')
+
+    a_parser.add_argument(
+                '-r',
+                '--report_json',
+                metavar='/path/to/json',
+                default='duplicates_report.json',
+                help='path to report json-file')
+
+    args = vars(a_parser.parse_args())
+    source_json = os.path.abspath(args.get('source_json'))
+    images_dir = os.path.abspath(args.get('images_dir'))
+    report_json = os.path.abspath(args.get('report_json'))
+    store_dir = args.get('store_dir')
+
+    if os.path.isfile(source_json) != True:
+        print('\n[ERROR]: source .json file has not found')
+        sys.exit(1)
+
+    if os.path.isdir(images_dir) != True:
+        print('\n[ERROR]: images_dir is not a directory')
+        sys.exit(1)
+
+    if os.path.splitext(report_json)[1] != '.json':
+        print('\n[ERROR]: report .json file has wrong extension')
+        sys.exit(1)
+
+    if store_dir is not None:
+        store_dir = os.path.abspath(store_dir)
+
+    args.update({
+            'source_json': source_json,
+            'images_dir': images_dir,
+            'store_dir': store_dir,
+            'report_json': report_json
+            })
+
+    return args
+
+def get_data_digest(data):
+    """
+    This function returns sha256 hex digest of bytes.
+
+    """
+    return hashlib.sha256(data).hexdigest()
+
+def get_file_digest(file_path):
+    """
+    This function returns sha256 hex digest of file reading it by blocks.
+
+    """
+    file_hash = hashlib.sha256()
+    with open(file_path, 'rb') as current_file:
+        for block in iter(lambda: current_file.read(_HASH_BLOCK), b''):
+            file_hash.update(block)
+    return file_hash.hexdigest()
+
+class ContentStore:
+    """
+    This class saves blobs by digest and links them to picture paths. It can
+        be shared by many threads: blobs are written to temporary files and
+        renamed, so a blob is either complete or absent.
+
+    """
+    def __init__(self, store_dir):
+        """
+        Keyword arguments:
+        store_dir -- < string > directory of the store
+
+        """
+        self.store_dir = store_dir
+        os.makedirs(store_dir, exist_ok=True)
+
+    def get_blob_path(self, digest):
+        """
+        This method returns path of the blob.
+
+        """
+        return os.path.join(self.store_dir, digest[:2], digest[2:4], digest)
+
+    def put(self, data):
+        """
+        This method saves bytes to the store if they are not there yet.
+
+        Keyword arguments:
+        data -- < bytes > content of the picture
+
+        Return:
+        < string > -- digest of the content
+
+        """
+        digest = get_data_digest(data)
+        blob_path = self.get_blob_path(digest)
+
+        if not os.path.isfile(blob_path):
+            blob_dir = os.path.dirname(blob_path)
+            os.makedirs(blob_dir, exist_ok=True)
+
+            tmp_fd, tmp_path = tempfile.mkstemp(dir=blob_dir, suffix='.tmp')
+            try:
+                with os.fdopen(tmp_fd, 'wb') as tmp_file:
+                    tmp_file.write(data)
+
+                # the blob is not replaced if another thread has just made it,
+                # otherwise links made to the replaced blob would lose it
+                try:
+                    os.link(tmp_path, blob_path)
+                except FileExistsError:
+                    pass
+                except OSError:
+                    os.replace(tmp_path, blob_path)
+            finally:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+
+        return digest
+
+    def put_file(self, file_path):
+        """
+        This method moves existing file into the store (or drops it if the
+            same content is already there) and replaces it by a link.
+
+        Keyword arguments:
+        file_path -- < string > path to the picture
+
+        Return:
+        < string > -- digest of the content
+
+        """
+        digest = get_file_digest(file_path)
+        blob_path = self.get_blob_path(digest)
+
+        if not os.path.isfile(blob_path):
+            os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+            shutil.copyfile(file_path, blob_path)
+
+        self.link(digest, file_path)
+        return digest
+
+    def link(self, digest, pic_path):
+        """
+        This method makes pic_path a hard link to the blob. If hard links are
+            not supported then the blob is copied.
+
+        Keyword arguments:
+        digest -- < string > digest of the blob
+        pic_path -- < string > path of the picture
+
+        """
+        blob_path = self.get_blob_path(digest)
+        tmp_path = pic_path + '.tmp'
+
+        if os.path.lexists(tmp_path):
+            os.remove(tmp_path)
+
+        try:
+            os.link(blob_path, tmp_path)
+        except OSError:
+            shutil.copyfile(blob_path, tmp_path)
+
+        os.replace(tmp_path, pic_path)
+
+def get_duplicate_groups(downloaded_flist):
+    """
+    This function groups downloaded pictures by digest.
+
+    Keyword arguments:
+    downloaded_flist -- < list > of < dict > with "digest" field:
+        [
+            {
+                "cell_number": < int >,
+                "filename": < string >,
+                "caption": < string >,
+                "digest": < string >
+            }, ...
+        ]
+
+    Return:
+    < list > of < dict > -- groups of two or more pictures:
+        [
+            {
+                "digest": < string >,
+                "cell_numbers": [ < int >, ... ],
+                "filenames": [ < string >, ... ]
+            }, ...
+        ]
+
+    """
+    groups = {}
+    for flist_element in downloaded_flist:
+        digest = flist_element.get('digest')
+        if digest is not None:
+            groups.setdefault(digest, []).append(flist_element)
+
+    duplicate_groups = []
+    for digest, group in groups.items():
+        if len(group) > 1:
+            duplicate_groups.append({
+                "digest": digest,
+                "cell_numbers": [element.get('cell_number') for element in group],
+                "filenames": [element.get('filename') for element in group]
+                })
+
+    duplicate_groups.sort(key=lambda group: -len(group.get('cell_numbers')))
+    return duplicate_groups
+
+def add_digests(downloaded_flist, images_dir, store=None):
+    """
+    This function computes digests of pictures that do not have them yet. If
+        store is specified then pictures are moved into it.
+
+    Keyword arguments:
+    downloaded_flist -- < list > of < dict > elements of "downloaded_flist"
+    images_dir -- < string > directory with pictures
+    store -- < ContentStore > OR None store for pictures
+
+    Return:
+    < int > -- number of pictures that have not been found
+
+    """
+    missing_count = 0
+
+    for count, flist_element in enumerate(downloaded_flist, 1):
+        pic_path = os.path.join(images_dir, flist_element.get('filename'))
+
+        if os.path.isfile(pic_path) != True:
+            missing_count += 1
+            continue
+
+        if store is not None:
+            flist_element.update({'digest': store.put_file(pic_path)})
+        elif flist_element.get('digest') is None:
+            flist_element.update({'digest': get_file_digest(pic_path)})
+
+        if count % 10000 == 0:
+            print('Processed: {}/{}'.format(count, len(downloaded_flist)))
+
+    return missing_count
+
+if __name__ == '__main__':
+
+    args = _a_parse()
+
+    with open(args.get('source_json'), 'r') as json_file:
+        json_data = json.load(json_file)
+
+    if args.get('store_dir') is not None:
+        store = ContentStore(args.get('store_dir'))
+    else:
+        store = None
+
+    downloaded_flist = json_data.get('downloaded_flist')
+    missing_count = add_digests(downloaded_flist, args.get('images_dir'), store)
+    if missing_count > 0:
+        print('[ATTENTION]: {} pictures have not found.'.format(missing_count))
+
+    # the source is replaced only by a complete file, so it is not lost if
+    # writing fails
+    tmp_path = args.get('source_json') + '.tmp'
+    with open(tmp_path, 'w') as json_file:
+        json.dump(json_data, json_file)
+    os.replace(tmp_path, args.get('source_json'))
+
+    duplicate_groups = get_duplicate_groups(downloaded_flist)
+    unique_count = len({element.get('digest') for element in downloaded_flist
+                                        if element.get('digest') is not None})
+
+    with open(args.get('report_json'), 'w') as json_file:
+        json.dump({
+            'source_json': args.get('source_json'),
+            'pictures': len(downloaded_flist),
+            'unique_pictures': unique_count,
+            'duplicate_groups': duplicate_groups
+            }, json_file, indent=3)
+
+    print('Pictures: {}, unique: {}, duplicate groups: {}.'.format(
+                len(downloaded_flist), unique_count, len(duplicate_groups)))
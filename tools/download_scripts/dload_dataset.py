@@ -7,6 +7,33 @@ It goes though all the cells and tries to download every picture. If the
     program fails to access then the cell number is added to the list of
     unloaded.
 
+Pictures can be downloaded simultaneously by a pool of threads (--workers).
+    Results are still recorded in the order of cells, so the result file is
+    the same as in single threaded mode.
+Every processed cell is appended to the journal (output_journal.jsonl, see
+    download_journal.py) at once, the result JSON-file is built from the
+    journal when downloading is finished (or by --compact_only). Downloading
+    continues exactly from the last cell written to the journal.
+The tsv-file is read lazily line by line, on continuation reading starts from
+    the byte offset saved in the journal.
+The tsv-file can be split into shards (--shard_index i --num_shards k) by cell
+    number modulo or by byte ranges, so several processes or machines can
+    download their own slice into their own journal. Pictures keep names of
+    the whole tsv-file, merge_dload_shards.py combines the shard results.
+Errors are sorted into classes (see download_retry.py). After all cells are
+    processed, cells failed with transient errors are downloaded again with
+    exponential backoff (--max_retries). Hosts that answer 429 or 5xx are
+    cooled down. --retry_errors downloads again only cells of the error list.
+Keep-alive connections can be reused with a limited number of connections per
+    host (--host_connections), see http_pool.py.
+Downloaded data is checked before it is saved: answers that are not pictures
+    (HTML error pages, ...) and truncated pictures are recorded as errors of
+    'bad_image' class. Height & width are read from the picture header and
+    recorded, see image_probe.py.
+sha256 digest of every picture is recorded. With --store_dir pictures are
+    saved once per content and dataset_pic_{index}.jpg files are hard links to
+    them, see dedup_store.py.
+
 Result JSON-file view:
 
 {
@@ -16,7 +43,10 @@ Result JSON-file view:
                             {
                                 "cell_number": < int >,
                                 "filename": < string >,
-                                "caption": < string >
+                                "caption": < string >,
+                                "digest": < string >,
+                                "height": < int >,
+                                "width": < int >
                             }, ...
                         ],
     "error_clist":  [ < int >, ... ]
@@ -24,14 +54,34 @@ Result JSON-file view:
 
 """
 from datetime import timedelta
+from collections import deque
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 
 import os
 import sys
 import json
 import time
+import heapq
 import urllib.request as ureq
 import argparse
 
+from http_pool import HTTPConnectionPool
+from dedup_store import ContentStore, get_data_digest
+from image_probe import check_image_data
+from download_journal import DownloadJournal, get_journal_path, \
+    repair_journal, read_journal_header, read_last_record, compact_journal, \
+    iter_journal
+from download_retry import HostThrottle, classify_error, \
+    get_retry_after, get_url_host, get_backoff_delay, DEFAULT_RETRY_CLASSES, \
+    ERROR_CLASSES
+
+# size of the block read while counting tsv cells
+_COUNT_BLOCK = 1 << 20
+
+# how many requests per worker may be queued ahead of the oldest unfinished one
+_WINDOW_FACTOR = 4
+
 def _a_parse():
     """
     This function is a simple argument parser. Checks if paths in arguments are
@@ -43,7 +93,18 @@ def _a_parse():
                 'output_json': < string >,
                 'dset_pic_path': < string >,
                 'continue_download': < bool >,
-                'timeout_connection': < float >
+                'timeout_connection': < float >,
+                'workers': < int >,
+                'host_connections': < int >,
+                'journal_sync': < int >,
+                'compact_only': < bool >,
+                'shard_index': < int >,
+                'num_shards': < int >,
+                'shard_mode': < string >,
+                'max_retries': < int >,
+                'retry_delay': < float >,
+                'retry_classes': < set > of < string >,
+                'retry_errors': < bool >
                 }
 
     """
@@ -84,9 +145,111 @@ def _a_parse():
                 type=float,
                 help='connection timeout for each picture')
 
+    a_parser.add_argument(
+                '-w',
+                '--workers',
+                metavar='int',
+                default=1,
+                type=int,
+                help='number of pictures downloaded simultaneously')
+
+    a_parser.add_argument(
+                '-k',
+                '--host_connections',
+                metavar='int',
+                default=0,
+                type=int,
+                help='reuse keep-alive connections with at most this many ' + \
+                    'connections per host (0 -- new connection per picture)')
+
+    a_parser.add_argument(
+                '-j',
+                '--journal_sync',
+                metavar='int',
+                default=100,
+                type=int,
+                help='number of journal records between fsync calls')
+
+    a_parser.add_argument(
+                '--compact_only',
+                action='store_true',
+                help='only build .json file from the journal and exit')
+
+    a_parser.add_argument(
+                '--shard_index',
+                metavar='int',
+                default=0,
+                type=int,
+                help='index of the shard downloaded by this process')
+
+    a_parser.add_argument(
+                '--num_shards',
+                metavar='int',
+                default=1,
+                type=int,
+                help='number of shards the tsv-file is split into')
+
+    a_parser.add_argument(
+                '--shard_mode',
+                choices=['modulo', 'range'],
+                default='modulo',
+                help='split cells by cell number modulo or by byte ranges')
+
+    a_parser.add_argument(
+                '-r',
+                '--max_retries',
+                metavar='int',
+                default=3,
+                type=int,
+                help='max number of attempts for cells that failed with ' + \
+                    'transient error (0 -- failed cells are not retried)')
+
+    a_parser.add_argument(
+                '--retry_delay',
+                metavar='float',
+                default=1.0,
+                type=float,
+                help='backoff delay after the first failed attempt, it ' + \
+                    'doubles with every next attempt')
+
+    a_parser.add_argument(
+                '--retry_classes',
+                metavar='timeout,connection,http_5xx,http_429',
+                default=','.join(sorted(DEFAULT_RETRY_CLASSES)),
+                help='comma separated error classes that are retried, ' + \
+                    'others: ' + ','.join(sorted(ERROR_CLASSES)))
+
+    a_parser.add_argument(
+                '--retry_errors',
+                action='store_true',
+                help='only download again cells from error list of the ' + \
+                    'existing journal or .json file')
+
+    a_parser.add_argument(
+                '--store_dir',
+                metavar='/path/to/store',
+                required=False,
+                help='save every distinct picture once in this directory ' + \
+                    'and hard link dataset pictures to it')
+
+    a_parser.add_argument(
+                '--no_validation',
+                action='store_true',
+                help='save downloaded data without checking that it is ' + \
+                    'a complete picture')
+
     args = vars(a_parser.parse_args())
     s_tsv_path = os.path.abspath(args.get('source_tsv'))
     o_json_path = os.path.abspath(args.get('output_json'))
+    num_shards = args.get('num_shards')
+
+    if num_shards < 1 or not 0 <= args.get('shard_index') < num_shards:
+        print('\n[ERROR]: shard_index must be in range [0, num_shards)')
+        sys.exit(1)
+
+    if num_shards > 1:
+        o_json_path = get_shard_json_path(
+                                o_json_path, args.get('shard_index'), num_shards)
     dset_pic_path = os.path.abspath(args.get('dset_pic_path'))
     continue_flag = args.get('continue_download')
 
@@ -116,32 +279,197 @@ def _a_parse():
     else:
         continue_flag = False
 
+    if args.get('workers') < 1:
+        print('\n[ERROR]: number of workers must be positive')
+        sys.exit(1)
+
+    if args.get('host_connections') < 0:
+        print('\n[ERROR]: number of host connections must not be negative')
+        sys.exit(1)
+
+    retry_classes = set(args.get('retry_classes').split(','))
+    if not retry_classes <= ERROR_CLASSES:
+        print('\n[ERROR]: unknown error classes:', retry_classes - ERROR_CLASSES)
+        sys.exit(1)
+
+    if args.get('retry_errors') and os.path.exists(o_json_path) != True and \
+                    os.path.exists(get_journal_path(o_json_path)) != True:
+        print('\n[ERROR]: retry_errors flag is true but neither .json file ' \
+                                                    'nor journal has found')
+        sys.exit(1)
+
     if os.path.exists(dset_pic_path) != True:
         os.makedirs(dset_pic_path)
 
+    if args.get('store_dir') is not None:
+        args.update({'store_dir': os.path.abspath(args.get('store_dir'))})
+
     args.update({
             'source_tsv': s_tsv_path,
             'output_json': o_json_path,
             'dset_pic_path': dset_pic_path,
-            'continue_download': continue_flag
+            'continue_download': continue_flag,
+            'retry_classes': retry_classes
             })
 
     return args
 
-def read_tsv_data(tsv_path):
+def count_tsv_cells(tsv_path):
     """
-    This function reads tsv data from file.
+    This function counts cells (lines) of tsv file without keeping them in
+        memory.
 
     Keyword arguments:
     tsv_path -- path to tsv file to be read
 
     Return:
-    < list > -- [ [ < string >, < string > ], ... ]
+    < int > -- number of cells
+
+    """
+    tsv_len = 0
+    last_block = b'\n'
+
+    with open(tsv_path, 'rb') as tsv_file:
+        for block in iter(lambda: tsv_file.read(_COUNT_BLOCK), b''):
+            tsv_len += block.count(b'\n')
+            last_block = block
 
+    # the last line may have no line break
+    if not last_block.endswith(b'\n'):
+        tsv_len += 1
+
+    return tsv_len
+
+def iter_tsv_data(tsv_path, tsv_index=0, offset=0, end_offset=None):
     """
-    with open(tsv_path, 'r') as tsv_file:
-        tsv_data = [line.strip().split('\t') for line in tsv_file]
-    return tsv_data
+    This generator reads tsv file lazily line by line starting from the byte
+        offset of cell tsv_index.
+
+    Keyword arguments:
+    tsv_path -- path to tsv file to be read
+    tsv_index -- < int > index of the cell that starts at offset
+    offset -- < int > byte offset of the first cell to be read
+    end_offset -- < int > OR None cells starting at or after this offset are
+        not read
+
+    Yield:
+    < tuple > -- ( < int > cell index, < int > byte offset of the cell,
+                                            [ < string >, < string > ] )
+
+    """
+    with open(tsv_path, 'rb') as tsv_file:
+        tsv_file.seek(offset)
+
+        for line in tsv_file:
+            if end_offset is not None and offset >= end_offset:
+                break
+
+            yield tsv_index, offset, line.decode(
+                                    'utf-8', 'replace').strip().split('\t')
+            tsv_index += 1
+            offset += len(line)
+
+def _find_tsv_offset(tsv_path, tsv_index):
+    """
+    This function finds byte offset of the cell by reading lines before it.
+        It is used only if the offset has not been saved in the journal.
+
+    Keyword arguments:
+    tsv_path -- path to tsv file to be read
+    tsv_index -- < int > index of the cell
+
+    Return:
+    < int > -- byte offset of the cell
+
+    """
+    offset = 0
+    with open(tsv_path, 'rb') as tsv_file:
+        for _, line in zip(range(tsv_index), tsv_file):
+            offset += len(line)
+    return offset
+
+def get_shard_json_path(json_path, shard_index, num_shards):
+    """
+    This function returns path of result json-file of the shard.
+
+    Keyword arguments:
+    json_path -- < string > path to result json-file of the whole tsv-file
+    shard_index -- < int > index of the shard
+    num_shards -- < int > number of shards
+
+    Return:
+    < string > -- '/path/to/result_shard_{ shard_index }_of_{ num_shards }.json'
+
+    """
+    json_name, json_ext = os.path.splitext(json_path)
+    return '{}_shard_{}_of_{}{}'.format(
+                                json_name, shard_index, num_shards, json_ext)
+
+def _count_lines(tsv_file, start_offset, end_offset):
+    """
+    This function counts line breaks between start_offset and end_offset.
+
+    """
+    lines = 0
+    tsv_file.seek(start_offset)
+
+    while tsv_file.tell() < end_offset:
+        block = tsv_file.read(min(_COUNT_BLOCK, end_offset - tsv_file.tell()))
+        if not block:
+            break
+        lines += block.count(b'\n')
+
+    return lines
+
+def _align_to_line(tsv_file, offset):
+    """
+    This function returns the offset of the first line that starts at or
+        after offset.
+
+    """
+    if offset <= 0:
+        return 0
+
+    tsv_file.seek(offset - 1)
+    tsv_file.readline()
+    return tsv_file.tell()
+
+def get_shard_range(tsv_path, shard_index, num_shards):
+    """
+    This function splits tsv-file into num_shards byte ranges of equal size
+        and returns the range of the shard. Every range starts and ends at the
+        beginning of a line, so every cell belongs to exactly one shard.
+
+    Keyword arguments:
+    tsv_path -- path to tsv file
+    shard_index -- < int > index of the shard
+    num_shards -- < int > number of shards
+
+    Return:
+    < tuple > -- ( < int > index of the first cell, < int > its byte offset,
+                    < int > index of the cell after the last one,
+                    < int > byte offset where the shard ends )
+
+    """
+    tsv_size = os.path.getsize(tsv_path)
+
+    with open(tsv_path, 'rb') as tsv_file:
+        start_offset = _align_to_line(
+                            tsv_file, tsv_size * shard_index // num_shards)
+        end_offset = _align_to_line(
+                            tsv_file, tsv_size * (shard_index + 1) // num_shards)
+
+        start_index = _count_lines(tsv_file, 0, start_offset)
+        end_index = start_index + _count_lines(
+                                            tsv_file, start_offset, end_offset)
+
+        # the last line of the file may have no line break
+        if end_offset == tsv_size and end_offset > start_offset:
+            tsv_file.seek(end_offset - 1)
+            if tsv_file.read(1) != b'\n':
+                end_index += 1
+
+    return start_index, start_offset, end_index, end_offset
 
 def read_json_data(json_path):
     """
@@ -183,6 +511,88 @@ def save_json_data(json_path, json_info):
     with open(json_path, 'w') as json_file:
         json.dump(json_info, json_file)
 
+def _json_to_journal(json_path, journal_path):
+    """
+    This function makes journal from result json-file of older versions, so
+        that downloading can be continued.
+
+    Keyword arguments:
+    json_path -- < string > path to result json-file
+    journal_path -- < string > path to journal that will be written
+
+    Return:
+    < dict > OR None -- last written record or None if there are no cells
+
+    """
+    json_data = read_json_data(json_path)
+    time_spent = json_data.get('time_spent', 0)
+
+    records = [{
+                "cell_number": element.get('cell_number'),
+                "filename": element.get('filename'),
+                "caption": element.get('caption'),
+                "time_spent": time_spent
+                } for element in json_data.get('downloaded_flist')]
+
+    for record, element in zip(records, json_data.get('downloaded_flist')):
+        if 'digest' in element:
+            record.update({"digest": element.get('digest')})
+
+    records += [{
+                "cell_number": cell_number,
+                "error": "unknown",
+                "time_spent": time_spent
+                } for cell_number in json_data.get('error_clist')]
+
+    records.sort(key=lambda record: record.get('cell_number'))
+
+    with DownloadJournal(journal_path, len(records) + 1) as journal:
+        journal.write({"tsv_source_fname": json_data.get('tsv_source_fname')})
+        for record in records:
+            journal.write(record)
+
+    return records[-1] if len(records) > 0 else None
+
+def _write_outcome(journal, cell_index, offset, current_cell, error, z_indent,
+                                    time_spent, attempt=None, pic_info=None):
+    """
+    This function writes outcome of the cell to the journal.
+
+    Keyword arguments:
+    journal -- < DownloadJournal > journal of the download
+    cell_index -- < int > index of the cell
+    offset -- < int > byte offset of the cell in tsv-file
+    current_cell -- < list > [ < string >, < string > ] annotation & URL
+    error -- < Exception > OR None error of the download
+    z_indent -- < int > width of the zero padded number in picture names
+    time_spent -- < int > seconds spent on downloading
+    attempt -- < int > OR None number of attempts of a retried cell
+    pic_info -- < dict > OR None fields of the downloaded picture ("digest",
+        "height", "width")
+
+    """
+    if error is None:
+        record = {
+                "cell_number": cell_index,
+                "filename": get_pic_filename(cell_index, z_indent),
+                "caption": current_cell[0]
+                }
+        if pic_info is not None:
+            record.update(pic_info)
+    else:
+        print('Trouble with link:', current_cell[1])
+        record = {
+                "cell_number": cell_index,
+                "error": str(error),
+                "error_class": classify_error(error)
+                }
+
+    record.update({"offset": offset, "time_spent": time_spent})
+    if attempt is not None:
+        record.update({"retry": attempt})
+
+    journal.write(record)
+
 def _print_current_info(tsv_index, tsv_len, time_spent, time_left):
     """
     This function displays information about the current download.
@@ -195,6 +605,283 @@ def _print_current_info(tsv_index, tsv_len, time_spent, time_left):
     print('Time since the start of the download: {}'.format(time_spent))
     print('Estimated time to complete the download: {}'.format(time_left))
 
+def get_pic_filename(cell_index, z_indent):
+    """
+    This function returns name of the picture file that belongs to the cell.
+
+    Keyword arguments:
+    cell_index -- < int > number of the tsv cell
+    z_indent -- < int > width of the zero padded number (digits in tsv length)
+
+    Return:
+    < string > -- 'dataset_pic_{ zero padded cell_index }.jpg'
+
+    """
+    return 'dataset_pic_{}.jpg'.format(str(cell_index).zfill(z_indent))
+
+def download_cell(current_cell, pic_path, t_timeout, http_pool=None,
+                                    throttle=None, store=None, validate=True):
+    """
+    This function downloads picture of a single tsv cell and saves it. The
+        picture is read completely before the file is created, so a broken
+        connection does not leave a partial file behind.
+
+    Keyword arguments:
+    current_cell -- < list > [ < string >, < string > ] annotation & URL
+    pic_path -- < string > path where picture will be saved
+    t_timeout -- < float > connection timeout
+    http_pool -- < HTTPConnectionPool > OR None pooled client. If None then
+        a new connection is opened by urlopen
+    throttle -- < HostThrottle > OR None cooldowns of hosts. If the host is
+        cooling down then the request waits for the end of the cooldown
+    store -- < ContentStore > OR None store of distinct pictures. If it is
+        specified then pic_path is a hard link to the stored picture
+    validate -- < bool > if True then data that is not a complete picture is
+        not saved and BadImageError is returned
+
+    Return:
+    < tuple > -- ( < Exception > OR None, < dict > OR None ) error that has
+        occurred or None if picture has been saved successfully, and fields
+        of the saved picture: { "digest": < string >, "height": < int >,
+        "width": < int > } (size is absent if it is not in the header)
+
+    """
+    host = None
+
+    try:
+        if throttle is not None:
+            host = get_url_host(current_cell[1])
+            # the request is postponed, not skipped: a cell that has not been
+            # requested must not be recorded as failed
+            host_delay = throttle.delay_for(host)
+            while host_delay > 0:
+                time.sleep(host_delay)
+                host_delay = throttle.delay_for(host)
+
+        if http_pool is None:
+            resource = ureq.urlopen(current_cell[1], timeout=t_timeout)
+        else:
+            resource = http_pool.get(current_cell[1], timeout=t_timeout)
+        pic_data = resource.read()
+
+        if validate:
+            pic_info = check_image_data(
+                            pic_data, resource.headers.get('Content-Type'))
+        else:
+            pic_info = {}
+
+        if store is None:
+            digest = get_data_digest(pic_data)
+            with open(pic_path, 'wb') as current_pic:
+                current_pic.write(pic_data)
+        else:
+            digest = store.put(pic_data)
+            store.link(digest, pic_path)
+
+    except Exception as error:
+        if host is not None:
+            throttle.report(
+                    host, classify_error(error), get_retry_after(error))
+        return error, None
+
+    if host is not None:
+        throttle.report(host, None)
+
+    pic_info.update({"digest": digest})
+    return None, pic_info
+
+def _iter_downloads(tsv_cells, z_indent, dset_pic_path, download, workers):
+    """
+    This generator downloads cells and yields results in the order of cells.
+        If workers is more than 1 then pictures are downloaded by a thread pool
+        which keeps up to workers requests in flight.
+
+    Keyword arguments:
+    tsv_cells -- < iterable > of ( < int > cell index, < int > byte offset,
+        [ < string >, < string > ] ) as yielded by iter_tsv_data()
+    z_indent -- < int > width of the zero padded number in picture names
+    dset_pic_path -- < string > directory where pictures will be saved
+    download -- < function > download_cell with bound settings, it takes cell
+        and picture path
+    workers -- < int > number of simultaneous downloads
+
+    Yield:
+    < tuple > -- ( < int > cell index, < int > byte offset,
+                        [ < string >, < string > ], ( < Exception > OR None,
+                        < dict > OR None ) as returned by download )
+
+    """
+    if workers == 1:
+        for current_index, offset, current_cell in tsv_cells:
+            yield current_index, offset, current_cell, download(
+                                        current_cell,
+                                        os.path.join(dset_pic_path,
+                                            get_pic_filename(
+                                                current_index, z_indent)))
+        return
+
+    window = workers * _WINDOW_FACTOR
+    pending = deque()
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for current_index, offset, current_cell in tsv_cells:
+            pending.append((current_index, offset, current_cell,
+                                        executor.submit(
+                                        download,
+                                        current_cell,
+                                        os.path.join(dset_pic_path,
+                                            get_pic_filename(
+                                                current_index, z_indent)))))
+
+            if len(pending) >= window:
+                done_index, offset, done_cell, future = pending.popleft()
+                yield done_index, offset, done_cell, future.result()
+
+        while pending:
+            done_index, offset, done_cell, future = pending.popleft()
+            yield done_index, offset, done_cell, future.result()
+
+def _iter_retries(failed_cells, z_indent, dset_pic_path, download, workers,
+                                    throttle, max_retries, retry_classes,
+                                                                retry_delay):
+    """
+    This generator downloads failed cells again. Cells that fail with error of
+        transient class are re-queued with exponential backoff until
+        max_retries attempts are made. Cells of hosts that are cooling down
+        wait for the end of the cooldown. Results are yielded in the order of
+        completion, only final result of every cell is yielded.
+
+    Keyword arguments:
+    failed_cells -- < iterable > of ( < int > cell index, < int > byte offset,
+        [ < string >, < string > ] )
+    z_indent -- < int > width of the zero padded number in picture names
+    dset_pic_path -- < string > directory where pictures will be saved
+    download -- < function > download_cell with bound settings
+    workers -- < int > number of simultaneous downloads
+    throttle -- < HostThrottle > cooldowns of hosts
+    max_retries -- < int > max number of attempts for every cell
+    retry_classes -- < set > of < string > error classes that are retried
+    retry_delay -- < float > backoff delay after the first failed attempt
+
+    Yield:
+    < tuple > -- ( < int > cell index, < int > byte offset,
+                    [ < string >, < string > ], < Exception > OR None,
+                    < dict > OR None fields of the picture,
+                    < int > number of attempts )
+
+    """
+    # heap of [ ready time, cell index, byte offset, cell, attempt ]
+    queue = [[0.0, current_index, offset, current_cell, 1]
+                        for current_index, offset, current_cell in failed_cells]
+    heapq.heapify(queue)
+
+    window = workers * _WINDOW_FACTOR
+    in_flight = {}
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        while queue or in_flight:
+            now = time.time()
+
+            while queue and queue[0][0] <= now and len(in_flight) < window:
+                item = heapq.heappop(queue)
+                host_delay = throttle.delay_for(get_url_host(item[3][1]))
+
+                if host_delay > 0:
+                    item[0] = now + host_delay
+                    heapq.heappush(queue, item)
+                    continue
+
+                in_flight[executor.submit(
+                                download,
+                                item[3],
+                                os.path.join(dset_pic_path,
+                                    get_pic_filename(item[1], z_indent)))] = item
+
+            sleep_time = max(0.0, queue[0][0] - now) if queue else None
+            if not in_flight:
+                time.sleep(sleep_time)
+                continue
+
+            done_set, _ = wait(in_flight, timeout=sleep_time,
+                                                return_when=FIRST_COMPLETED)
+
+            for future in done_set:
+                item = in_flight.pop(future)
+                error, pic_info = future.result()
+
+                if error is not None:
+                    error_class = classify_error(error)
+
+                    if error_class in retry_classes and item[4] < max_retries:
+                        item[0] = time.time() + get_backoff_delay(
+                                                            item[4], retry_delay)
+                        item[4] += 1
+                        heapq.heappush(queue, item)
+                        continue
+
+                yield item[1], item[2], item[3], error, pic_info, item[4]
+
+def _collect_failed_cells(journal_path, retry_classes=None):
+    """
+    This function finds cells whose latest journal record is an error.
+
+    Keyword arguments:
+    journal_path -- < string > path to journal
+    retry_classes -- < set > OR None only errors of these classes are taken.
+        If None then every error is taken
+
+    Return:
+    < dict > -- { < int > cell index: < int > OR None byte offset, ... }
+
+    """
+    failed_cells = {}
+
+    for record in iter_journal(journal_path):
+        cell_number = record.get('cell_number')
+        if cell_number is None:
+            continue
+
+        if 'error' in record and (retry_classes is None or \
+                                record.get('error_class') in retry_classes):
+            failed_cells[cell_number] = record.get('offset')
+        else:
+            failed_cells.pop(cell_number, None)
+
+    return failed_cells
+
+def iter_tsv_cells_at(tsv_path, cell_offsets):
+    """
+    This generator reads specified cells of tsv file. Cells with known byte
+        offset are read directly, the others are found by a single pass over
+        the file.
+
+    Keyword arguments:
+    tsv_path -- path to tsv file to be read
+    cell_offsets -- < dict > { < int > cell index: < int > OR None offset }
+
+    Yield:
+    < tuple > -- ( < int > cell index, < int > byte offset of the cell,
+                                            [ < string >, < string > ] )
+
+    """
+    unknown_cells = set()
+
+    with open(tsv_path, 'rb') as tsv_file:
+        for cell_index in sorted(cell_offsets):
+            offset = cell_offsets[cell_index]
+            if offset is None:
+                unknown_cells.add(cell_index)
+                continue
+
+            tsv_file.seek(offset)
+            yield cell_index, offset, tsv_file.readline().decode(
+                                    'utf-8', 'replace').strip().split('\t')
+
+    if unknown_cells:
+        for cell_index, offset, current_cell in iter_tsv_data(tsv_path):
+            if cell_index in unknown_cells:
+                yield cell_index, offset, current_cell
+
 def start_downloading(args):
     """
     This function starts downloading.
@@ -205,119 +892,225 @@ def start_downloading(args):
             'output_json': < string >,
             'dset_pic_path': < string >,
             'continue_download': < bool >,
-            'timeout_connection': < float >
+            'timeout_connection': < float >,
+            'workers': < int >,
+            'host_connections': < int >,
+            'journal_sync': < int >,
+            'shard_index': < int >,
+            'num_shards': < int >,
+            'shard_mode': < string >,
+            'max_retries': < int >,
+            'retry_delay': < float >,
+            'retry_classes': < set > of < string >,
+            'retry_errors': < bool >,
+            'store_dir': < string > OR None,
+            'no_validation': < bool >
             }
     """
 
     o_json_path = args.get('output_json')
     t_timeout = args.get('timeout_connection')
     dset_pic_path = args.get('dset_pic_path')
+    workers = args.get('workers', 1)
+    journal_path = get_journal_path(o_json_path)
+
+    shard_index = args.get('shard_index', 0)
+    num_shards = args.get('num_shards', 1)
+    shard_mode = args.get('shard_mode', 'modulo')
 
-    tsv_data = read_tsv_data(args.get('source_tsv'))
-    tsv_len = len(tsv_data)
+    tsv_len = None
     tsv_index = 0
+    tsv_offset = 0
+    end_index = None
+    end_offset = None
+    skip_first = False
+    time_spent = 0
 
-    json_data = None
-    pic_name = 'dataset_pic_{}.jpg'
-    z_indent = len(str(tsv_len))
+    if num_shards > 1 and shard_mode == 'range':
+        tsv_index, tsv_offset, end_index, end_offset = get_shard_range(
+                            args.get('source_tsv'), shard_index, num_shards)
 
-    if args.get('continue_download'):
-        if os.path.isfile(o_json_path):
-            json_data = read_json_data(o_json_path)
+    if args.get('continue_download') or args.get('retry_errors'):
+        if os.path.isfile(journal_path):
+            repair_journal(journal_path)
+            last_record = read_last_record(journal_path)
+        elif os.path.isfile(o_json_path):
+            print('[ATTENTION]: journal has not found, it will be made ' \
+            'from .json file.')
+            last_record = _json_to_journal(o_json_path, journal_path)
+        else:
+            last_record = None
+            print('[ATTENTION]: continue_download flag is true but .json ' \
+            'file has not found. Download will start from beginning.')
 
-            if len(json_data.get('downloaded_flist')) > 0:
-                flist_last = json_data.get('downloaded_flist')[-1].get(
-                                                                'cell_number')
-            else:
-                flist_last = 0
+        if last_record is not None and 'cell_number' in last_record:
+            tsv_index = last_record.get('cell_number') + 1
+            time_spent = last_record.get('time_spent', 0)
 
-            if len(json_data.get('error_clist')) > 0:
-                clist_last = json_data.get('error_clist')[-1]
+            # reading starts from the line of the last record which is skipped
+            if 'offset' in last_record:
+                tsv_offset = last_record.get('offset')
+                tsv_index -= 1
+                skip_first = True
             else:
-                clist_last = 0
+                tsv_offset = _find_tsv_offset(args.get('source_tsv'), tsv_index)
 
-            if flist_last > clist_last:
-                tsv_index = flist_last + 1
-            elif flist_last < clist_last:
-                tsv_index = clist_last + 1
-            else:
-                tsv_index = 0
+        if os.path.isfile(journal_path):
+            tsv_len = read_journal_header(journal_path).get('tsv_len')
 
-        else:
-            print('[ATTENTION]: continue_download flag is true but .json ' \
-            'file has not found. Download will start from beginning.')
+    elif os.path.isfile(journal_path):
+        os.remove(journal_path)
+
+    if tsv_len is None:
+        tsv_len = count_tsv_cells(args.get('source_tsv'))
+    z_indent = len(str(tsv_len))
+
+    if end_index is None:
+        end_index = tsv_len
+
+    tsv_cells = iter_tsv_data(
+                    args.get('source_tsv'), tsv_index, tsv_offset, end_offset)
+    if skip_first:
+        next(tsv_cells, None)
+        tsv_index += 1
 
-    if json_data is None:
-        json_data = {
+    # in modulo mode every cell is read but only cells of the shard are taken
+    cell_step = 1
+    if num_shards > 1 and shard_mode == 'modulo':
+        cell_step = num_shards
+        tsv_cells = (tsv_cell for tsv_cell in tsv_cells
+                                if tsv_cell[0] % num_shards == shard_index)
+
+    new_journal = not os.path.isfile(journal_path) or \
+                                        os.path.getsize(journal_path) == 0
+    journal = DownloadJournal(journal_path, args.get('journal_sync', 100))
+
+    if new_journal:
+        journal.write({
             "tsv_source_fname": os.path.split(args.get('source_tsv'))[1],
-            "time_spent": 0,
-            "downloaded_flist": [],
-            "error_clist":  []
-        }
-        save_json_data(o_json_path, json_data)
+            "tsv_len": tsv_len,
+            "shard_index": shard_index,
+            "num_shards": num_shards,
+            "shard_mode": shard_mode
+            })
+
+    if args.get('host_connections', 0) > 0:
+        http_pool = HTTPConnectionPool(args.get('host_connections'))
+    else:
+        http_pool = None
+
+    if args.get('store_dir') is not None:
+        store = ContentStore(args.get('store_dir'))
+    else:
+        store = None
 
+    throttle = HostThrottle(args.get('retry_delay', 1.0))
+    download = partial(download_cell, t_timeout=t_timeout,
+                        http_pool=http_pool, throttle=throttle, store=store,
+                        validate=not args.get('no_validation', False))
+
+    # only cells of the error list are downloaded again
+    if args.get('retry_errors'):
+        tsv_cells = iter(())
 
     start_time = time.time()
-    time_spent = json_data.get('time_spent')
-    downloaded_flist = json_data.get('downloaded_flist')
-    error_clist = json_data.get('error_clist')
 
     print('\nThe paths are:\n')
     print('.tsv-file path:', args.get('source_tsv'))
     print('.json-file path:', args.get('output_json'))
+    print('Journal path:', journal_path)
     print('Dataset pics path:', args.get('dset_pic_path'))
+    if store is not None:
+        print('Picture store path:', args.get('store_dir'))
+    if num_shards > 1:
+        print('Shard: {} of {} ({}).'.format(
+                                        shard_index, num_shards, shard_mode))
     print(
          '\nFound {} cells. Current index: {}.\nStarting download...\n'.format(
                                                 tsv_len, tsv_index))
 
-    for tsv_index in range(tsv_index, tsv_len):
+    processed_len = 0
 
-        current_cell = tsv_data[tsv_index]
+    try:
+        for tsv_index, offset, current_cell, (error, pic_info) in \
+                _iter_downloads(
+                    tsv_cells, z_indent, dset_pic_path, download, workers):
 
-        try:
-            resource = ureq.urlopen(current_cell[1], timeout=t_timeout)
-            current_filename = pic_name.format(str(tsv_index).zfill(z_indent))
-
-            with open(os.path.join(
-                        dset_pic_path, current_filename), 'wb') as current_pic:
-                current_pic.write(resource.read())
-
-            downloaded_flist.append({
-                                    "cell_number": tsv_index,
-                                    "filename": current_filename,
-                                    "caption": current_cell[0]
-                                    })
-        except Exception as e:
-            print('Trouble with link:', current_cell[1])
-            error_clist.append(tsv_index)
-
-        if tsv_index%100 == 0:
             delta_time = round(time_spent + (time.time()-start_time))
-            seconds_left = round(delta_time/(tsv_index+1)*(tsv_len-tsv_index))
+            _write_outcome(journal, tsv_index, offset, current_cell, error,
+                                    z_indent, delta_time, pic_info=pic_info)
+
+            processed_len += 1
+            if processed_len%100 == 0:
+                seconds_left = round((time.time()-start_time) / \
+                        processed_len * (end_index-tsv_index-1) / cell_step)
+
+                _print_current_info(
+                                    tsv_index,
+                                    tsv_len,
+                                    str(timedelta(seconds=delta_time)),
+                                    str(timedelta(seconds=seconds_left))
+                                    )
+
+        max_retries = args.get('max_retries', 0)
+        if args.get('retry_errors'):
+            journal.sync()
+            failed_cells = _collect_failed_cells(journal_path)
+            max_retries = max(1, max_retries)
+        elif max_retries > 0:
+            journal.sync()
+            failed_cells = _collect_failed_cells(journal_path,
+                        args.get('retry_classes', DEFAULT_RETRY_CLASSES))
+        else:
+            failed_cells = {}
+
+        if len(failed_cells) > 0:
+            print('\nRetrying {} failed cells...\n'.format(len(failed_cells)))
 
-            _print_current_info(
-                                tsv_index,
-                                tsv_len,
-                                str(timedelta(seconds=delta_time)),
-                                str(timedelta(seconds=seconds_left))
-                                )
-            if tsv_index%1000 == 0:
-                json_data.update({'time_spent': delta_time})
-                save_json_data(o_json_path, json_data)
-                print('\nSaved json_data info.\n')
+        for retry_index, (tsv_index, offset, current_cell, error, pic_info,
+                                                    attempt) in enumerate(
+                _iter_retries(
+                    iter_tsv_cells_at(args.get('source_tsv'), failed_cells),
+                    z_indent, dset_pic_path, download, workers, throttle,
+                    max_retries, args.get('retry_classes', DEFAULT_RETRY_CLASSES),
+                    args.get('retry_delay', 1.0)), 1):
 
+            delta_time = round(time_spent + (time.time()-start_time))
+            _write_outcome(journal, tsv_index, offset, current_cell, error,
+                                    z_indent, delta_time, attempt, pic_info)
+
+            if retry_index%100 == 0:
+                print('Retried: {} of {}.'.format(
+                                                retry_index, len(failed_cells)))
+    finally:
+        journal.close()
+        if http_pool is not None:
+            http_pool.close()
 
+    json_data = compact_journal(journal_path)
     save_json_data(o_json_path, json_data)
-    error_len = len(error_clist)
-    success_len = len(downloaded_flist)
+
+    error_len = len(json_data.get('error_clist'))
+    success_len = len(json_data.get('downloaded_flist'))
+    cells_len = max(1, success_len + error_len)
 
     print('\nDownloading has completed.')
     print('\n\nTotal:\n\tDownloaded successfuly: {} of {} images.\n'.format(
-                                                success_len, tsv_len))
+                                                success_len, cells_len))
     print('Connection error percentage: {}%.'.format(
-                                             round(100/tsv_len*error_len, 2)))
+                                             round(100/cells_len*error_len, 2)))
 
 if __name__ == '__main__':
 
     args = _a_parse()
-    start_downloading(args)
+
+    if args.get('compact_only'):
+        journal_path = get_journal_path(args.get('output_json'))
+        if os.path.isfile(journal_path) != True:
+            print('\n[ERROR]: journal has not found:', journal_path)
+            sys.exit(1)
+
+        save_json_data(args.get('output_json'), compact_journal(journal_path))
+        print('Saved json_data info.')
+    else:
+        start_downloading(args)
@@ -0,0 +1,304 @@
+"""
+This module implements append-only journal of dload_dataset.py. Every
+    processed cell is written to the journal as a single JSON line right after
+    it has been downloaded, so a crash loses nothing but the lines that were
+    not flushed yet. The journal is fsync'ed every fsync_every records.
+
+Journal view (JSON Lines):
+
+{"tsv_source_fname": < string >, "tsv_len": < int >}
+{"cell_number": < int >, "filename": < string >, "caption": < string >,
+                "digest": < string >, "height": < int >, "width": < int >,
+                                    "offset": < int >, "time_spent": < int >}
+{"cell_number": < int >, "error": < string >, "error_class": < string >,
+                                    "offset": < int >, "time_spent": < int >}
+...
+
+Records of cells downloaded again after errors also have "retry": < int >
+    (number of attempts).
+
+The first line is a header, every next line is the outcome of one cell. If a
+    cell occurs more than once then the latest record wins. "offset" is the
+    byte offset of the cell line in the source tsv-file, so reading can be
+    continued without reading the lines before it.
+
+Since cells are written in order, the restart point is the cell of the last
+    record, which is read from the end of the file without reading the whole
+    journal. compact_journal() builds the usual dload_dataset result dict.
+
+"""
+import os
+import json
+
+# size of the block read from the end of the journal while looking for a line
+_TAIL_BLOCK = 1 << 16
+
+# optional fields of successful records that are kept in "downloaded_flist"
+_FLIST_FIELDS = ('digest', 'height', 'width')
+
+def get_journal_path(json_path):
+    """
+    This function returns path of the journal that belongs to result json.
+
+    Keyword arguments:
+    json_path -- < string > path to result json-file
+
+    Return:
+    < string > -- '/path/to/result_journal.jsonl'
+
+    """
+    return os.path.splitext(json_path)[0] + '_journal.jsonl'
+
+def _find_complete_end(journal_file):
+    """
+    This function returns offset right after the last line break of the file,
+        i.e. the end of the last complete line. Only the end of the file is
+        read.
+
+    """
+    journal_file.seek(0, os.SEEK_END)
+    position = journal_file.tell()
+
+    while position > 0:
+        block_start = max(0, position - _TAIL_BLOCK)
+        journal_file.seek(block_start)
+        block = journal_file.read(position - block_start)
+
+        newline = block.rfind(b'\n')
+        if newline != -1:
+            return block_start + newline + 1
+        position = block_start
+
+    return 0
+
+def _iter_lines_reversed(journal_file):
+    """
+    This generator yields complete lines of the file from the last one to the
+        first one reading the file by blocks from the end.
+
+    """
+    position = _find_complete_end(journal_file)
+    if position == 0:
+        return
+
+    # the last line break is dropped, so every line but the first is complete
+    position -= 1
+    buffer = b''
+
+    while position > 0:
+        block_start = max(0, position - _TAIL_BLOCK)
+        journal_file.seek(block_start)
+        buffer = journal_file.read(position - block_start) + buffer
+        position = block_start
+
+        lines = buffer.split(b'\n')
+        buffer = lines[0]
+        for line in reversed(lines[1:]):
+            yield line
+
+    yield buffer
+
+def repair_journal(journal_path):
+    """
+    This function cuts the incomplete last line of the journal that could be
+        left after a crash. Only the end of the file is read.
+
+    Keyword arguments:
+    journal_path -- < string > path to journal
+
+    """
+    with open(journal_path, 'rb+') as journal_file:
+        journal_file.seek(0, os.SEEK_END)
+        end = journal_file.tell()
+        position = _find_complete_end(journal_file)
+
+        if position != end:
+            journal_file.truncate(position)
+
+def read_journal_header(journal_path):
+    """
+    This function reads the first line (header) of the journal.
+
+    Keyword arguments:
+    journal_path -- < string > path to journal
+
+    Return:
+    < dict > -- header or empty dict if journal has no header
+
+    """
+    with open(journal_path, 'r', encoding='utf-8') as journal_file:
+        line = journal_file.readline()
+
+    if not line.endswith('\n'):
+        return {}
+
+    header = json.loads(line)
+    if 'cell_number' in header:
+        return {}
+
+    return header
+
+def read_last_record(journal_path):
+    """
+    This function reads the last complete record of the journal that is not a
+        record of a retried cell. Only the end of the file is read (and the
+        records of retried cells at the end).
+
+    Keyword arguments:
+    journal_path -- < string > path to journal
+
+    Return:
+    < dict > OR None -- last record or None if journal is empty
+
+    """
+    with open(journal_path, 'rb') as journal_file:
+        for line in _iter_lines_reversed(journal_file):
+            if line.strip():
+                record = json.loads(line.decode('utf-8'))
+                if 'retry' not in record:
+                    return record
+
+    return None
+
+def iter_journal(journal_path):
+    """
+    This generator reads journal line by line. The incomplete last line is
+        skipped.
+
+    Keyword arguments:
+    journal_path -- < string > path to journal
+
+    Yield:
+    < dict > -- journal record
+
+    """
+    with open(journal_path, 'r', encoding='utf-8') as journal_file:
+        for line in journal_file:
+            if not line.endswith('\n'):
+                break
+            if line.strip():
+                yield json.loads(line)
+
+def compact_journal(journal_path):
+    """
+    This function builds dload_dataset result dict from the journal.
+
+    Keyword arguments:
+    journal_path -- < string > path to journal
+
+    Return:
+    < dict > -- {
+                "tsv_source_fname": < string >,
+                "time_spent": < int >,
+                "downloaded_flist": [
+                                        {
+                                            "cell_number": < int >,
+                                            "filename": < string >,
+                                            "caption": < string >,
+                                            "digest": < string >,
+                                            "height": < int >,
+                                            "width": < int >
+                                        }, ...
+                                    ],
+                "error_clist":  [ < int >, ... ]
+            }
+
+    """
+    header = {}
+    outcomes = {}
+    time_spent = 0
+
+    for record in iter_journal(journal_path):
+        cell_number = record.get('cell_number')
+        if cell_number is None:
+            header.update(record)
+            continue
+
+        outcomes[cell_number] = record
+        time_spent = record.get('time_spent', time_spent)
+
+    downloaded_flist = []
+    error_clist = []
+
+    for cell_number in sorted(outcomes):
+        record = outcomes[cell_number]
+        if 'error' in record:
+            error_clist.append(cell_number)
+        else:
+            flist_element = {
+                            "cell_number": cell_number,
+                            "filename": record.get('filename'),
+                            "caption": record.get('caption')
+                            }
+            for field in _FLIST_FIELDS:
+                if field in record:
+                    flist_element[field] = record.get(field)
+            downloaded_flist.append(flist_element)
+
+    return {
+        "tsv_source_fname": header.get('tsv_source_fname'),
+        "time_spent": time_spent,
+        "downloaded_flist": downloaded_flist,
+        "error_clist": error_clist
+    }
+
+class DownloadJournal:
+    """
+    This class appends records to the journal. Every record is flushed to the
+        operating system at once, fsync is called every fsync_every records.
+
+    """
+    def __init__(self, journal_path, fsync_every=100):
+        """
+        Keyword arguments:
+        journal_path -- < string > path to journal
+        fsync_every -- < int > number of records between fsync calls
+
+        """
+        if os.path.isfile(journal_path):
+            repair_journal(journal_path)
+
+        self.journal_path = journal_path
+        self.fsync_every = max(1, fsync_every)
+        self._unsynced = 0
+        self._file = open(journal_path, 'a', encoding='utf-8')
+
+    def write(self, record):
+        """
+        This method appends record to the journal.
+
+        Keyword arguments:
+        record -- < dict > record that will be written
+
+        """
+        self._file.write(json.dumps(
+                        record, ensure_ascii=False, separators=(',', ':')) + '\n')
+        self._file.flush()
+
+        self._unsynced += 1
+        if self._unsynced >= self.fsync_every:
+            self.sync()
+
+    def sync(self):
+        """
+        This method forces written records to disk.
+
+        """
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._unsynced = 0
+
+    def close(self):
+        """
+        This method syncs and closes the journal.
+
+        """
+        if not self._file.closed:
+            self.sync()
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
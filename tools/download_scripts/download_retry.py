@@ -0,0 +1,196 @@
+"""
+This module sorts download errors of dload_dataset.py into classes and keeps
+    track of hosts that ask to slow down.
+
+Error classes:
+    'timeout' -- connection or reading has timed out
+    'connection' -- connection has been refused, reset or broken
+    'dns' -- host name can not be resolved
+    'http_429' -- server answered 429 Too Many Requests
+    'http_5xx' -- server error
+    'http_404' -- picture does not exist (404, 410)
+    'http_4xx' -- other client errors
+    'bad_image' -- answer is not a complete picture (see image_probe.py)
+    'throttled' -- only in journals of older versions: the request was not
+        made since the host was cooling down. Requests now wait for the end of
+        the cooldown, the class is kept so that such cells are retried
+    'other' -- everything else (bad url, file system errors, ...)
+
+Transient classes are re-queued with exponential backoff. Hosts that answer
+    429 or 5xx are cooled down: new requests to them are postponed for a delay
+    (or for Retry-After seconds). The delay doubles with every such answer
+    received after the previous cooldown has ended and halves with every
+    successful download.
+
+"""
+import time
+import socket
+import random
+import threading
+import http.client
+import urllib.error
+import urllib.parse
+
+from image_probe import BadImageError
+
+# 'throttled' is never returned by classify_error, it is only read from
+# journals of older versions
+DEFAULT_RETRY_CLASSES = {'timeout', 'connection', 'http_5xx', 'http_429',
+                                                                    'throttled'}
+
+ERROR_CLASSES = {'timeout', 'connection', 'dns', 'http_429', 'http_5xx',
+                'http_404', 'http_4xx', 'bad_image', 'throttled', 'other'}
+
+def classify_error(error):
+    """
+    This function returns class of download error.
+
+    Keyword arguments:
+    error -- < Exception > error raised by urlopen or HTTPConnectionPool
+
+    Return:
+    < string > -- one of ERROR_CLASSES
+
+    """
+    if isinstance(error, BadImageError):
+        return 'bad_image'
+
+    if isinstance(error, urllib.error.HTTPError):
+        if error.code == 429:
+            return 'http_429'
+        if error.code >= 500:
+            return 'http_5xx'
+        if error.code in {404, 410}:
+            return 'http_404'
+        return 'http_4xx'
+
+    # urlopen wraps socket errors into URLError
+    if isinstance(error, urllib.error.URLError) and \
+                                    isinstance(error.reason, BaseException):
+        error = error.reason
+
+    if isinstance(error, socket.gaierror):
+        return 'dns'
+    if isinstance(error, (socket.timeout, TimeoutError)):
+        return 'timeout'
+    if isinstance(error, (ConnectionError, http.client.HTTPException)):
+        return 'connection'
+
+    return 'other'
+
+def get_retry_after(error):
+    """
+    This function returns value of Retry-After header in seconds if it is
+        specified in the http error.
+
+    Keyword arguments:
+    error -- < Exception > download error
+
+    Return:
+    < float > OR None -- seconds to wait
+
+    """
+    if not isinstance(error, urllib.error.HTTPError) or error.headers is None:
+        return None
+
+    try:
+        return max(0.0, float(error.headers.get('Retry-After')))
+    except (TypeError, ValueError):
+        return None
+
+def get_url_host(url):
+    """
+    This function returns host name of url in lower case ('' if url is
+        broken).
+
+    """
+    try:
+        return (urllib.parse.urlsplit(url).hostname or '').lower()
+    except ValueError:
+        return ''
+
+def get_backoff_delay(attempt, base_delay, max_delay=300.0):
+    """
+    This function returns exponential backoff delay with jitter.
+
+    Keyword arguments:
+    attempt -- < int > number of failed attempts (starting from 1)
+    base_delay -- < float > delay after the first failure
+    max_delay -- < float > upper bound of the delay
+
+    Return:
+    < float > -- seconds to wait before the next attempt
+
+    """
+    delay = min(max_delay, base_delay * 2 ** (attempt - 1))
+    return delay * random.uniform(0.5, 1.0)
+
+class HostThrottle:
+    """
+    This class keeps cooldown delays of hosts. It can be shared by many
+        threads.
+
+    """
+    def __init__(self, base_delay=1.0, max_delay=300.0):
+        """
+        Keyword arguments:
+        base_delay -- < float > cooldown after the first 429 or 5xx answer
+        max_delay -- < float > upper bound of the cooldown
+
+        """
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+        self._lock = threading.Lock()
+        # host -> [ < float > current delay, < float > time of next request ]
+        self._hosts = {}
+
+    def delay_for(self, host):
+        """
+        This method returns how many seconds host is still cooling down.
+
+        """
+        with self._lock:
+            host_info = self._hosts.get(host)
+            if host_info is None:
+                return 0.0
+            return max(0.0, host_info[1] - time.time())
+
+    def report(self, host, error_class, retry_after=None):
+        """
+        This method updates cooldown of the host after a download.
+
+        Keyword arguments:
+        host -- < string > host name
+        error_class -- < string > OR None class of error or None if picture
+            has been downloaded
+        retry_after -- < float > OR None value of Retry-After header
+
+        """
+        with self._lock:
+            host_info = self._hosts.get(host)
+
+            if error_class in {'http_429', 'http_5xx'}:
+                now = time.time()
+
+                # answers to requests made before the cooldown has started
+                # do not double it, only Retry-After is respected
+                if host_info is not None and host_info[1] > now:
+                    if retry_after is not None:
+                        host_info[1] = max(host_info[1],
+                                        now + min(self.max_delay, retry_after))
+                    return
+
+                if host_info is None:
+                    delay = self.base_delay
+                else:
+                    delay = min(self.max_delay, host_info[0] * 2)
+                if retry_after is not None:
+                    delay = max(delay, min(self.max_delay, retry_after))
+
+                self._hosts[host] = [delay, now + delay]
+
+            elif error_class is None and host_info is not None:
+                host_info[0] /= 2
+                if host_info[0] < self.base_delay:
+                    del self._hosts[host]
@@ -0,0 +1,253 @@
+"""
+This module provides a simple pooled HTTP client that reuses keep-alive
+    connections per host. It is used by dload_dataset.py so that pictures from
+    the same host do not pay for a new TCP (and TLS) handshake every time.
+
+The number of connections opened to a single host is limited by
+    max_per_host: if all of them are busy the caller waits until one of them
+    is released. Idle connections are kept for later requests, the oldest idle
+    hosts are closed when there are more than max_idle idle connections.
+
+Errors are raised in the same way as urllib.request.urlopen does: responses
+    with status >= 400 raise urllib.error.HTTPError, so the callers can handle
+    both clients identically.
+
+"""
+from collections import OrderedDict
+
+import ssl
+import sys
+import threading
+import http.client
+import urllib.error
+import urllib.parse
+
+_REDIRECT_CODES = {301, 302, 303, 307, 308}
+
+# errors that mean the server has closed idle keep-alive connection
+_STALE_ERRORS = (
+    http.client.RemoteDisconnected,
+    http.client.BadStatusLine,
+    BrokenPipeError,
+    ConnectionResetError,
+    ConnectionAbortedError
+    )
+
+class PooledResponse:
+    """
+    This class is a fully read response of the pooled client.
+
+    Attributes:
+    url -- < string > final url after redirects
+    status -- < int > http status code
+    headers -- < http.client.HTTPMessage > response headers
+    data -- < bytes > response body
+
+    """
+    def __init__(self, url, status, headers, data):
+        self.url = url
+        self.status = status
+        self.headers = headers
+        self.data = data
+
+    def read(self):
+        """
+        This method returns response body (the same as urlopen response).
+
+        """
+        return self.data
+
+class HTTPConnectionPool:
+    """
+    This class keeps keep-alive connections per host (scheme, host, port) and
+        limits the number of simultaneous connections to every host. It can be
+        shared by many threads.
+
+    """
+    def __init__(self, max_per_host=4, max_idle=256, max_redirects=5,
+                                                                user_agent=None):
+        """
+        Keyword arguments:
+        max_per_host -- < int > max number of connections to a single host
+        max_idle -- < int > max number of idle connections of all hosts
+        max_redirects -- < int > max number of redirects for a single request
+        user_agent -- < string > OR None value of User-Agent header
+
+        """
+        if max_per_host < 1:
+            raise ValueError('max_per_host must be positive')
+
+        self.max_per_host = max_per_host
+        self.max_idle = max_idle
+        self.max_redirects = max_redirects
+        self.user_agent = user_agent or 'Python-urllib/{}.{}'.format(
+                                                        *sys.version_info[:2])
+
+        self.connections_opened = 0
+
+        self._lock = threading.Lock()
+        self._slots = {}
+        self._idle = OrderedDict()
+        self._idle_count = 0
+        self._ssl_context = ssl.create_default_context()
+
+    def _get_slot(self, host_key):
+        with self._lock:
+            slot = self._slots.get(host_key)
+            if slot is None:
+                slot = threading.BoundedSemaphore(self.max_per_host)
+                self._slots[host_key] = slot
+        return slot
+
+    def _pop_idle(self, host_key):
+        with self._lock:
+            idle_list = self._idle.get(host_key)
+            if not idle_list:
+                return None
+
+            connection = idle_list.pop()
+            self._idle_count -= 1
+            if not idle_list:
+                del self._idle[host_key]
+        return connection
+
+    def _push_idle(self, host_key, connection):
+        to_close = []
+        with self._lock:
+            self._idle.setdefault(host_key, []).append(connection)
+            self._idle.move_to_end(host_key)
+            self._idle_count += 1
+
+            while self._idle_count > self.max_idle:
+                old_key, old_list = next(iter(self._idle.items()))
+                to_close.append(old_list.pop(0))
+                self._idle_count -= 1
+                if not old_list:
+                    del self._idle[old_key]
+
+        for old_connection in to_close:
+            old_connection.close()
+
+    def _new_connection(self, host_key, timeout):
+        scheme, host, port = host_key
+        with self._lock:
+            self.connections_opened += 1
+
+        if scheme == 'https':
+            return http.client.HTTPSConnection(
+                    host, port, timeout=timeout, context=self._ssl_context)
+        return http.client.HTTPConnection(host, port, timeout=timeout)
+
+    def _request_once(self, host_key, target, timeout):
+        """
+        This method makes a single GET request using pooled connection. If
+            reused connection turns out to be closed by server then request is
+            repeated on a new connection.
+
+        Return:
+        < tuple > -- ( < int > status, < HTTPMessage > headers, < bytes > body )
+
+        """
+        headers = {
+            'User-Agent': self.user_agent,
+            'Accept-Encoding': 'identity',
+            'Connection': 'keep-alive'
+            }
+
+        connection = self._pop_idle(host_key)
+        reused = connection is not None
+
+        while True:
+            if connection is None:
+                connection = self._new_connection(host_key, timeout)
+            else:
+                connection.timeout = timeout
+                if connection.sock is not None:
+                    connection.sock.settimeout(timeout)
+
+            try:
+                connection.request('GET', target, headers=headers)
+                response = connection.getresponse()
+                data = response.read()
+            except _STALE_ERRORS:
+                connection.close()
+                if not reused:
+                    raise
+                connection = None
+                reused = False
+                continue
+            except Exception:
+                connection.close()
+                raise
+
+            if response.will_close:
+                connection.close()
+            else:
+                self._push_idle(host_key, connection)
+
+            return response.status, response.headers, data
+
+    def get(self, url, timeout=None):
+        """
+        This method downloads url and follows redirects.
+
+        Keyword arguments:
+        url -- < string > http or https url
+        timeout -- < float > OR None socket timeout
+
+        Return:
+        < PooledResponse > -- fully read response
+
+        """
+        for _ in range(self.max_redirects + 1):
+            parsed = urllib.parse.urlsplit(url)
+            scheme = parsed.scheme.lower()
+
+            if scheme not in {'http', 'https'}:
+                raise ValueError('unsupported url scheme: {}'.format(url))
+            if not parsed.hostname:
+                raise ValueError('url has no host: {}'.format(url))
+
+            default_port = 443 if scheme == 'https' else 80
+            host_key = (scheme, parsed.hostname, parsed.port or default_port)
+
+            target = parsed.path or '/'
+            if parsed.query:
+                target += '?' + parsed.query
+
+            slot = self._get_slot(host_key)
+            slot.acquire()
+            try:
+                status, headers, data = self._request_once(
+                                                    host_key, target, timeout)
+            finally:
+                slot.release()
+
+            location = headers.get('Location')
+            if status in _REDIRECT_CODES and location:
+                url = urllib.parse.urljoin(url, location)
+                continue
+
+            if status >= 400:
+                raise urllib.error.HTTPError(
+                                    url, status, http.client.responses.get(
+                                        status, ''), headers, None)
+
+            return PooledResponse(url, status, headers, data)
+
+        raise urllib.error.HTTPError(
+                        url, status, 'too many redirects', headers, None)
+
+    def close(self):
+        """
+        This method closes all idle connections.
+
+        """
+        with self._lock:
+            idle_lists = list(self._idle.values())
+            self._idle.clear()
+            self._idle_count = 0
+
+        for idle_list in idle_lists:
+            for connection in idle_list:
+                connection.close()
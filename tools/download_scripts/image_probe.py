@@ -0,0 +1,258 @@
+"""
+This module checks downloaded pictures and reads their height & width from
+    the headers, so pictures do not have to be decoded.
+
+Supported formats: JPEG (SOFn segment), PNG (IHDR chunk), GIF (logical screen
+    descriptor), WebP (VP8, VP8L & VP8X chunks) & BMP. TIFF is recognized but
+    its size is not read.
+
+probe_image_file() reads the size of a saved picture the same way, without
+    reading the rest of the file.
+
+A picture is rejected if its magic bytes do not belong to any of the formats
+    (HTML error pages, empty answers, ...) or if it is truncated (JPEG without
+    EOI marker, PNG without IEND chunk, RIFF or BMP shorter than declared).
+
+"""
+import io
+import struct
+
+# how many bytes at the end of a picture are searched for its end marker
+_TAIL_CHECK = 1024
+
+# JPEG start of frame markers (DHT, JPG & DAC are excluded)
+_JPEG_SOF_MARKERS = set(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+
+# JPEG markers without length field
+_JPEG_STANDALONE_MARKERS = set(range(0xD0, 0xD8)) | {0x01, 0xD8}
+
+class BadImageError(Exception):
+    """
+    This exception means that downloaded data is not a complete picture.
+
+    """
+    pass
+
+def get_image_format(head):
+    """
+    This function recognizes picture format by magic bytes.
+
+    Keyword arguments:
+    head -- < bytes > at least 12 first bytes of the picture
+
+    Return:
+    < string > OR None -- 'jpeg', 'png', 'gif', 'webp', 'bmp', 'tiff' or None
+        if format is unknown
+
+    """
+    if head[:3] == b'\xff\xd8\xff':
+        return 'jpeg'
+    if head[:8] == b'\x89PNG\r\n\x1a\n':
+        return 'png'
+    if head[:6] in {b'GIF87a', b'GIF89a'}:
+        return 'gif'
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'webp'
+    if head[:2] == b'BM':
+        return 'bmp'
+    if head[:4] in {b'II*\x00', b'MM\x00*'}:
+        return 'tiff'
+    return None
+
+def _read_exact(image_file, size):
+    """
+    This function reads exactly size bytes or raises EOFError.
+
+    """
+    data = image_file.read(size)
+    if len(data) != size:
+        raise EOFError('unexpected end of picture')
+    return data
+
+def _get_jpeg_size(image_file):
+    """
+    This function walks JPEG segments from SOI to the first SOFn segment.
+        Only segment headers are read, segment bodies are skipped by seek.
+
+    Return:
+    < tuple > OR None -- ( < int > height, < int > width ) or None if there
+        is no SOFn before the scan or the height is defined later (DNL)
+
+    """
+    image_file.seek(2)
+
+    while True:
+        byte = _read_exact(image_file, 1)
+        if byte != b'\xff':
+            # garbage between segments
+            continue
+
+        marker = _read_exact(image_file, 1)[0]
+        while marker == 0xFF:
+            marker = _read_exact(image_file, 1)[0]
+
+        if marker in _JPEG_STANDALONE_MARKERS or marker == 0x00:
+            continue
+        if marker in {0xD9, 0xDA}:
+            return None
+
+        length = struct.unpack('>H', _read_exact(image_file, 2))[0]
+        if length < 2:
+            return None
+
+        if marker in _JPEG_SOF_MARKERS:
+            height, width = struct.unpack('>xHH', _read_exact(image_file, 5))
+            if height == 0 or width == 0:
+                return None
+            return height, width
+
+        image_file.seek(length - 2, io.SEEK_CUR)
+
+def _get_webp_size(head):
+    """
+    This function reads WebP canvas size from the first chunk.
+
+    Return:
+    < tuple > OR None -- ( < int > height, < int > width )
+
+    """
+    chunk = head[12:16]
+
+    if chunk == b'VP8 ' and head[23:26] == b'\x9d\x01\x2a':
+        width, height = struct.unpack('<HH', head[26:30])
+        return height & 0x3FFF, width & 0x3FFF
+
+    if chunk == b'VP8L' and head[20:21] == b'\x2f':
+        bits = struct.unpack('<I', head[21:25])[0]
+        return ((bits >> 14) & 0x3FFF) + 1, (bits & 0x3FFF) + 1
+
+    if chunk == b'VP8X':
+        width = int.from_bytes(head[24:27], 'little') + 1
+        height = int.from_bytes(head[27:30], 'little') + 1
+        return height, width
+
+    return None
+
+def get_image_size(image_file, image_format=None):
+    """
+    This function reads height & width of the picture from its header.
+
+    Keyword arguments:
+    image_file -- < file object > binary file (or io.BytesIO) that supports
+        seek
+    image_format -- < string > OR None format of the picture. If None then it
+        is recognized by magic bytes
+
+    Return:
+    < tuple > OR None -- ( < int > height, < int > width ) or None if the size
+        can not be read from the header
+
+    """
+    image_file.seek(0)
+    head = image_file.read(32)
+
+    if image_format is None:
+        image_format = get_image_format(head)
+
+    try:
+        if image_format == 'jpeg':
+            return _get_jpeg_size(image_file)
+
+        if image_format == 'png' and head[12:16] == b'IHDR':
+            width, height = struct.unpack('>II', head[16:24])
+            return height, width
+
+        if image_format == 'gif' and len(head) >= 10:
+            width, height = struct.unpack('<HH', head[6:10])
+            return height, width
+
+        if image_format == 'webp' and len(head) >= 30:
+            return _get_webp_size(head)
+
+        if image_format == 'bmp' and len(head) >= 26:
+            header_size = struct.unpack('<I', head[14:18])[0]
+            if header_size == 12:
+                width, height = struct.unpack('<HH', head[18:22])
+            else:
+                width, height = struct.unpack('<ii', head[18:26])
+            return abs(height), abs(width)
+
+    except (EOFError, struct.error):
+        return None
+
+    return None
+
+def probe_image_file(image_path):
+    """
+    This function reads height & width of the picture file. Only the header
+        is read (for JPEG -- headers of segments before SOFn).
+
+    Keyword arguments:
+    image_path -- < string > path to the picture
+
+    Return:
+    < tuple > OR None -- ( < int > height, < int > width ) or None if the
+        format is unknown or the size is not in the header
+
+    """
+    with open(image_path, 'rb') as image_file:
+        return get_image_size(image_file)
+
+def _is_complete(data, image_format):
+    """
+    This function checks that the picture is not truncated.
+
+    """
+    if image_format == 'jpeg':
+        # 0xFF in entropy coded data is followed by 0x00 or RSTn, so EOI can
+        # not occur at the end of a truncated scan
+        return b'\xff\xd9' in data[-_TAIL_CHECK:]
+
+    if image_format == 'png':
+        # IEND chunk type is followed by 4 bytes of CRC
+        tail = data[-_TAIL_CHECK:]
+        iend = tail.rfind(b'IEND')
+        return iend != -1 and len(tail) - iend >= 8
+
+    if image_format == 'gif':
+        return data.rstrip(b'\x00')[-1:] == b';'
+
+    if image_format == 'webp':
+        return len(data) >= 8 + struct.unpack('<I', data[4:8])[0]
+
+    if image_format == 'bmp':
+        return len(data) >= struct.unpack('<I', data[2:6])[0]
+
+    return True
+
+def check_image_data(data, content_type=None):
+    """
+    This function checks downloaded data and reads size of the picture.
+        Magic bytes decide if data is a picture, content type is only shown in
+        the error since servers often label pictures wrong.
+
+    Keyword arguments:
+    data -- < bytes > downloaded data
+    content_type -- < string > OR None value of Content-Type header
+
+    Return:
+    < dict > -- { "height": < int >, "width": < int > } or empty dict if the
+        size can not be read from the header
+
+    """
+    if len(data) == 0:
+        raise BadImageError('empty answer')
+
+    image_format = get_image_format(data[:12])
+    if image_format is None:
+        raise BadImageError(
+                'not a picture (content type: {})'.format(content_type))
+
+    if len(data) < 12 or not _is_complete(data, image_format):
+        raise BadImageError('truncated {} picture'.format(image_format))
+
+    image_size = get_image_size(io.BytesIO(data), image_format)
+    if image_size is None:
+        return {}
+
+    return {"height": image_size[0], "width": image_size[1]}
@@ -0,0 +1,166 @@
+"""
+This module merges results of dload_dataset.py shards into one result JSON-file
+    as if the whole tsv-file had been downloaded by a single process.
+
+Every source can be either a result json-file of a shard or its journal
+    (.jsonl), so shards that have not been compacted yet can be merged too.
+    Cells of all shards are sorted by cell number. Pictures are not renamed:
+    shards already use names of the whole tsv-file (dataset_pic_{index}.jpg).
+
+Result JSON-file view:
+
+{
+    "tsv_source_fname": < string >,
+    "time_spent": < int >,
+    "downloaded_flist": [
+                            {
+                                "cell_number": < int >,
+                                "filename": < string >,
+                                "caption": < string >,
+                                "digest": < string >,
+                                "height": < int >,
+                                "width": < int >
+                            }, ...
+                        ],
+    "error_clist":  [ < int >, ... ]
+}
+
+"time_spent" is the time of the slowest shard since shards work in parallel.
+
+"""
+import os
+import sys
+import heapq
+import argparse
+
+from dload_dataset import read_json_data, save_json_data
+from download_journal import compact_journal
+
+def _a_parse():
+    """
+    This function is a simple argument parser. Checks if paths in arguments are
+        right & checks if directories exist.
+
+    Return:
+    < dict > -- {
+                'source_list': < list > of < string >,
+                'output_json': < string >
+                }
+
+    """
+    a_parser = argparse.ArgumentParser()
+    a_parser.add_argument(
+                '-i',
+                '--source_list',
+                metavar='/path/to/shard.json OR /path/to/shard_journal.jsonl',
+                nargs='+',
+                required=True,
+                help='result json-files or journals of shards')
+
+    a_parser.add_argument(
+                '-o',
+                '--output_json',
+                metavar='/path/to/json',
+                default='output_gdset.json',
+                help='path to merged output json-file')
+
+    args = vars(a_parser.parse_args())
+    source_list = [os.path.abspath(path) for path in args.get('source_list')]
+    output_json = os.path.abspath(args.get('output_json'))
+
+    for source_path in source_list:
+        if os.path.isfile(source_path) != True:
+            print('\n[ERROR]: < {} > has not found.'.format(source_path))
+            sys.exit(1)
+
+        if os.path.splitext(source_path)[1] not in {'.json', '.jsonl'}:
+            print('\n[ERROR]: < {} > has wrong extension.'.format(source_path))
+            sys.exit(1)
+
+    if os.path.splitext(output_json)[1] != '.json':
+        print('\n[ERROR]: output .json file has wrong extension')
+        sys.exit(1)
+
+    if os.path.exists(output_json):
+        ans = input(
+            '\n[ATTENTION]: .json file already exist, overwrite it? [Y/n]: ')
+        if ans in {'True', 'true', '1', 't', 'y', 'yes', ''}:
+            print('File will be overwritten.')
+        else:
+            print('Exiting..')
+            sys.exit(1)
+
+    args.update({'source_list': source_list, 'output_json': output_json})
+
+    return args
+
+def read_shard(shard_path):
+    """
+    This function reads result of a shard from json-file or journal.
+
+    Keyword arguments:
+    shard_path -- < string > path to result json-file or journal (.jsonl)
+
+    Return:
+    < dict > -- dload_dataset result dict
+
+    """
+    if os.path.splitext(shard_path)[1] == '.jsonl':
+        return compact_journal(shard_path)
+    return read_json_data(shard_path)
+
+def merge_shards(shard_list):
+    """
+    This function merges dload_dataset results of shards. If a cell occurs in
+        several shards then a downloaded picture is preferred to an error
+        whatever the order of shards; if it has been downloaded by several
+        shards then the element of the first of them is taken.
+
+    Keyword arguments:
+    shard_list -- < list > of < dict > dload_dataset result dicts
+
+    Return:
+    < dict > -- merged dload_dataset result dict
+
+    """
+    source_names = {shard.get('tsv_source_fname') for shard in shard_list}
+    if len(source_names) > 1:
+        print('[ATTENTION]: shards have different tsv sources:', source_names)
+
+    downloaded_flist = []
+    error_clist = []
+    seen_cells = set()
+
+    # every shard is already sorted by cell number
+    for flist_element in heapq.merge(
+                    *[shard.get('downloaded_flist') for shard in shard_list],
+                    key=lambda element: element.get('cell_number')):
+        if flist_element.get('cell_number') not in seen_cells:
+            seen_cells.add(flist_element.get('cell_number'))
+            downloaded_flist.append(flist_element)
+
+    for cell_number in heapq.merge(
+                        *[shard.get('error_clist') for shard in shard_list]):
+        if cell_number not in seen_cells:
+            seen_cells.add(cell_number)
+            error_clist.append(cell_number)
+
+    return {
+        "tsv_source_fname": shard_list[0].get('tsv_source_fname'),
+        "time_spent": max(shard.get('time_spent', 0) for shard in shard_list),
+        "downloaded_flist": downloaded_flist,
+        "error_clist": error_clist
+    }
+
+if __name__ == '__main__':
+
+    args = _a_parse()
+    shard_list = [read_shard(path) for path in args.get('source_list')]
+
+    json_data = merge_shards(shard_list)
+    save_json_data(args.get('output_json'), json_data)
+
+    print('Merged {} shards: {} downloaded, {} errors.'.format(
+                                        len(shard_list),
+                                        len(json_data.get('downloaded_flist')),
+                                        len(json_data.get('error_clist'))))
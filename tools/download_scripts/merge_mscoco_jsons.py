@@ -1,9 +1,15 @@
 """
-This module merges two MSCOCO json files into one. It takes two paths to json
-    files as arguments.
+This module merges two or more MSCOCO json files into one. It takes paths to
+    json files as arguments.
 It is worth noting that original MSCOCO dataset has the following feature:
     one picture may have two or more annotations so this module implements
     logic that preserves the correct annotation links to images.
+Files are read one by one, each only once. Ids of the first file are kept,
+    images & annotations of every next file get ids that follow the largest
+    id written before, so the result is the same as of chained merges of two
+    files. Licenses of all files are merged without duplicates. The result is
+    written by mscoco_writer.py element by element, so only one input file is
+    in memory at a time.
 
 It is understood that MSCOCO json files will have following format:
 {
@@ -49,6 +55,14 @@ import sys
 import json
 import argparse
 
+try:
+    import resource
+except ImportError:
+    # not available on Windows
+    resource = None
+
+from mscoco_writer import MSCOCOWriter, STREAM_KEYS
+
 def _a_parse():
     """
     This function is a simple argument parser. Checks if paths in arguments are
@@ -56,8 +70,9 @@ def _a_parse():
 
     Return:
     < dict > -- {
-                'first_json': < string >,
-                'second_json': < string >,
+                'first_json': < string > OR None,
+                'second_json': < string > OR None,
+                'json_list': < list > of < string > all files in merge order,
                 'result_json': < string >
                 }
 
@@ -67,16 +82,24 @@ def _a_parse():
                         '-f',
                         '--first_json',
                         metavar='/path/to/json',
-                        required=True,
+                        required=False,
                         help='first .json file')
 
     a_parser.add_argument(
                         '-s',
                         '--second_json',
                         metavar='/path/to/json',
-                        required=True,
+                        required=False,
                         help='second .json file')
 
+    a_parser.add_argument(
+                        '-l',
+                        '--json_list',
+                        metavar='/path/to/json',
+                        nargs='+',
+                        default=[],
+                        help='.json files merged after first & second ones')
+
     a_parser.add_argument(
                         '-r',
                         '--result_json',
@@ -86,26 +109,42 @@ def _a_parse():
                         help='path for result .json file')
 
     args = vars(a_parser.parse_args())
-    first_json = os.path.abspath(args.get('first_json'))
-    second_json = os.path.abspath(args.get('second_json'))
     result_json = os.path.abspath(args.get('result_json'))
 
-    json_paths = [first_json, second_json, result_json]
-    error_names = ['first', 'second', 'result']
+    json_list = []
+    error_names = []
+
+    for name in ['first', 'second']:
+        if args.get(name + '_json') is not None:
+            args.update({name + '_json': os.path.abspath(
+                                                    args.get(name + '_json'))})
+            json_list.append(args.get(name + '_json'))
+            error_names.append(name)
+
+    for json_path in args.get('json_list'):
+        json_list.append(os.path.abspath(json_path))
+        error_names.append('< {} >'.format(json_path))
 
-    for index in range(3):
+    if len(json_list) < 2:
+        print('[ERROR]: at least two .json files are needed.')
+        sys.exit(1)
+
+    json_paths = json_list + [result_json]
+    error_names.append('result')
+
+    for index in range(len(json_paths)):
         if os.path.splitext(json_paths[index])[1] != '.json':
             print('[ERROR]: {} .json path has wrong extension.'.format(
                                                             error_names[index]))
             sys.exit(1)
 
-    for index in range(2):
+    for index in range(len(json_list)):
         if os.path.exists(json_paths[index]) != True:
             print('[ERROR]: {} .json file has not found.'.format(
                                                             error_names[index]))
             sys.exit(1)
 
-    for index in range(2):
+    for index in range(len(json_list)):
         if os.path.isfile(json_paths[index]) != True:
             print('[ERROR]: {} .json path is not a file.'.format(
                                                             error_names[index]))
@@ -121,8 +160,7 @@ def _a_parse():
             sys.exit(1)
 
     args.update({
-                'first_json': first_json,
-                'second_json': second_json,
+                'json_list': json_list,
                 'result_json': result_json
                 })
     return args
@@ -171,10 +209,95 @@ def get_max_id(list_of_dicts):
 
     return max_id
 
+def get_image_id_map(images, first_image_id):
+    """
+    This function gives new ids to images in their order.
+
+    Keyword arguments:
+    images -- < list > of < dict > images of mscoco dict
+    first_image_id -- < int > new id of the first image
+
+    Return:
+    < dict > -- { < int > old image id: < int > new image id, ... }
+
+    """
+    return {image_info.get('id'): first_image_id + index
+                                    for index, image_info in enumerate(images)}
+
+def remap_image(image_info, new_image_id):
+    """
+    This function returns copy of image with new id. The image is not changed.
+
+    """
+    return dict(image_info, id=new_image_id)
+
+def remap_annotation(annotation_info, image_id_map, new_annotation_id):
+    """
+    This function returns copy of annotation with new id and image id taken
+        from image_id_map (image id that is not in the map is kept). The
+        annotation is not changed.
+
+    """
+    old_image_id = annotation_info.get('image_id')
+    return dict(annotation_info,
+                    image_id=image_id_map.get(old_image_id, old_image_id),
+                    id=new_annotation_id)
+
+class MergedListView:
+    """
+    This class is a read-only view of two lists. Elements of the first list
+        are returned as they are, elements of the second list are remapped
+        (copied with new ids) only when they are accessed, so neither list is
+        copied or changed.
+
+    """
+    def __init__(self, list_1, list_2, remap):
+        """
+        Keyword arguments:
+        list_1 -- < list > elements returned as they are
+        list_2 -- < list > elements returned remapped
+        remap -- < function > ( < int > index in list_2, < dict > element ) ->
+            < dict > remapped copy of the element
+
+        """
+        self._list_1 = list_1
+        self._list_2 = list_2
+        self._remap = remap
+
+    def __len__(self):
+        return len(self._list_1) + len(self._list_2)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[current]
+                            for current in range(*index.indices(len(self)))]
+
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('merged list index out of range')
+
+        if index < len(self._list_1):
+            return self._list_1[index]
+        index -= len(self._list_1)
+        return self._remap(index, self._list_2[index])
+
+    def __iter__(self):
+        for element in self._list_1:
+            yield element
+        for index, element in enumerate(self._list_2):
+            yield self._remap(index, element)
+
 def merge_mscoco_dicts(dict_1, dict_2):
     """
     This function merges two ms coco dictionaries while maintaining annotation
-        indices that point to images.
+        indices that point to images. Images of dict_2 get ids that follow the
+        largest image id of dict_1, annotations are remapped by old -> new
+        image id mapping, so the merge takes linear time.
+    Neither dict is changed. "images" & "annotations" of the result are
+        MergedListView objects: elements of dict_2 are remapped only when they
+        are read, so no dict tree is copied. Use MSCOCOWriter (or list()) to
+        save the result.
     Format of mscoco dict specified in module description.
 
     Keyword arguments:
@@ -182,49 +305,137 @@ def merge_mscoco_dicts(dict_1, dict_2):
     dict_2 -- < dict > that will be merged with other
 
     Return:
-    < dict > -- merged result dict
+    < dict > -- merged result dict (other keys are taken from dict_1)
 
     """
-    # copying files to save original data
-    dict_1 = dict_1.copy()
-    dict_2 = dict_2.copy()
-
     images_1 = dict_1.get('images')
     annotations_1 = dict_1.get('annotations')
 
     images_2 = dict_2.get('images')
     annotations_2 = dict_2.get('annotations')
 
-    current_image_id = get_max_id(images_1) + 1
-    current_annotation_id = get_max_id(annotations_1) + 1
+    first_image_id = get_max_id(images_1) + 1
+    first_annotation_id = get_max_id(annotations_1) + 1
 
-    for image_info in images_2:
-        old_image_id = image_info.get('id')
+    # old image id -> new image id, so annotations are remapped in one pass
+    image_id_map = get_image_id_map(images_2, first_image_id)
 
-        for annotation_info in annotations_2:
-            if annotation_info.get('image_id') == old_image_id:
-                annotation_info.update({'image_id':current_image_id})
+    # since annotation identifiers do not matter, we just update them
+    return dict(dict_1,
+            images=MergedListView(images_1, images_2,
+                lambda index, image_info: remap_image(
+                                    image_info, first_image_id + index)),
+            annotations=MergedListView(annotations_1, annotations_2,
+                lambda index, annotation_info: remap_annotation(
+                    annotation_info, image_id_map, first_annotation_id + index)))
+
+def merge_mscoco_files(json_paths, result_json_path):
+    """
+    This function merges MSCOCO json files reading every file once. Ids of the
+        first file are kept, images & annotations of every next file get ids
+        that follow the largest id written before (the same as chained
+        merge_mscoco_dicts calls). Licenses are merged without duplicates.
+        Other keys ("info", ...) are taken from the first file.
 
-        image_info.update({'id':current_image_id})
-        current_image_id += 1
+    Keyword arguments:
+    json_paths -- < list > of < string > paths to json files in merge order
+    result_json_path -- < string > path to result json file
 
-    # since annotation identifiers do not matter, we just update them
-    for annotation_info in annotations_2:
-        annotation_info.update({'id': current_annotation_id})
-        current_annotation_id += 1
+    Return:
+    < dict > -- {
+                'images': < int > number of written images,
+                'annotations': < int > number of written annotations,
+                'licenses': < int > number of written licenses
+                }
+
+    """
+    first_dict = read_json_file(json_paths[0])
+    if first_dict is None:
+        raise ValueError('{} can not be read'.format(json_paths[0]))
+
+    # streamed lists are not kept by the template. Licenses are added later,
+    # so they must go after the streamed lists: keys before the first of them
+    # are written by MSCOCOWriter at once (COCO 2017 files have "licenses"
+    # before "images")
+    template = {key: value for key, value in first_dict.items()
+                                if key not in STREAM_KEYS and key != 'licenses'}
+    template.update({key: None for key in STREAM_KEYS})
+    template.update({'licenses': []})
+    license_keys = set()
+
+    with MSCOCOWriter(result_json_path, template) as writer:
+        for index, json_path in enumerate(json_paths):
+            if index == 0:
+                mscoco_dict, first_dict = first_dict, None
+            else:
+                mscoco_dict = read_json_file(json_path)
+                if mscoco_dict is None:
+                    raise ValueError('{} can not be read'.format(json_path))
+
+            images = mscoco_dict.get('images')
+            annotations = mscoco_dict.get('annotations')
+
+            if index == 0:
+                writer.extend('images', images)
+                writer.extend('annotations', annotations)
+                current_image_id = get_max_id(images) + 1
+                current_annotation_id = get_max_id(annotations) + 1
+            else:
+                # the id range of the file starts right after the ids
+                # written before it
+                image_id_map = get_image_id_map(images, current_image_id)
+
+                for image_info in images:
+                    writer.append('images',
+                                    remap_image(image_info, current_image_id))
+                    current_image_id += 1
+
+                for annotation_info in annotations:
+                    writer.append('annotations', remap_annotation(
+                        annotation_info, image_id_map, current_annotation_id))
+                    current_annotation_id += 1
+
+            for license_info in mscoco_dict.get('licenses', []):
+                license_key = json.dumps(license_info, sort_keys=True)
+                if license_key not in license_keys:
+                    license_keys.add(license_key)
+                    template.get('licenses').append(license_info)
+
+            print('Merged: {} ({} images, {} annotations).'.format(
+                                    json_path, len(images), len(annotations)))
+
+    return {
+        'images': writer.counts.get('images'),
+        'annotations': writer.counts.get('annotations'),
+        'licenses': len(template.get('licenses'))
+    }
+
+def get_peak_rss():
+    """
+    This function returns peak resident set size of the process in megabytes
+        or None if it can not be measured.
+
+    """
+    if resource is None:
+        return None
 
-    images_1 += images_2
-    annotations_1 += annotations_2
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
 
-    return dict_1
+    # ru_maxrss is in bytes on macOS and in kilobytes on Linux
+    if sys.platform == 'darwin':
+        return peak_rss / 2**20
+    return peak_rss / 2**10
 
 if __name__ == '__main__':
     args = _a_parse()
 
-    dict_1 = read_json_file(args.get('first_json'))
-    dict_2 = read_json_file(args.get('second_json'))
+    counts = merge_mscoco_files(args.get('json_list'), args.get('result_json'))
 
-    result_dict = merge_mscoco_dicts(dict_1, dict_2)
+    print('\nResult: {} images, {} annotations, {} licenses.'.format(
+                                                counts.get('images'),
+                                                counts.get('annotations'),
+                                                counts.get('licenses')))
 
-    with open(args.get('result_json'), 'w') as json_file:
-        json.dump(result_dict, json_file)
+    peak_rss = get_peak_rss()
+    if peak_rss is not None:
+        print('Peak memory (RSS): {:.1f} MB.'.format(peak_rss))
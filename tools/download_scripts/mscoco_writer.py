@@ -0,0 +1,156 @@
+"""
+This module writes MSCOCO json files element by element, so the whole
+    "images" & "annotations" lists do not have to be kept in memory.
+
+The output is the same as json.dump() of the whole dict with default settings:
+    keys go in the order of the template dict, elements are separated by
+    ', ', keys & values by ': ', non-ASCII characters are escaped.
+
+Elements of the first streamed list ("images") are written to the output at
+    once. Elements of the other streamed lists ("annotations") are spooled to
+    a temporary file next to the output and copied to it when the writer is
+    closed, since they go after "licenses". The output is written to a
+    temporary file which replaces json_path only when the writer is closed
+    successfully.
+
+Usage:
+
+    with MSCOCOWriter('result.json', mscoco_dict) as writer:
+        writer.append('images', image_info)
+        writer.append('annotations', annotation_info)
+        writer.extend('annotations', annotations_list)
+
+"""
+import os
+import json
+import shutil
+import tempfile
+
+# lists that are written element by element
+STREAM_KEYS = ('images', 'annotations')
+
+class MSCOCOWriter:
+    """
+    This class writes MSCOCO json file with streamed lists.
+
+    """
+    def __init__(self, json_path, template, stream_keys=STREAM_KEYS):
+        """
+        Keyword arguments:
+        json_path -- < string > path to output json-file
+        template -- < dict > MSCOCO dict. Its values are written as they are
+            except streamed lists, its keys give the order of the output.
+            Values of keys that go after the first streamed list are written
+            when the writer is closed, so they can be changed till then
+        stream_keys -- < tuple > of < string > keys of streamed lists
+
+        """
+        self.json_path = json_path
+        self.counts = {key: 0 for key in stream_keys}
+
+        self._order = list(template) + \
+                        [key for key in stream_keys if key not in template]
+        self._template = template
+
+        output_dir = os.path.dirname(os.path.abspath(json_path))
+        self._output_path = json_path + '.tmp'
+        self._output = open(self._output_path, 'w')
+
+        # the first streamed list goes straight to the output
+        self._direct_key = min(stream_keys, key=self._order.index)
+        self._spools = {key: tempfile.TemporaryFile('w+', dir=output_dir)
+                            for key in stream_keys if key != self._direct_key}
+
+        self._output.write('{')
+        for key in self._order[:self._order.index(self._direct_key)]:
+            self._write_item(key)
+            self._output.write(', ')
+        self._output.write(json.dumps(self._direct_key) + ': [')
+
+    def _write_item(self, key):
+        """
+        This method writes static key & value to the output.
+
+        """
+        self._output.write(json.dumps(key) + ': ' + \
+                                            json.dumps(self._template[key]))
+
+    def append(self, key, element):
+        """
+        This method writes element of the streamed list.
+
+        Keyword arguments:
+        key -- < string > key of the list ('images' or 'annotations')
+        element -- < dict > element of the list
+
+        """
+        if key == self._direct_key:
+            stream = self._output
+        else:
+            stream = self._spools[key]
+
+        if self.counts[key] > 0:
+            stream.write(', ')
+        stream.write(json.dumps(element))
+        self.counts[key] += 1
+
+    def extend(self, key, elements):
+        """
+        This method writes elements of the streamed list.
+
+        Keyword arguments:
+        key -- < string > key of the list ('images' or 'annotations')
+        elements -- < iterable > of < dict > elements of the list
+
+        """
+        for element in elements:
+            self.append(key, element)
+
+    def close(self):
+        """
+        This method writes the rest of the output and moves it to json_path.
+
+        """
+        if self._output.closed:
+            return
+
+        self._output.write(']')
+
+        for key in self._order[self._order.index(self._direct_key) + 1:]:
+            self._output.write(', ')
+            if key in self._spools:
+                self._output.write(json.dumps(key) + ': [')
+                self._spools[key].seek(0)
+                shutil.copyfileobj(self._spools[key], self._output)
+                self._output.write(']')
+            else:
+                self._write_item(key)
+
+        self._output.write('}')
+        self._output.close()
+        self._close_spools()
+
+        os.replace(self._output_path, self.json_path)
+
+    def abort(self):
+        """
+        This method drops everything that has been written.
+
+        """
+        if not self._output.closed:
+            self._output.close()
+            os.remove(self._output_path)
+        self._close_spools()
+
+    def _close_spools(self):
+        for spool in self._spools.values():
+            spool.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *args):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
@@ -22,12 +22,24 @@ Template of source file (generated .json):
                             {
                                 "cell_number": < int >,
                                 "filename": < string >,
-                                "caption": < string >
+                                "caption": < string >,
+                                "digest": < string >,
+                                "height": < int >,
+                                "width": < int >
                             }, ...
                         ],
     "error_clist":  [ < int >, ... ]
 }
 
+"digest" (sha256 of the picture), "height" & "width" are optional. With
+    --dedup_images cells with the same digest become one image with several
+    annotations. Height & width recorded by dload_dataset.py are used as they
+    are, so such pictures are not opened.
+
+Height & width of the other pictures are read from JPEG, PNG, GIF, WebP & BMP
+    headers (see image_probe.py). Pictures are decoded by OpenCV only if the
+    size is not in the header, so OpenCV is needed only for such pictures.
+
 /-----------------------------------------------------------------------------/
 
 Template of destination file (MSCOCO .json standard):
@@ -75,10 +87,19 @@ Template of destination file (MSCOCO .json standard):
 
 import os
 import sys
-import cv2
 import json
 import argparse
 import datetime
+import multiprocessing
+
+from functools import partial
+
+from dedup_store import get_file_digest
+from image_probe import probe_image_file
+from mscoco_writer import MSCOCOWriter
+
+# number of flist elements sent to a worker process at once
+_PROBE_CHUNK = 256
 
 # this is example of mscoco json file that will be copied for filling with data
 _example_mscoco_dict = {
@@ -111,7 +132,9 @@ def _a_parse():
     < dict > -- {
                 'source_json': < string >,
                 'output_json': < string >,
-                'images_dir': < string >
+                'images_dir': < string >,
+                'dedup_images': < bool >,
+                'jobs': < int >
                 }
 
     """
@@ -139,6 +162,21 @@ def _a_parse():
                 help='path to images directory. If not specified height &' + \
                         ' width of images will be null')
 
+    a_parser.add_argument(
+                '--dedup_images',
+                action='store_true',
+                help='map captions of identical pictures onto one image ' + \
+                        'by "digest" of source cells (or digest of files ' + \
+                        'in images_dir)')
+
+    a_parser.add_argument(
+                '-j',
+                '--jobs',
+                metavar='int',
+                default=1,
+                type=int,
+                help='number of processes that read images from images_dir')
+
     args = vars(a_parser.parse_args())
     source_json = os.path.abspath(args.get('source_json'))
     output_json = os.path.abspath(args.get('output_json'))
@@ -181,6 +219,10 @@ def _a_parse():
         print('[ATTENTION]: images_dir is not specified. Height & width will' +\
             ' not be recorded.')
 
+    if args.get('jobs') < 1:
+        print('[ERROR]: number of jobs must be positive')
+        sys.exit(1)
+
     args.update({
             'source_json': source_json,
             'output_json': output_json,
@@ -189,39 +231,110 @@ def _a_parse():
 
     return args
 
-def convert_raw2mscoco(source_json_path, output_json_path, images_dir):
+def _get_image_digest(flist_element, images_dir):
     """
-    This function converts .json generated by dload_dataset.py to mscoco .json
-        format. It is understood that the json files have the desired format
-        specified in the module description (there are no checks for right keys
-        in dictionaries).
-    If images_dir is not specified then cells 'height' and 'width' will be
-        filled with None. Otherwise it will open each image to record it shape.
-    In that case if there will be any trouble then it will skip image with its
-        annotation.
-    In any case if filename or caption of the image is None then it will be
-        skipped.
+    This function returns digest of the cell picture. It is taken from the
+        cell or computed from the file if images_dir is specified.
 
     Keyword arguments:
-    source_json_path -- path to source .json file that will be converted
-    output_json_path -- path to destination .json file
+    flist_element -- < dict > element of "downloaded_flist"
+    images_dir -- < string > OR None path to images directory
+
+    Return:
+    < string > OR None -- sha256 digest or None if it is unknown
 
     """
-    with open(source_json_path, 'r') as json_file:
-        s_json_data = json.load(json_file)
+    digest = flist_element.get('digest')
+
+    if digest is None and images_dir is not None:
+        image_path = os.path.join(images_dir, flist_element.get('filename'))
+        if os.path.isfile(image_path):
+            digest = get_file_digest(image_path)
+
+    return digest
+
+def get_image_shape(image_path):
+    """
+    This function returns height & width of the picture. They are read from
+        the header, the picture is decoded only if the header is ambiguous.
+
+    Keyword arguments:
+    image_path -- < string > path to the picture
+
+    Return:
+    < tuple > OR None -- ( < int > height, < int > width ) or None if the
+        picture can not be opened
+
+    """
+    try:
+        image_shape = probe_image_file(image_path)
+    except OSError:
+        return None
+
+    if image_shape is None:
+        # OpenCV is imported only when it is really needed
+        import cv2
+
+        image_np = cv2.imread(image_path)
+        if image_np is None:
+            return None
+        image_shape = image_np.shape[:2]
+
+    return image_shape
+
+def _probe_flist_element(flist_element, images_dir, dedup_images):
+    """
+    This function reads everything convert_raw2mscoco needs from the picture
+        file of the cell. It is called by worker processes.
+
+    Keyword arguments:
+    flist_element -- < dict > element of "downloaded_flist"
+    images_dir -- < string > path to images directory
+    dedup_images -- < bool > if True then digest is computed
+
+    Return:
+    < tuple > -- ( ( < int >, < int > ) OR None height & width or None if the
+        picture can not be opened, < string > OR None digest )
+
+    """
+    current_filename = flist_element.get('filename')
+    if current_filename is None or flist_element.get('caption') is None:
+        return None, None
+
+    current_digest = None
+    if dedup_images:
+        current_digest = _get_image_digest(flist_element, images_dir)
+
+    image_path = os.path.join(images_dir, current_filename)
+    image_shape = (flist_element.get('height'), flist_element.get('width'))
 
-    o_json_data = _example_mscoco_dict.copy()
+    if None in image_shape or os.path.isfile(image_path) != True:
+        image_shape = get_image_shape(image_path)
 
-    # images & annotations lists that will be updated in o_json_data
-    images_list = []
-    annotations_list = []
+    return image_shape, current_digest
 
+def _write_mscoco_elements(writer, flist, images_dir, dedup_images, jobs):
+    """
+    This function converts elements of "downloaded_flist" to MSCOCO images &
+        annotations and writes them one by one (see convert_raw2mscoco).
+
+    Keyword arguments:
+    writer -- < MSCOCOWriter > writer of the output json-file
+    flist -- < list > of < dict > elements of "downloaded_flist"
+    images_dir -- path to images directory or None
+    dedup_images -- < bool > merge cells with identical pictures
+    jobs -- < int > number of processes that read pictures
+
+    """
     images_id_count = 0
     annotations_id_count = 0
 
+    # digest -> id of the image element that has been made for it
+    digest_image_ids = {}
+
     # if images_dir is none then height & width cells will be None
     if images_dir is None:
-        for flist_element in s_json_data.get('downloaded_flist'):
+        for flist_element in flist:
             current_filename = flist_element.get('filename')
             current_annotation = flist_element.get('caption')
 
@@ -230,12 +343,23 @@ def convert_raw2mscoco(source_json_path, output_json_path, images_dir):
                     ' was skipped'.format(current_filename, current_annotation))
                 continue
 
+            if dedup_images:
+                current_digest = _get_image_digest(flist_element, images_dir)
+                if current_digest in digest_image_ids:
+                    writer.append('annotations', {
+                        'image_id': digest_image_ids[current_digest],
+                        'id': annotations_id_count,
+                        'caption': current_annotation
+                    })
+                    annotations_id_count += 1
+                    continue
+
             images_element = {
                 'licence': 7,
                 'file_name': current_filename,
                 'coco_url': 'unknown',
-                'height': None,
-                'width': None,
+                'height': flist_element.get('height'),
+                'width': flist_element.get('width'),
                 'date_captured': 'unknown',
                 'flick_url': 'unknown',
                 'id': images_id_count
@@ -247,56 +371,123 @@ def convert_raw2mscoco(source_json_path, output_json_path, images_dir):
                 'caption': current_annotation
             }
 
-            images_list.append(images_element)
-            annotations_list.append(annotations_element)
+            writer.append('images', images_element)
+            writer.append('annotations', annotations_element)
+
+            if dedup_images and current_digest is not None:
+                digest_image_ids[current_digest] = images_id_count
 
             images_id_count += 1
             annotations_id_count += 1
 
     # if it won't be able to open image then element will be skipped
     else:
-        for flist_element in s_json_data.get('downloaded_flist'):
-            current_filename = flist_element.get('filename')
-            current_annotation = flist_element.get('caption')
+        probe = partial(_probe_flist_element,
+                            images_dir=images_dir, dedup_images=dedup_images)
 
-            if current_filename is None or current_annotation is None:
-                print(('[ATTENTION]: file "{}" with caption: "{}"' + \
-                    ' was skipped').format(current_filename, current_annotation))
-                continue
+        if jobs > 1:
+            pool = multiprocessing.Pool(jobs)
+            probe_results = pool.imap(probe, flist, chunksize=_PROBE_CHUNK)
+        else:
+            pool = None
+            probe_results = map(probe, flist)
+
+        try:
+            for flist_element, (image_shape, current_digest) in zip(
+                                                        flist, probe_results):
+                current_filename = flist_element.get('filename')
+                current_annotation = flist_element.get('caption')
+
+                if current_filename is None or current_annotation is None:
+                    print(('[ATTENTION]: file "{}" with caption: "{}"' + \
+                        ' was skipped').format(current_filename,
+                                                        current_annotation))
+                    continue
+
+                if dedup_images:
+                    if current_digest in digest_image_ids:
+                        writer.append('annotations', {
+                            'image_id': digest_image_ids[current_digest],
+                            'id': annotations_id_count,
+                            'caption': current_annotation
+                        })
+                        annotations_id_count += 1
+                        continue
+
+                if image_shape is None:
+                    print(('[ATTENTION]: file "{}" has not found and was' + \
+                        ' skipped').format(current_filename))
+                    continue
+
+                images_element = {
+                    'licence': 7,
+                    'file_name': current_filename,
+                    'coco_url': 'unknown',
+                    'height': image_shape[0],
+                    'width': image_shape[1],
+                    'date_captured': 'unknown',
+                    'flick_url': 'unknown',
+                    'id': images_id_count
+                }
 
-            image_np = cv2.imread(os.path.join(images_dir, current_filename))
-            if image_np is None:
-                print(('[ATTENTION]: file "{}" has not found and was' + \
-                    ' skipped').format(current_filename))
-                continue
+                annotations_element = {
+                    'image_id': images_id_count,
+                    'id': annotations_id_count,
+                    'caption': current_annotation
+                }
 
-            images_element = {
-                'licence': 7,
-                'file_name': current_filename,
-                'coco_url': 'unknown',
-                'height': image_np.shape[0],
-                'width': image_np.shape[1],
-                'date_captured': 'unknown',
-                'flick_url': 'unknown',
-                'id': images_id_count
-            }
+                writer.append('images', images_element)
+                writer.append('annotations', annotations_element)
 
-            annotations_element = {
-                'image_id': images_id_count,
-                'id': annotations_id_count,
-                'caption': current_annotation
-            }
+                if dedup_images and current_digest is not None:
+                    digest_image_ids[current_digest] = images_id_count
 
-            images_list.append(images_element)
-            annotations_list.append(annotations_element)
+                images_id_count += 1
+                annotations_id_count += 1
 
-            images_id_count += 1
-            annotations_id_count += 1
+        finally:
+            # all results have been taken on success, so terminating only
+            # matters if a probe or the writer has failed
+            if pool is not None:
+                pool.terminate()
+                pool.join()
+
+def convert_raw2mscoco(source_json_path, output_json_path, images_dir,
+                                                dedup_images=False, jobs=1):
+    """
+    This function converts .json generated by dload_dataset.py to mscoco .json
+        format. It is understood that the json files have the desired format
+        specified in the module description (there are no checks for right keys
+        in dictionaries).
+    If images_dir is not specified then cells 'height' and 'width' will be
+        filled with recorded size of the picture or None. Otherwise it will
+        open each image without recorded size to record it shape (only the
+        header is read if possible).
+    In that case if there will be any trouble then it will skip image with its
+        annotation.
+    In any case if filename or caption of the image is None then it will be
+        skipped.
+    If dedup_images is True then cells with the same picture digest get one
+        image element (of the first cell) and an annotation each.
+    If jobs is more than 1 then pictures are read by a pool of processes in
+        chunks. Results come back in the order of cells and ids are given in
+        this process, so the output is the same as with one job.
+
+    Keyword arguments:
+    source_json_path -- path to source .json file that will be converted
+    output_json_path -- path to destination .json file
+    images_dir -- path to images directory or None
+    dedup_images -- < bool > merge cells with identical pictures
+    jobs -- < int > number of processes that read pictures
 
-    o_json_data.update({'images': images_list, 'annotations': annotations_list})
+    """
+    with open(source_json_path, 'r') as json_file:
+        s_json_data = json.load(json_file)
 
-    with open(output_json_path, 'w') as json_file:
-        json.dump(o_json_data, json_file)
+    # images & annotations are written as soon as they are made
+    with MSCOCOWriter(output_json_path, _example_mscoco_dict) as writer:
+        _write_mscoco_elements(writer, s_json_data.get('downloaded_flist'),
+                                            images_dir, dedup_images, jobs)
 
 if __name__ == "__main__":
 
@@ -304,5 +495,7 @@ if __name__ == "__main__":
     convert_raw2mscoco(
             args.get('source_json'),
             args.get('output_json'),
-            args.get('images_dir')
+            args.get('images_dir'),
+            args.get('dedup_images'),
+            args.get('jobs')
             )
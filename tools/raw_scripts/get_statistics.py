@@ -1,59 +1,246 @@
-import json
+"""
+This module prints statistics of word frequency files saved by
+    analysis_scripts/count_word_frequency.py (.json or .tsv): vocabulary size,
+    the most & the least frequent words and a histogram of frequencies.
+
+Bins of the histogram start at edges 0, step, 2 * step ... below --peak where
+    step = peak / fragmentation, the last bin takes all greater frequencies.
+    With --log_scale edges go from 1 to --peak (the highest frequency by
+    default) in geometric progression, so rare & frequent words are seen in
+    one histogram.
+
+Frequencies are loaded into a numpy array and binned by numpy.searchsorted &
+    numpy.bincount, so millions of words are binned in milliseconds:
+
+    python get_statistics.py -i ../json_sources/GOOGLE_ONLY_statistic.json \
+                        ../json_sources/MSCOCO_ONLY_statistic.json --log_scale
+
+With --output_file statistics of all files are saved to json-file:
+
+{
+    "/path/to/counts.json": {
+        "vocabulary": < int >,
+        "highest": [ < string > word, < int > frequency ],
+        "lowest": [ < string > word, < int > frequency ],
+        "edges": [ < int >, ... ],
+        "counts": [ < int >, ... ]
+    }, ...
+}
+
+"""
 import os
-
-json_path = os.path.abspath("../json_sources/GOOGLE_ONLY_statistic.json")
-
-with open(json_path, 'r') as json_read:
-    json_data = json.load(json_read)
-
-h_key = ''
-h_val = 0
-l_key = ''
-l_val = 9999999999999
-
-for key in json_data.keys():
-    value = json_data[key]
-    if value < l_val:
-        l_val = value
-        l_key = key
-
-    if value > h_val:
-        h_val = value
-        h_key = key
-
-print('Размер словаря:', len(json_data.keys()))
-
-print('\nСамое большое вхождение: {} - {}.'.format(h_key, h_val))
-print('Самое низкое вхождение: {} - {}.\n'.format(l_key, l_val))
-
-peak = 100
-
-fragmentation = 30
-fragment_step = int(peak / fragmentation)
-
-fragment_list = []
-count_list = []
-
-for val in range(0, peak, fragment_step):
-    fragment_list.append(val)
-    count_list.append(0)
-
-fragment_len = len(fragment_list)
-
-for key in json_data.keys():
-    quantity = json_data[key]
-    for i in range(fragment_len):
-        if i == fragment_len-1:
-            break
-        if fragment_list[i+1] > quantity:
-            break
-    count_list[i] += 1
-
-for i in range(fragment_len):
-    print(fragment_list[i], count_list[i])
-
-count = 0
-
-for key in json_data.keys():
-    if json_data[key] < 10:
-        count += 1
+import sys
+import json
+import argparse
+
+import numpy
+
+sys.path.insert(0, os.path.join(
+            os.path.dirname(os.path.abspath(__file__)), '..', 'analysis_scripts'))
+
+from count_word_frequency import read_counts
+
+def _a_parse():
+    """
+    This function is a simple argument parser. Checks if paths in arguments are
+        right.
+
+    Return:
+    < dict > -- {
+                'input_files': < list > of < string >,
+                'peak': < int > OR None,
+                'fragmentation': < int >,
+                'log_scale': < bool >,
+                'output_file': < string > OR None
+                }
+
+    """
+    a_parser = argparse.ArgumentParser()
+    a_parser.add_argument(
+                '-i',
+                '--input_files',
+                metavar='/path/to/counts.json',
+                nargs='+',
+                default=['../json_sources/GOOGLE_ONLY_statistic.json'],
+                help='word frequency files (.json or .tsv results of ' + \
+                    'count_word_frequency.py)')
+
+    a_parser.add_argument(
+                '--peak',
+                metavar='int',
+                default=None,
+                type=int,
+                help='upper edge of the histogram: 100 by default, ' + \
+                    'the highest frequency with --log_scale')
+
+    a_parser.add_argument(
+                '--fragmentation',
+                metavar='int',
+                default=30,
+                type=int,
+                help='number of bins below the peak')
+
+    a_parser.add_argument(
+                '--log_scale',
+                action='store_true',
+                help='edges of bins in geometric progression')
+
+    a_parser.add_argument(
+                '-o',
+                '--output_file',
+                metavar='/path/to/statistics.json',
+                required=False,
+                help='save statistics of all files to json-file')
+
+    args = vars(a_parser.parse_args())
+
+    input_files = []
+    for input_file in args.get('input_files'):
+        input_file = os.path.abspath(input_file)
+        if os.path.isfile(input_file) != True:
+            print('[ERROR]: {} is not a file.'.format(input_file))
+            sys.exit(1)
+
+        if os.path.splitext(input_file)[1] not in ['.json', '.tsv']:
+            print("[ERROR]: {} hasn't .tsv or .json extension.".format(
+                                                                input_file))
+            sys.exit(1)
+        input_files.append(input_file)
+    args.update({'input_files': input_files})
+
+    if args.get('fragmentation') < 1:
+        print('[ERROR]: Fragmentation must be positive.')
+        sys.exit(1)
+
+    if args.get('peak') is not None and args.get('peak') < 1:
+        print('[ERROR]: Peak must be positive.')
+        sys.exit(1)
+
+    if args.get('output_file') is not None:
+        if os.path.splitext(args.get('output_file'))[1] != '.json':
+            print('[ERROR]: Output file has wrong extension.')
+            sys.exit(1)
+        args.update({'output_file': os.path.abspath(args.get('output_file'))})
+
+    return args
+
+def get_edges(peak=100, fragmentation=30, log_scale=False):
+    """
+    This function returns lower edges of bins. The last bin has no upper edge.
+
+    Keyword arguments:
+    peak -- < int > frequency where the last bin starts (it is the last edge
+        with log_scale, below the peak otherwise)
+    fragmentation -- < int > number of bins below the peak
+    log_scale -- < bool > edges from 1 to peak in geometric progression
+
+    Return:
+    < numpy.ndarray > -- increasing edges
+
+    """
+    if log_scale:
+        return numpy.unique(numpy.geomspace(1, peak,
+                                    fragmentation + 1).astype(numpy.int64))
+
+    return numpy.arange(0, peak, max(peak // fragmentation, 1),
+                                                            dtype=numpy.int64)
+
+def get_histogram(frequencies, edges):
+    """
+    This function counts frequencies in bins: a frequency goes to the bin of
+        the nearest edge that is not greater than it; frequencies below the
+        first edge go to the first bin.
+
+    Keyword arguments:
+    frequencies -- < numpy.ndarray > frequencies of words
+    edges -- < numpy.ndarray > increasing lower edges of bins
+
+    Return:
+    < numpy.ndarray > -- number of words in every bin
+
+    """
+    bin_indexes = numpy.searchsorted(edges, frequencies, side='right') - 1
+    numpy.maximum(bin_indexes, 0, out=bin_indexes)
+
+    return numpy.bincount(bin_indexes, minlength=len(edges))
+
+def get_statistics(word_counts, peak=None, fragmentation=30, log_scale=False):
+    """
+    This function returns statistics of word frequency.
+
+    Keyword arguments:
+    word_counts -- < dict > { < string > word: < int > frequency }
+    peak -- < int > OR None upper edge of the histogram, 100 if None (the
+        highest frequency with log_scale)
+    fragmentation -- < int > number of bins below the peak
+    log_scale -- < bool > edges of bins in geometric progression
+
+    Return:
+    < dict > -- {
+                "vocabulary": < int >,
+                "highest": ( < string > word, < int > frequency ) OR None,
+                "lowest": ( < string > word, < int > frequency ) OR None,
+                "edges": < list > of < int >,
+                "counts": < list > of < int > words in bins
+                }
+
+    """
+    frequencies = numpy.fromiter(word_counts.values(), dtype=numpy.int64,
+                                                        count=len(word_counts))
+
+    if peak is None:
+        if log_scale and len(frequencies) > 0:
+            peak = max(int(frequencies.max()), 1)
+        else:
+            peak = 100
+
+    edges = get_edges(peak, fragmentation, log_scale)
+    statistics = {
+        'vocabulary': len(frequencies),
+        'highest': None,
+        'lowest': None,
+        'edges': edges.tolist(),
+        'counts': get_histogram(frequencies, edges).tolist()
+    }
+
+    if len(frequencies) > 0:
+        words = list(word_counts)
+        highest = int(frequencies.argmax())
+        lowest = int(frequencies.argmin())
+        statistics['highest'] = (words[highest], int(frequencies[highest]))
+        statistics['lowest'] = (words[lowest], int(frequencies[lowest]))
+
+    return statistics
+
+def print_statistics(statistics):
+    """
+    This function prints statistics returned by get_statistics.
+
+    """
+    print('Размер словаря:', statistics.get('vocabulary'))
+
+    if statistics.get('highest') is not None:
+        print('\nСамое большое вхождение: {} - {}.'.format(
+                                                    *statistics.get('highest')))
+        print('Самое низкое вхождение: {} - {}.\n'.format(
+                                                    *statistics.get('lowest')))
+
+    for edge, count in zip(statistics.get('edges'), statistics.get('counts')):
+        print(edge, count)
+
+if __name__ == '__main__':
+
+    args = _a_parse()
+
+    all_statistics = {}
+    for input_file in args.get('input_files'):
+        print('\n{}:'.format(input_file))
+
+        statistics = get_statistics(read_counts(input_file), args.get('peak'),
+                            args.get('fragmentation'), args.get('log_scale'))
+        print_statistics(statistics)
+        all_statistics[input_file] = statistics
+
+    if args.get('output_file') is not None:
+        with open(args.get('output_file'), 'w') as json_file:
+            json.dump(all_statistics, json_file, ensure_ascii=False, indent=3)